@@ -0,0 +1,85 @@
+"""Shared, tuned boto3 clients for the Lambdas and the query server.
+
+Clients are created once per container and reused across warm invocations, with
+explicit connection pool sizes, TCP keep-alive, connect/read timeouts and
+adaptive retries instead of botocore's defaults. The NCBI secret is cached with a
+TTL so warm ingest runs skip the Secrets Manager round trip. boto3 itself is
+imported on the first client request, so importing a handler stays cheap.
+
+Tune with AWS_MAX_POOL_CONNECTIONS, AWS_CONNECT_TIMEOUT_SEC, AWS_READ_TIMEOUT_SEC,
+AWS_MAX_ATTEMPTS and SECRET_TTL_SEC.
+"""
+
+import json
+import os
+import threading
+import time
+
+MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "32"))
+CONNECT_TIMEOUT_SEC = float(os.getenv("AWS_CONNECT_TIMEOUT_SEC", "2"))
+READ_TIMEOUT_SEC = float(os.getenv("AWS_READ_TIMEOUT_SEC", "10"))
+MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+SECRET_TTL_SEC = float(os.getenv("SECRET_TTL_SEC", "300"))
+
+# Model calls legitimately take tens of seconds; our own stage timeouts bound them.
+_SERVICE_READ_TIMEOUTS = {
+    "bedrock-agent-runtime": 60.0,
+    "bedrock-runtime": 60.0,
+}
+
+_clients = {}
+_secrets = {}
+_lock = threading.Lock()
+
+
+def client_config(service, max_pool_connections=None, read_timeout=None):
+    """The botocore Config we use for `service`."""
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=max_pool_connections or MAX_POOL_CONNECTIONS,
+        connect_timeout=CONNECT_TIMEOUT_SEC,
+        read_timeout=read_timeout
+        or _SERVICE_READ_TIMEOUTS.get(service, READ_TIMEOUT_SEC),
+        tcp_keepalive=True,
+        retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS},
+    )
+
+
+def client(service, max_pool_connections=None, read_timeout=None):
+    """Return the cached client for `service`, creating it on first use."""
+    key = (service, max_pool_connections, read_timeout)
+    cached = _clients.get(key)
+    if cached is not None:
+        return cached
+    import boto3
+
+    with _lock:
+        if key not in _clients:
+            _clients[key] = boto3.client(
+                service,
+                config=client_config(service, max_pool_connections, read_timeout),
+            )
+        return _clients[key]
+
+
+def get_secret(secret_arn, ttl=None):
+    """Secrets Manager JSON secret as a dict, cached for `ttl` seconds."""
+    ttl = SECRET_TTL_SEC if ttl is None else ttl
+    cached = _secrets.get(secret_arn)
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    resp = client("secretsmanager").get_secret_value(SecretId=secret_arn)
+    if "SecretString" in resp:
+        value = json.loads(resp["SecretString"])
+    else:
+        value = json.loads(resp["SecretBinary"].decode("utf-8"))
+    _secrets[secret_arn] = (time.monotonic(), value)
+    return value
+
+
+def clear_cache():
+    """Drop cached clients and secrets (tests, credential rotation)."""
+    with _lock:
+        _clients.clear()
+        _secrets.clear()
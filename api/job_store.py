@@ -0,0 +1,153 @@
+"""Result store for asynchronous query jobs.
+
+A job is a small JSON record: job_id, status (pending, running, succeeded,
+failed), the original request, and the result or error once it finishes. Pick a
+backend with a URL: `s3://bucket/prefix/` in AWS, `file:///path` for local runs,
+or `memory://` for tests and single-process servers. Only S3 is shared across
+Lambda containers, so it is the only store the Lambda's self-invoke can use.
+"""
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from api import aws_clients
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def new_job(job_id, request):
+    """Build the initial record for a job that has been accepted but not started."""
+    now = time.time()
+    return {
+        "job_id": job_id,
+        "status": PENDING,
+        "request": request,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class JobStore:
+    """Base class: backends implement _read and _write for a whole record."""
+
+    # True when every Lambda container sees the same records (needed for self-invoke).
+    shared = False
+
+    def create(self, job_id, request):
+        """Store a new pending job and return its record."""
+        record = new_job(job_id, request)
+        self._write(job_id, record)
+        return record
+
+    def update(self, job_id, **fields):
+        """Merge fields into an existing job record and return it."""
+        record = self._read(job_id)
+        if record is None:
+            raise KeyError(job_id)
+        record.update(fields)
+        record["updated_at"] = time.time()
+        self._write(job_id, record)
+        return record
+
+    def get(self, job_id):
+        """Return the job record, or None if there is no such job."""
+        return self._read(job_id)
+
+    def _read(self, job_id):
+        raise NotImplementedError
+
+    def _write(self, job_id, record):
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """Process-local store; fine for tests and a single long-running server."""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def _read(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+            return json.loads(json.dumps(record)) if record else None
+
+    def _write(self, job_id, record):
+        with self._lock:
+            self._records[job_id] = json.loads(json.dumps(record))
+
+
+class FileJobStore(JobStore):
+    """One JSON file per job in a local directory."""
+
+    def __init__(self, directory):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self._directory, f"{job_id}.json")
+
+    def _read(self, job_id):
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, job_id, record):
+        # Write then rename so a reader never sees a half-written record.
+        tmp_path = f"{self._path(job_id)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(record, handle)
+        os.replace(tmp_path, self._path(job_id))
+
+
+class S3JobStore(JobStore):
+    """One JSON object per job under an S3 prefix (expire it with a lifecycle rule)."""
+
+    shared = True
+
+    def __init__(self, bucket, prefix="jobs/", client=None):
+        self._bucket = bucket
+        self._prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self._client = client or aws_clients.client("s3")
+
+    def _key(self, job_id):
+        return f"{self._prefix}{job_id}.json"
+
+    def _read(self, job_id):
+        from botocore.exceptions import ClientError
+
+        try:
+            resp = self._client.get_object(Bucket=self._bucket, Key=self._key(job_id))
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(resp["Body"].read().decode("utf-8"))
+
+    def _write(self, job_id, record):
+        self._client.put_object(
+            Bucket=self._bucket,
+            Key=self._key(job_id),
+            Body=json.dumps(record).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+
+def from_url(url):
+    """Build a store from `memory://`, `file:///path` or `s3://bucket/prefix/`."""
+    parsed = urlparse(url or "memory://")
+    if parsed.scheme == "memory":
+        return MemoryJobStore()
+    if parsed.scheme == "file":
+        return FileJobStore(parsed.path)
+    if parsed.scheme == "s3":
+        return S3JobStore(parsed.netloc, parsed.path.lstrip("/"))
+    raise ValueError(f"Unsupported job store URL: {url}")
@@ -1,8 +1,16 @@
 """PubMed ingest Lambda: search PubMed, fetch MEDLINE, and drop raw .txt into S3.
 
 We pull NCBI credentials from Secrets Manager, run ESearch/EFetch (same idea as the
-notebook), and write one formatted .txt per PMID under the bucket's raw/ prefix.
+notebook), and write one formatted .txt per PMID under the bucket's raw/ prefix,
+plus a `.metadata.json` sidecar so the knowledge base can filter on journal, year,
+MeSH headings and publication types.
 Configure via NCBI_SECRET_ARN, S3_BUCKET; optional PUBMED_QUERY, RETMAX, BATCH_SIZE, RAW_PREFIX.
+RAW_STORAGE_URL overrides where records go (any api.storage URL, e.g. a local
+directory); by default that is s3://S3_BUCKET/RAW_PREFIX, written concurrently.
+Biopython and boto3 load on first use, not at import, to keep cold starts short.
+Set PROFILE_MODE to profile runs (see api/profiling.py). Each EFetch batch is
+timed and emitted as EMF metrics, and the response carries a run summary (see
+api/telemetry.py).
 """
 
 import json
@@ -10,49 +18,39 @@ import logging
 import os
 import time
 
-import boto3
-from botocore.exceptions import ClientError
-
-try:
-    from Bio import Entrez, Medline
-except Exception as exc:  # pragma: no cover - runtime dependency check
-    raise RuntimeError(
-        "Biopython is required for PubMed ingest. Package it with the Lambda."
-    ) from exc
+from api import aws_clients, medline, profiling, storage, telemetry
 
 LOGGER = logging.getLogger("pubmed-ingest")
 LOGGER.setLevel(logging.INFO)
 
+# Biopython modules, imported by _load_biopython() when a run starts.
+Entrez = None
+Medline = None
+
+
+def _load_biopython():
+    """Import Entrez/Medline once per container (tests may have swapped them in)."""
+    global Entrez, Medline
+    if Entrez is not None and Medline is not None:
+        return
+    try:
+        from Bio import Entrez as entrez_module
+        from Bio import Medline as medline_module
+    except Exception as exc:  # pragma: no cover - runtime dependency check
+        raise RuntimeError(
+            "Biopython is required for PubMed ingest. Package it with the Lambda."
+        ) from exc
+    Entrez = Entrez or entrez_module
+    Medline = Medline or medline_module
+
 
 # --- Secrets ---
 def _get_secret_value(secret_arn):
-    """Load the secret from Secrets Manager and return it as a dict (JSON string or binary)."""
-    client = boto3.client("secretsmanager")
-    resp = client.get_secret_value(SecretId=secret_arn)
-    if "SecretString" in resp:
-        return json.loads(resp["SecretString"])
-    return json.loads(resp["SecretBinary"].decode("utf-8"))
-
-
-# --- Record formatting ---
-def _format_record(rec):
-    """Turn one parsed MEDLINE record into the same .txt-style block we use in the notebook."""
-    parts = []
-    if rec.get("PMID"):
-        parts.append(f"PMID: {rec['PMID']}")
-    if rec.get("TI"):
-        parts.append(f"Title: {rec['TI']}")
-    if rec.get("AU"):
-        parts.append(f"Authors: {', '.join(rec['AU'])}")
-    if rec.get("JT"):
-        parts.append(f"Journal: {rec['JT']}")
-    if rec.get("DP"):
-        parts.append(f"Date: {rec['DP']}")
-    if rec.get("AB"):
-        parts.append(f"Abstract:\n{rec['AB']}")
-    return "\n".join(parts).strip()
+    """Load the secret as a dict (JSON string or binary), cached across warm runs."""
+    return aws_clients.get_secret(secret_arn)
 
 
+@profiling.profiled("pubmed-ingest")
 def handler(event, context):
     """Run the full ingest: search, fetch in batches, write .txt files to S3."""
     del event  # unused
@@ -61,6 +59,9 @@ def handler(event, context):
     secret_arn = os.getenv("NCBI_SECRET_ARN", "")
     bucket = os.getenv("S3_BUCKET", "")
     raw_prefix = os.getenv("RAW_PREFIX", "raw/").rstrip("/") + "/"
+    raw_url = os.getenv("RAW_STORAGE_URL") or (
+        f"s3://{bucket}/{raw_prefix}" if bucket else ""
+    )
 
     query = os.getenv(
         "PUBMED_QUERY",
@@ -73,8 +74,8 @@ def handler(event, context):
 
     if not secret_arn:
         raise ValueError("NCBI_SECRET_ARN must be set")
-    if not bucket:
-        raise ValueError("S3_BUCKET must be set")
+    if not raw_url:
+        raise ValueError("S3_BUCKET (or RAW_STORAGE_URL) must be set")
 
     secret = _get_secret_value(secret_arn)
     email = secret.get("ncbi_email") or secret.get("NCBI_EMAIL")
@@ -82,15 +83,19 @@ def handler(event, context):
     if not email:
         raise ValueError("NCBI email missing in secret")
 
+    _load_biopython()
     Entrez.email = email
     if api_key:
         Entrez.api_key = api_key
 
     # NCBI allows more requests/sec with an API key; use shorter delay when key is set.
     request_delay = 0.10 if api_key else 0.34
-    s3 = boto3.client("s3")
+    metrics = telemetry.IngestTelemetry(
+        function_name=getattr(context, "function_name", None)
+    )
 
     # --- PubMed search (ESearch) ---
+    started = time.perf_counter()
     try:
         stream = Entrez.esearch(db="pubmed", term=query, retmax=retmax, usehistory="y")
         record = Entrez.read(stream)
@@ -98,6 +103,7 @@ def handler(event, context):
     except Exception as exc:
         LOGGER.exception("pubmed_search_failed")
         raise RuntimeError(f"PubMed search failed: {exc}") from exc
+    metrics.searched(time.perf_counter() - started)
 
     webenv = record.get("WebEnv")
     query_key = record.get("QueryKey")
@@ -109,40 +115,62 @@ def handler(event, context):
 
     # --- Fetch in batches and write to S3 (EFetch) ---
     written = 0
-    for start in range(0, target_count, batch_size):
-        # Leave enough time for this batch and a clean shutdown.
-        if context and context.get_remaining_time_in_millis() < 15000:
-            LOGGER.warning("Stopping early to avoid Lambda timeout.")
-            break
-
-        stream = Entrez.efetch(
-            db="pubmed",
-            rettype="medline",
-            retmode="text",
-            retstart=start,
-            retmax=min(batch_size, target_count - start),
-            webenv=webenv,
-            query_key=query_key,
-        )
-        try:
-            for rec in Medline.parse(stream):
-                pmid = rec.get("PMID")
-                if not pmid:
-                    continue
-                text = _format_record(rec)
-                if not text:
-                    continue
-                key = f"{raw_prefix}{pmid}.txt"
-                s3.put_object(Bucket=bucket, Key=key, Body=text.encode("utf-8"))
-                written += 1
-        finally:
-            stream.close()
-
-        if start + batch_size < target_count:
-            time.sleep(request_delay)
+    stopped_early = False
+    with storage.from_url(raw_url, on_put=metrics.put) as raw:
+        for start in range(0, target_count, batch_size):
+            # Leave enough time for this batch and a clean shutdown.
+            if context and context.get_remaining_time_in_millis() < 15000:
+                LOGGER.warning("Stopping early to avoid Lambda timeout.")
+                stopped_early = True
+                break
+
+            requested = min(batch_size, target_count - start)
+            metrics.start_batch(start, requested)
+            started = time.perf_counter()
+            stream = Entrez.efetch(
+                db="pubmed",
+                rettype="medline",
+                retmode="text",
+                retstart=start,
+                retmax=requested,
+                webenv=webenv,
+                query_key=query_key,
+            )
+            stream = metrics.fetched(stream, time.perf_counter() - started)
+            try:
+                for rec in Medline.parse(stream):
+                    metrics.parsed()
+                    pmid = rec.get("PMID")
+                    if not pmid:
+                        continue
+                    text = medline.format_record(rec)
+                    if not text:
+                        continue
+                    started = time.perf_counter()
+                    raw.put(f"{pmid}.txt", text.encode("utf-8"))
+                    raw.put(
+                        f"{pmid}.txt.metadata.json",
+                        json.dumps(medline.kb_metadata(rec)).encode("utf-8"),
+                    )
+                    metrics.waited(time.perf_counter() - started)
+                    metrics.written()
+                    written += 1
+            finally:
+                stream.close()
+
+            if start + batch_size < target_count:
+                # Queued PUTs keep going while we wait out NCBI's rate limit.
+                started = time.perf_counter()
+                time.sleep(request_delay)
+                metrics.slept(time.perf_counter() - started)
+            started = time.perf_counter()
+            raw.flush()
+            metrics.waited(time.perf_counter() - started)
+            metrics.end_batch()
 
     # --- Response ---
-    LOGGER.info("pubmed_ingest_complete: %s records", written)
+    summary = metrics.summary(written)
+    LOGGER.info("pubmed_ingest_complete: %s records %s", written, json.dumps(summary))
     return {
         "statusCode": 200,
         "body": json.dumps(
@@ -151,6 +179,9 @@ def handler(event, context):
                 "target_count": target_count,
                 "bucket": bucket,
                 "raw_prefix": raw_prefix,
+                "raw_url": raw_url,
+                "stopped_early": stopped_early,
+                "telemetry": summary,
             }
         ),
     }
@@ -2,26 +2,227 @@
 
 API Gateway sends the request here; we call Bedrock retrieve_and_generate so the
 model can search our PubMed-derived index and answer from those sources. Needs
-BEDROCK_KB_ID; BEDROCK_MODEL_ARN is optional and has a default.
+BEDROCK_KB_ID; BEDROCK_MODEL_ARN is optional and has a default. The other
+settings are listed in the README (Query API settings).
 """
 
 import base64
+import functools
+import hashlib
+import hmac
 import json
 import logging
+import math
 import os
-import boto3
+import re
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from api import aws_clients, job_store, profiling, rate_limit
 
 # --- Config ---
 LOGGER = logging.getLogger("rag-query")
 LOGGER.setLevel(logging.INFO)
 
 KB_ID = os.getenv("BEDROCK_KB_ID", "")
+# Optional JSON map of route name -> {"kb_id", "keywords", "timeout_sec"}; see _kb_routes.
+KB_ROUTES = os.getenv("BEDROCK_KB_ROUTES", "")
 MODEL_ARN = os.getenv(
     "BEDROCK_MODEL_ARN",
     "arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0",
 )
+NUMBER_OF_RESULTS = int(os.getenv("NUMBER_OF_RESULTS", "5"))
+
+# "kb" uses Bedrock retrieve_and_generate; "hybrid" fuses vector + lexical results.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "kb").strip().lower()
+LEXICAL_SEARCH_ENDPOINT = os.getenv("LEXICAL_SEARCH_ENDPOINT", "").rstrip("/")
+LEXICAL_SEARCH_INDEX = os.getenv(
+    "LEXICAL_SEARCH_INDEX", "bedrock-knowledge-base-default-index"
+)
+LEXICAL_TEXT_FIELD = os.getenv("LEXICAL_TEXT_FIELD", "AMAZON_BEDROCK_TEXT_CHUNK")
+LEXICAL_VECTOR_FIELD = os.getenv(
+    "LEXICAL_VECTOR_FIELD", "bedrock-knowledge-base-default-vector"
+)
+VECTOR_TIMEOUT_SEC = float(os.getenv("VECTOR_TIMEOUT_SEC", "5"))
+LEXICAL_TIMEOUT_SEC = float(os.getenv("LEXICAL_TIMEOUT_SEC", "2"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").strip().lower() == "true"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Chunks whose word sets overlap more than this are treated as redundant.
+RERANK_REDUNDANCY_THRESHOLD = float(os.getenv("RERANK_REDUNDANCY_THRESHOLD", "0.8"))
+
+# Routing is off unless a fast model is configured.
+FAST_MODEL_ARN = os.getenv("BEDROCK_FAST_MODEL_ARN", "")
+ROUTING_ESCALATE = os.getenv("ROUTING_ESCALATE", "true").strip().lower() == "true"
+ROUTING_MAX_FAST_WORDS = int(os.getenv("ROUTING_MAX_FAST_WORDS", "20"))
+ROUTING_MAX_FAST_CONTEXT_TOKENS = int(
+    os.getenv("ROUTING_MAX_FAST_CONTEXT_TOKENS", "1500")
+)
+
+# Deadline budget. QUERY_DEADLINE_MS applies when there is no Lambda context;
+# SYNC_DEADLINE_MS caps synchronous requests at the API Gateway timeout even when
+# the function timeout is longer (async jobs use the full function timeout).
+QUERY_DEADLINE_MS = int(os.getenv("QUERY_DEADLINE_MS", "28000"))
+SYNC_DEADLINE_MS = int(os.getenv("SYNC_DEADLINE_MS", "29000"))
+RESPONSE_RESERVE_MS = int(os.getenv("RESPONSE_RESERVE_MS", "1000"))
+GENERATION_TIMEOUT_SEC = float(os.getenv("GENERATION_TIMEOUT_SEC", "25"))
+FALLBACK_RETRIEVE_TIMEOUT_SEC = float(os.getenv("FALLBACK_RETRIEVE_TIMEOUT_SEC", "3"))
+MIN_GENERATION_SEC = float(os.getenv("MIN_GENERATION_SEC", "3"))
+# Duplicate a still-running generation call after this long (set near its p95); 0 = off.
+HEDGE_AFTER_SEC = int(os.getenv("HEDGE_AFTER_MS", "0")) / 1000
+
+JOB_STORE_URL = os.getenv("JOB_STORE_URL", "memory://")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "memory://")
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "1"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))
+# Shared with the UI, which sends it in this header to vouch for its `client_ip`.
+CLIENT_IP_SECRET = os.getenv("CLIENT_IP_SECRET", "")
+CLIENT_IP_SECRET_HEADER = "x-client-ip-secret"
+
+WARMUP_QUESTIONS = os.getenv("WARMUP_QUESTIONS", "")
+ANSWER_CACHE_TTL_SEC = float(os.getenv("ANSWER_CACHE_TTL_SEC", "3600"))
+
+RETRIEVAL_ONLY_ANSWER = (
+    "We couldn't finish writing an answer in time. "
+    "The most relevant sources we found are listed below."
+)
+
+PROMPT_TEMPLATE = """You are Mamoru, a compassionate and knowledgeable assistant helping caregivers and clinicians understand dementia care based on peer-reviewed clinical literature from PubMed.
+
+CRITICAL INSTRUCTIONS:
+- Be concise when appropriate
+- Do NOT mention "Source 1", "Source 2", etc. in your response
+- Do NOT reference sources by number or name
+- Do NOT say "the sources show" or "according to the sources"
+- Simply provide the answer directly, as if you are stating facts
+- Be clear and empathetic
+- Focus on the most relevant findings
+- If sources don't address the question, say so briefly
+
+The sources will be displayed separately below your answer, so do not reference them in your text.
+
+Retrieved sources:
+$search_results$
+
+Question: $input$
+
+Provide a direct answer without mentioning sources:"""
+
+# Created on first use (see _agent_client etc.) so importing this module stays
+# cheap (tests/test_import_time.py); tests and the server swap them.
+client = None
+runtime_client = None
+lambda_client = None
+_job_store = None
+_rate_limiter = None
+
+# Pre-computed answers: cache key -> (stored_at, payload). Filled by warm-ups.
+_answer_cache = {}
+_cold = True
+
+# Shared across warm invocations; retrieval legs run here so each can time out
+# on its own without blocking the other.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-query")
+# Background jobs outside Lambda get their own pool: a job waits on legs it submits
+# to _executor, so sharing it would let busy jobs starve their own retrieval.
+_job_executor = ThreadPoolExecutor(
+    max_workers=JOB_WORKERS, thread_name_prefix="rag-job"
+)
+
+_PMID_IN_TEXT = re.compile(r"PMID[:\s]+(\d+)", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how in is it of on or "
+    "that the their there these this to was were what when which who why with".split()
+)
+# Questions that open like a lookup/definition are cheap to answer...
+_SIMPLE_QUESTION = re.compile(
+    r"^\s*(what (is|are|does)|define|definition of|who|when|is|are|can|does)\b",
+    re.IGNORECASE,
+)
+# ...unless they ask for synthesis across studies.
+_COMPLEX_QUESTION = re.compile(
+    r"\b(compare|comparison|versus|vs\.?|difference|differ|why|how (do|does|can|should)"
+    r"|mechanism|trade-?offs?|pros and cons|recommend|evidence[- ]based|strategies"
+    r"|interventions?|effective(ness)?|outcomes?)\b",
+    re.IGNORECASE,
+)
+_HEDGED_ANSWER = re.compile(
+    r"\b(i (do not|don't) know|i'?m not sure|not enough information|unable to "
+    r"(answer|determine)|cannot (answer|determine)|(do not|don't|does not|doesn't) "
+    r"(address|cover|contain))\b",
+    re.IGNORECASE,
+)
+
+
+# --- Deadlines ---
+class _StageTimeout(Exception):
+    """A stage ran out of its time budget."""
+
+
+class _Deadline:
+    """Time left for this invocation, taken from the Lambda context when present.
+
+    Every stage runs against it; when too little is left to generate, we return
+    the retrieved sources alone (`partial: true`) instead of timing out.
+    """
+
+    def __init__(self, context, cap_ms=None):
+        get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+        remaining_ms = get_remaining() if callable(get_remaining) else QUERY_DEADLINE_MS
+        if cap_ms is not None:
+            remaining_ms = min(remaining_ms, cap_ms)
+        self._expires = time.monotonic() + (remaining_ms - RESPONSE_RESERVE_MS) / 1000
+
+    def remaining(self):
+        """Seconds left before we must respond."""
+        return max(0.0, self._expires - time.monotonic())
+
+    def budget(self, stage_timeout):
+        """A stage's timeout, capped by what is left of the deadline."""
+        return min(stage_timeout, self.remaining())
 
-client = boto3.client("bedrock-agent-runtime")
+
+def _call_with_timeout(fn, timeout, hedge_after=0.0):
+    """Run `fn()` on the shared executor and return its result within `timeout`.
+
+    With `hedge_after` set, a duplicate call starts if the first is still running
+    by then and whichever finishes first wins. Raises _StageTimeout when nothing
+    finishes in time, or the call's own exception when every attempt failed.
+    """
+    if timeout <= 0:
+        raise _StageTimeout("no time left for this stage")
+    started = time.monotonic()
+    hedge_at = hedge_after if 0 < hedge_after < timeout else None
+    pending = {_executor.submit(fn)}
+    error = None
+    while pending:
+        next_check = hedge_at if hedge_at is not None else timeout
+        done, pending = wait(
+            pending,
+            timeout=max(0.0, next_check - (time.monotonic() - started)),
+            return_when=FIRST_COMPLETED,
+        )
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+        if not pending:
+            break
+        elapsed = time.monotonic() - started
+        if hedge_at is not None and elapsed >= hedge_at:
+            LOGGER.info("rag_query_hedged: duplicate call after %.2fs", elapsed)
+            pending.add(_executor.submit(fn))
+            hedge_at = None
+        elif elapsed >= timeout:
+            raise _StageTimeout(f"stage timed out after {timeout:.1f}s")
+    raise error
 
 
 # --- Response helpers ---
@@ -50,119 +251,1065 @@ def _parse_body(event):
         return None
 
 
-def _extract_question(event):
-    """Extract the `question` string from a REST or HTTP API event."""
-    data = _parse_body(event)
-    if data is not None and data.get("question") is not None:
+def _extract_question(event, data):
+    """Extract the `question` from the parsed body, else the query string."""
+    if data.get("question") is not None:
         return data.get("question")
     params = event.get("queryStringParameters") or {}
     return params.get("question")
 
 
-def _extract_client_ip(event):
-    """Optional client_ip from the body (the Streamlit UI sends it for logging)."""
-    data = _parse_body(event)
-    if data is None:
+# Request filter name -> (metadata key, Bedrock operator). List-valued filters
+# (mesh, publication_type) match when every requested value is on the document.
+_FILTER_FIELDS = {
+    "year_from": ("year", "greaterThanOrEquals"),
+    "year_to": ("year", "lessThanOrEquals"),
+    "journal": ("journal", "equals"),
+    "mesh": ("mesh", "listContains"),
+    "publication_type": ("publication_types", "listContains"),
+}
+
+
+def _extract_filters(data):
+    """Optional metadata `filters` from the body; raises ValueError when malformed."""
+    filters = data.get("filters") or {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    unknown = sorted(set(filters) - set(_FILTER_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(unknown)}")
+    cleaned = {}
+    for name, value in filters.items():
+        if value in (None, "", []):
+            continue
+        if name in ("year_from", "year_to"):
+            try:
+                cleaned[name] = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be a year") from None
+        elif name in ("mesh", "publication_type"):
+            values = value if isinstance(value, list) else [value]
+            cleaned[name] = [str(item) for item in values]
+        else:
+            cleaned[name] = str(value)
+    return cleaned
+
+
+def _build_retrieval_filter(filters):
+    """Map request filters to a Bedrock RetrievalFilter (None when unfiltered)."""
+    clauses = []
+    for name, value in filters.items():
+        key, operator = _FILTER_FIELDS[name]
+        for item in value if isinstance(value, list) else [value]:
+            clauses.append({operator: {"key": key, "value": item}})
+    if not clauses:
         return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"andAll": clauses}
+
+
+def _build_lexical_filter(filters):
+    """The same filters as OpenSearch bool clauses on the KB's metadata fields."""
+    clauses = []
+    year_range = {}
+    if "year_from" in filters:
+        year_range["gte"] = filters["year_from"]
+    if "year_to" in filters:
+        year_range["lte"] = filters["year_to"]
+    if year_range:
+        clauses.append({"range": {"year": year_range}})
+    if "journal" in filters:
+        clauses.append({"match_phrase": {"journal": filters["journal"]}})
+    for name in ("mesh", "publication_type"):
+        key = _FILTER_FIELDS[name][0]
+        for item in filters.get(name, []):
+            clauses.append({"match_phrase": {key: item}})
+    return clauses
+
+
+def _vector_search_config(number_of_results, filters, search_type=None):
+    """Build `vectorSearchConfiguration`, adding the metadata filter when present."""
+    config = {"numberOfResults": number_of_results}
+    if search_type:
+        config["overrideSearchType"] = search_type
+    retrieval_filter = _build_retrieval_filter(filters)
+    if retrieval_filter:
+        config["filter"] = retrieval_filter
+    return config
+
+
+def _extract_client_ip(data):
+    """Optional client_ip from the body (the Streamlit UI sends it for logging)."""
     return data.get("client_ip")
 
 
-def handler(event, context):
-    """Handle a single RAG query: validate, call Bedrock, return answer and sources."""
-    del context  # unused
+def _header(event, name):
+    """A request header by lower-case name (REST API events keep the caller's case)."""
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
 
-    # --- Validation ---
-    if not KB_ID:
-        return _json_response(500, {"error": "BEDROCK_KB_ID is not configured"})
 
-    question = _extract_question(event)
-    if not question:
-        return _json_response(400, {"error": "Missing question"})
+def _from_trusted_forwarder(event):
+    """True when the request carries the UI's CLIENT_IP_SECRET header."""
+    secret = _header(event, CLIENT_IP_SECRET_HEADER)
+    return bool(CLIENT_IP_SECRET and secret) and hmac.compare_digest(
+        secret.encode("utf-8"), CLIENT_IP_SECRET.encode("utf-8")
+    )
+
+
+def _rate_limit_key(event, data):
+    """Who to rate-limit: the caller's source IP, or the end user's IP forwarded by the UI.
+
+    The body's `client_ip` is caller-controlled, so it only counts when the
+    request also carries the shared CLIENT_IP_SECRET header.
+    """
+    client_ip = _extract_client_ip(data)
+    if client_ip and client_ip != "-" and _from_trusted_forwarder(event):
+        return f"ip:{client_ip}"
+    request_context = event.get("requestContext", {})
+    source_ip = request_context.get("http", {}).get("sourceIp") or request_context.get(
+        "identity", {}
+    ).get("sourceIp")
+    return f"ip:{source_ip}" if source_ip else None
+
+
+# --- Source helpers ---
+def _to_source(item):
+    """Shape a Bedrock retrieval result or citation reference as a UI source."""
+    source = {
+        "text": item.get("content", {}).get("text", ""),
+        "metadata": item.get("metadata", {}),
+    }
+    # Retrieve results carry a relevance score; federated merging ranks by it.
+    if item.get("score") is not None:
+        source["score"] = item["score"]
+    return source
+
+
+def _source_key(source):
+    """Return the de-duplication key for a source: its PMID when we can find one."""
+    metadata = source.get("metadata") or {}
+    pmid = metadata.get("pmid") or metadata.get("PMID")
+    if pmid:
+        return f"pmid:{pmid}"
+    text = source.get("text") or ""
+    match = _PMID_IN_TEXT.search(text)
+    if match:
+        return f"pmid:{match.group(1)}"
+    uri = metadata.get("x-amz-bedrock-kb-source-uri")
+    if uri:
+        return f"uri:{uri}"
+    return "text:" + hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# --- Clients ---
+def _agent_client():
+    """bedrock-agent-runtime client; built on the first request, then reused."""
+    global client
+    if client is None:
+        client = aws_clients.client("bedrock-agent-runtime")
+    return client
+
+
+def _runtime_client():
+    """bedrock-runtime client for direct model calls."""
+    global runtime_client
+    if runtime_client is None:
+        runtime_client = aws_clients.client("bedrock-runtime")
+    return runtime_client
+
+
+def _lambda_client():
+    """Lambda client for background self-invokes."""
+    global lambda_client
+    if lambda_client is None:
+        lambda_client = aws_clients.client("lambda")
+    return lambda_client
+
+
+# --- Knowledge base routing ---
+@functools.lru_cache(maxsize=4)
+def _parse_kb_routes(raw, default_kb_id):
+    """Parse a BEDROCK_KB_ROUTES value into the route map _kb_routes returns.
+
+    Each entry is a KB id string or {"kb_id", "keywords", "timeout_sec"};
+    `default_kb_id` is added as the "default" route. Cached on the raw strings,
+    so tests that swap KB_ROUTES/KB_ID get a fresh parse.
+    """
+    routes = {}
+    if raw.strip():
+        try:
+            spec = json.loads(raw)
+            if not isinstance(spec, dict):
+                raise ValueError("BEDROCK_KB_ROUTES must be an object")
+            for name, route in spec.items():
+                if isinstance(route, str):
+                    route = {"kb_id": route}
+                if not route.get("kb_id"):
+                    raise ValueError(f"route {name} has no kb_id")
+                routes[name] = {
+                    "kb_id": route["kb_id"],
+                    "keywords": [
+                        str(word).lower() for word in route.get("keywords") or []
+                    ],
+                    "timeout_sec": float(
+                        route.get("timeout_sec") or VECTOR_TIMEOUT_SEC
+                    ),
+                }
+        except (AttributeError, TypeError, ValueError):
+            LOGGER.warning("rag_query_bad_kb_routes: %s", raw)
+            routes = {}
+    if default_kb_id and default_kb_id not in {r["kb_id"] for r in routes.values()}:
+        routes["default"] = {
+            "kb_id": default_kb_id,
+            "keywords": [],
+            "timeout_sec": VECTOR_TIMEOUT_SEC,
+        }
+    return routes
+
+
+def _kb_routes():
+    """Route name -> {"kb_id", "keywords", "timeout_sec"} from BEDROCK_KB_ROUTES.
+
+    BEDROCK_KB_ID joins as the keyword-less "default" route unless the map
+    already names it; a bad BEDROCK_KB_ROUTES is logged and ignored.
+    """
+    return _parse_kb_routes(KB_ROUTES, KB_ID)
+
+
+def _select_kbs(question, filters):
+    """The routes this question searches.
+
+    Keyword-less routes always; topic routes when one of their keywords starts a
+    word of the question or its MeSH filter. When no topic route matches we
+    search them all, so an unrouted question still sees the whole corpus.
+    """
+    routes = _kb_routes()
+    if len(routes) < 2:
+        return routes
+    text = " ".join([question, *(filters or {}).get("mesh", [])]).lower()
+    topical = {name: route for name, route in routes.items() if route["keywords"]}
+    matched = {
+        name: route
+        for name, route in topical.items()
+        if any(re.search(r"\b" + re.escape(word), text) for word in route["keywords"])
+    }
+    selected = {
+        name: route
+        for name, route in routes.items()
+        if not route["keywords"] or name in (matched or topical)
+    }
+    LOGGER.info(
+        "rag_query_kb_route: %s",
+        json.dumps({"kbs": sorted(selected), "matched": sorted(matched)}),
+    )
+    return selected
+
+
+def _kb_legs(routes):
+    """Retrieval legs for the selected KBs: leg name -> (callable, timeout_sec)."""
+    if not routes:
+        raise RuntimeError("BEDROCK_KB_ID is not configured")
+    if list(routes) == ["default"]:
+        # The single-KB setup keeps its one "vector" leg.
+        return {"vector": (_vector_retrieve, VECTOR_TIMEOUT_SEC)}
+    return {
+        f"kb:{name}": (
+            functools.partial(_vector_retrieve, kb_id=route["kb_id"]),
+            route["timeout_sec"],
+        )
+        for name, route in routes.items()
+    }
+
+
+def _merge_by_score(rankings, limit=None):
+    """Merge per-KB result lists by relevance score, de-duplicated by PMID.
+
+    When a PMID comes back from more than one KB (or as several chunks) we keep
+    its highest-scoring chunk; unscored sources rank after scored ones.
+    """
+    best = {}
+    for ranking in rankings:
+        for source in ranking:
+            key = _source_key(source)
+            score = source.get("score")
+            score = float("-inf") if score is None else score
+            if key not in best or score > best[key][0]:
+                best[key] = (score, source)
+    ordered = sorted(best.values(), key=lambda pair: pair[0], reverse=True)
+    if limit is not None:
+        ordered = ordered[:limit]
+    return [source for _, source in ordered]
+
+
+# --- Retrieval legs ---
+def _vector_retrieve(question, number_of_results, filters, kb_id=None):
+    """Semantic top-k search against a knowledge base (BEDROCK_KB_ID by default)."""
+    retrieval = _agent_client().retrieve(
+        knowledgeBaseId=kb_id or KB_ID,
+        retrievalQuery={"text": question},
+        retrievalConfiguration={
+            "vectorSearchConfiguration": _vector_search_config(
+                number_of_results, filters, search_type="SEMANTIC"
+            )
+        },
+    )
+    return [_to_source(item) for item in retrieval.get("retrievalResults", [])]
+
+
+def _lexical_retrieve(question, number_of_results, filters):
+    """Keyword (BM25) match against the KB's OpenSearch index, signed with SigV4."""
+    if not LEXICAL_SEARCH_ENDPOINT:
+        return []
+
+    import urllib.request
+
+    import boto3
+    from botocore.auth import SigV4Auth
+    from botocore.awsrequest import AWSRequest
+
+    session = boto3.session.Session()
+    payload = json.dumps(
+        {
+            "size": number_of_results,
+            "query": {
+                "bool": {
+                    "must": [{"match": {LEXICAL_TEXT_FIELD: question}}],
+                    "filter": _build_lexical_filter(filters),
+                }
+            },
+            "_source": {"excludes": [LEXICAL_VECTOR_FIELD]},
+        }
+    ).encode("utf-8")
+    url = f"{LEXICAL_SEARCH_ENDPOINT}/{LEXICAL_SEARCH_INDEX}/_search"
+    request = AWSRequest(
+        method="POST",
+        url=url,
+        data=payload,
+        headers={
+            "Content-Type": "application/json",
+            "X-Amz-Content-SHA256": hashlib.sha256(payload).hexdigest(),
+        },
+    )
+    SigV4Auth(session.get_credentials(), "aoss", session.region_name).add_auth(request)
+    http_request = urllib.request.Request(
+        url, data=payload, headers=dict(request.headers.items()), method="POST"
+    )
+    with urllib.request.urlopen(http_request, timeout=LEXICAL_TIMEOUT_SEC) as resp:
+        result = json.loads(resp.read().decode("utf-8"))
+
+    sources = []
+    for hit in result.get("hits", {}).get("hits", []):
+        doc = hit.get("_source", {})
+        metadata = {
+            key: value for key, value in doc.items() if key != LEXICAL_TEXT_FIELD
+        }
+        # Bedrock stores its own metadata (source URI etc.) as a JSON string.
+        bedrock_metadata = metadata.pop("AMAZON_BEDROCK_METADATA", None)
+        if isinstance(bedrock_metadata, str):
+            try:
+                metadata.update(json.loads(bedrock_metadata))
+            except json.JSONDecodeError:
+                pass
+        sources.append({"text": doc.get(LEXICAL_TEXT_FIELD, ""), "metadata": metadata})
+    return sources
+
+
+def _run_legs(question, legs, number_of_results, filters, deadline):
+    """Run retrieval legs in parallel; a leg that errors or times out is dropped.
+
+    `legs` maps a leg name to (callable, timeout_sec). Returns {name: sources}
+    for the legs that finished in time.
+    """
+    started = time.monotonic()
+    futures = {
+        name: (
+            _executor.submit(fn, question, number_of_results, filters),
+            deadline.budget(timeout),
+        )
+        for name, (fn, timeout) in legs.items()
+    }
+    results = {}
+    for name, (future, timeout) in futures.items():
+        remaining = max(0.0, timeout - (time.monotonic() - started))
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            LOGGER.warning("rag_query_leg_timeout: %s after %.1fs", name, timeout)
+        except Exception:
+            LOGGER.exception("rag_query_leg_failed: %s", name)
+    return results
+
+
+def _fuse_rankings(rankings, k=RRF_K, limit=None):
+    """Reciprocal rank fusion over ranked source lists, de-duplicated by PMID.
+
+    Each source scores sum(1 / (k + rank)) over the lists it appears in; when a
+    PMID shows up more than once we keep the text from its best-ranked chunk.
+    """
+    scores = {}
+    best = {}
+    for ranking in rankings:
+        seen = set()
+        for rank, source in enumerate(ranking, start=1):
+            key = _source_key(source)
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in best or rank < best[key][0]:
+                best[key] = (rank, source)
+    ordered = sorted(scores, key=lambda key: scores[key], reverse=True)
+    if limit is not None:
+        ordered = ordered[:limit]
+    return [best[key][1] for key in ordered]
+
+
+# --- Re-ranking ---
+def _tokenize(text):
+    """Lowercased content words, used by the local scorer."""
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def _estimate_tokens(text):
+    """Rough model token count (~4 characters per token) for budgeting."""
+    return math.ceil(len(text) / 4)
+
+
+def _score_candidates(question, candidates, k1=1.2, b=0.75):
+    """BM25 score of each candidate against the question, with IDF over the candidate set."""
+    query_terms = set(_tokenize(question))
+    docs = [_tokenize(source.get("text", "")) for source in candidates]
+    if not docs or not query_terms:
+        return [0.0] * len(candidates)
+    avg_len = sum(len(doc) for doc in docs) / len(docs) or 1.0
+    doc_freq = {term: sum(1 for doc in docs if term in doc) for term in query_terms}
+    scores = []
+    for doc in docs:
+        counts = {}
+        for word in doc:
+            if word in query_terms:
+                counts[word] = counts.get(word, 0) + 1
+        score = 0.0
+        for term, tf in counts.items():
+            idf = math.log(
+                1 + (len(docs) - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5)
+            )
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg_len))
+        scores.append(score)
+    return scores
+
+
+def _rerank(question, candidates, token_budget):
+    """Re-score fused candidates locally and pack the best into a token budget.
+
+    With RERANK_ENABLED each leg over-retrieves RERANK_CANDIDATES, and the
+    packed context holds at most CONTEXT_TOKEN_BUDGET tokens.
+
+    The final score blends BM25 against the question with the fused rank (so a
+    chunk both legs agreed on keeps some credit). Chunks that mostly repeat an
+    already-selected chunk are dropped, and packing stops at the budget.
+    """
+    bm25 = _score_candidates(question, candidates)
+    top = max(bm25) if bm25 and max(bm25) > 0 else 1.0
+    scored = [
+        (0.7 * (score / top) + 0.3 / (1 + rank), rank, source)
+        for rank, (score, source) in enumerate(zip(bm25, candidates))
+    ]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+
+    selected = []
+    selected_words = []
+    used_tokens = 0
+    for _, _, source in scored:
+        text = source.get("text", "")
+        words = set(_tokenize(text))
+        if any(
+            words
+            and len(words & other) / len(words | other) > RERANK_REDUNDANCY_THRESHOLD
+            for other in selected_words
+        ):
+            continue
+        tokens = _estimate_tokens(text)
+        if selected and used_tokens + tokens > token_budget:
+            continue
+        selected.append(source)
+        selected_words.append(words)
+        used_tokens += tokens
+    return selected
+
+
+# --- Model routing ---
+def _classify_question(question, context_tokens=None):
+    """Cheap local routing decision; returns ("fast" | "strong", reason)."""
+    if not FAST_MODEL_ARN:
+        return "strong", "routing_disabled"
+    return _question_shape(question, context_tokens)
+
+
+def _question_shape(question, context_tokens=None):
+    """Classify a question as quick ("fast") or heavy ("strong") from its shape alone."""
+    if len(question.split()) > ROUTING_MAX_FAST_WORDS:
+        return "strong", "long_question"
+    if question.count("?") > 1:
+        return "strong", "multi_part"
+    if _COMPLEX_QUESTION.search(question):
+        return "strong", "complex_question"
+    if context_tokens is not None and context_tokens > ROUTING_MAX_FAST_CONTEXT_TOKENS:
+        return "strong", "large_context"
+    if _SIMPLE_QUESTION.search(question):
+        return "fast", "simple_question"
+    return "strong", "default"
+
+
+def _is_hedged(answer):
+    """True when an answer is empty or mostly a refusal/uncertainty."""
+    return not answer.strip() or bool(_HEDGED_ANSWER.search(answer))
 
-    client_ip = _extract_client_ip(event) or "-"
-    LOGGER.info("rag_query: %s %s", client_ip, question)
 
-    # --- Bedrock retrieve_and_generate ---
+def _call_routed(question, call, deadline, context_tokens=None):
+    """Run `call(model_arn)` on the routed model, escalating hedged fast answers.
+
+    With BEDROCK_FAST_MODEL_ARN set, easy questions go to the fast model; with
+    ROUTING_ESCALATE an empty or hedged fast answer is retried on the strong one.
+
+    `call` must return a tuple whose first item is the answer text. Each attempt
+    gets the generation budget; an escalation that fails or cannot finish in time
+    keeps the fast answer. Raises _StageTimeout when the first attempt times out.
+    """
+    tier, reason = _classify_question(question, context_tokens)
+    model_arn = FAST_MODEL_ARN if tier == "fast" else MODEL_ARN
+    started = time.monotonic()
+    result = _call_with_timeout(
+        lambda: call(model_arn),
+        deadline.budget(GENERATION_TIMEOUT_SEC),
+        HEDGE_AFTER_SEC,
+    )
+    route = {
+        "tier": tier,
+        "reason": reason,
+        "model": model_arn,
+        "latency_ms": int((time.monotonic() - started) * 1000),
+        "escalated": False,
+    }
+    if (
+        tier == "fast"
+        and ROUTING_ESCALATE
+        and _is_hedged(result[0])
+        and deadline.remaining() >= MIN_GENERATION_SEC
+    ):
+        started = time.monotonic()
+        try:
+            result = _call_with_timeout(
+                lambda: call(MODEL_ARN),
+                deadline.budget(GENERATION_TIMEOUT_SEC),
+                HEDGE_AFTER_SEC,
+            )
+            route["escalated"] = True
+        except _StageTimeout:
+            LOGGER.warning("rag_query_escalation_timeout: keeping fast answer")
+        except Exception:
+            # Throttling, validation errors...: the fast answer is still usable.
+            LOGGER.exception("rag_query_escalation_failed: keeping fast answer")
+        route["escalation_model"] = MODEL_ARN
+        route["escalation_latency_ms"] = int((time.monotonic() - started) * 1000)
+    LOGGER.info("rag_query_route: %s", json.dumps(route))
+    return result
+
+
+# --- Generation ---
+def _format_context(sources):
+    """Render sources as the `$search_results$` block of the prompt."""
+    return "\n\n".join(
+        f"<source>\n{source.get('text', '').strip()}\n</source>" for source in sources
+    )
+
+
+def _build_prompt(question, sources):
+    """Fill the prompt template with our own retrieved context."""
+    return PROMPT_TEMPLATE.replace(
+        "$search_results$", _format_context(sources)
+    ).replace("$input$", question)
+
+
+def _generate(question, sources, model_arn):
+    """Call the model with our own retrieved context; returns (answer, stats)."""
+    started = time.monotonic()
+    resp = _runtime_client().converse(
+        modelId=model_arn,
+        messages=[
+            {"role": "user", "content": [{"text": _build_prompt(question, sources)}]}
+        ],
+        inferenceConfig={"maxTokens": 1024},
+    )
+    content = resp.get("output", {}).get("message", {}).get("content", [])
+    usage = resp.get("usage", {})
+    stats = {
+        "latency_ms": int((time.monotonic() - started) * 1000),
+        "input_tokens": usage.get("inputTokens"),
+        "output_tokens": usage.get("outputTokens"),
+    }
+    return "".join(block.get("text", "") for block in content), stats
+
+
+# --- Answer strategies ---
+def _retrieval_only(sources):
+    """Response payload when there was no time left to generate an answer."""
+    return {"answer": RETRIEVAL_ONLY_ANSWER, "sources": sources, "partial": True}
+
+
+def _fallback_retrieve(question, filters, deadline, kb_id=None):
+    """Plain KB retrieve under its own stage timeout; [] on timeout or error."""
+
+    def retrieve():
+        retrieval = _agent_client().retrieve(
+            knowledgeBaseId=kb_id or KB_ID,
+            retrievalQuery={"text": question},
+            retrievalConfiguration={
+                "vectorSearchConfiguration": _vector_search_config(
+                    NUMBER_OF_RESULTS, filters
+                )
+            },
+        )
+        return [_to_source(item) for item in retrieval.get("retrievalResults", [])]
+
     try:
-        resp = client.retrieve_and_generate(
-            input={"text": question},
-            retrieveAndGenerateConfiguration={
-                "type": "KNOWLEDGE_BASE",
-                "knowledgeBaseConfiguration": {
-                    "knowledgeBaseId": KB_ID,
-                    "modelArn": MODEL_ARN,
-                    "retrievalConfiguration": {
-                        "vectorSearchConfiguration": {"numberOfResults": 5}
-                    },
-                    "generationConfiguration": {
-                        "promptTemplate": {
-                            "textPromptTemplate": """You are Mamoru, a compassionate and knowledgeable assistant helping caregivers and clinicians understand dementia care based on peer-reviewed clinical literature from PubMed.
+        return _call_with_timeout(
+            retrieve, deadline.budget(FALLBACK_RETRIEVE_TIMEOUT_SEC)
+        )
+    except _StageTimeout:
+        LOGGER.warning("rag_query_retrieve_timeout")
+    except Exception:
+        LOGGER.exception("rag_query_retrieve_failed")
+    return []
 
-CRITICAL INSTRUCTIONS:
-- Be concise when appropriate
-- Do NOT mention "Source 1", "Source 2", etc. in your response
-- Do NOT reference sources by number or name
-- Do NOT say "the sources show" or "according to the sources"
-- Simply provide the answer directly, as if you are stating facts
-- Be clear and empathetic
-- Focus on the most relevant findings
-- If sources don't address the question, say so briefly
 
-The sources will be displayed separately below your answer, so do not reference them in your text.
+def _answer_with_kb(question, filters, deadline, kb_id=None):
+    """Let Bedrock retrieve and generate in one call; returns the response payload."""
+    if deadline.remaining() < MIN_GENERATION_SEC:
+        LOGGER.warning("rag_query_deadline: skipping generation")
+        return _retrieval_only(_fallback_retrieve(question, filters, deadline, kb_id))
+    try:
+        answer, sources = _call_routed(
+            question,
+            lambda model_arn: _retrieve_and_generate(
+                question, filters, model_arn, kb_id
+            ),
+            deadline,
+        )
+    except _StageTimeout:
+        LOGGER.warning("rag_query_generation_timeout: returning sources only")
+        return _retrieval_only(_fallback_retrieve(question, filters, deadline, kb_id))
 
-Retrieved sources:
-$search_results$
+    # Bedrock sometimes returns a good answer but empty citations; fall back to
+    # retrieve() so the UI still has sources to display.
+    if not sources:
+        sources = _fallback_retrieve(question, filters, deadline, kb_id)
+    return {"answer": answer, "sources": sources}
 
-Question: $input$
 
-Provide a direct answer without mentioning sources:"""
-                        }
-                    },
+def _retrieve_and_generate(question, filters, model_arn, kb_id=None):
+    """One retrieve_and_generate round trip on `model_arn`; returns (answer, sources)."""
+    resp = _agent_client().retrieve_and_generate(
+        input={"text": question},
+        retrieveAndGenerateConfiguration={
+            "type": "KNOWLEDGE_BASE",
+            "knowledgeBaseConfiguration": {
+                "knowledgeBaseId": kb_id or KB_ID,
+                "modelArn": model_arn,
+                "retrievalConfiguration": {
+                    "vectorSearchConfiguration": _vector_search_config(
+                        NUMBER_OF_RESULTS, filters
+                    )
+                },
+                "generationConfiguration": {
+                    "promptTemplate": {"textPromptTemplate": PROMPT_TEMPLATE}
                 },
             },
-        )
-    except Exception as exc:
-        LOGGER.exception("rag_query_failed")
-        return _json_response(500, {"error": str(exc)})
+        },
+    )
 
-    # --- Response shaping ---
     answer = resp.get("output", {}).get("text", "")
     sources = []
     for citation in resp.get("citations", []):
         for ref in citation.get("retrievedReferences", []):
-            sources.append(
-                {
-                    "text": ref.get("content", {}).get("text", ""),
-                    "metadata": ref.get("metadata", {}),
-                }
-            )
+            sources.append(_to_source(ref))
+    return answer, sources
 
-    # Bedrock sometimes returns a good answer but empty citations; fall back to
-    # retrieve() so the UI still has sources to display.
-    if not sources:
+
+def _hybrid_sources(question, filters, deadline, routes=None):
+    """Vector + lexical retrieval fused with RRF (and re-ranked when enabled).
+
+    The KB vector retrieve and the OpenSearch keyword search run in parallel, each
+    under its own timeout. The vector side runs one leg per routed KB, merged by
+    score before fusion; a leg that times out or fails is dropped.
+    Returns (sources, fused): the context we generate from and the full fused list.
+    """
+    kb_legs = _kb_legs(_select_kbs(question, filters) if routes is None else routes)
+    legs = dict(kb_legs)
+    if RETRIEVAL_MODE == "hybrid" and LEXICAL_SEARCH_ENDPOINT:
+        legs["lexical"] = (_lexical_retrieve, LEXICAL_TIMEOUT_SEC)
+    per_leg = RERANK_CANDIDATES if RERANK_ENABLED else NUMBER_OF_RESULTS
+    results = _run_legs(question, legs, per_leg, filters, deadline)
+    LOGGER.info(
+        "rag_query_hybrid_legs: %s",
+        {name: len(results[name]) for name in results},
+    )
+    rankings = [_merge_by_score([results[name] for name in kb_legs if name in results])]
+    if "lexical" in results:
+        rankings.append(results["lexical"])
+    fused = _fuse_rankings(rankings)
+    if RERANK_ENABLED:
+        return _rerank(question, fused, CONTEXT_TOKEN_BUDGET), fused
+    return fused[:NUMBER_OF_RESULTS], fused
+
+
+def _answer_hybrid(question, filters, deadline, routes=None):
+    """Hybrid or federated retrieval, then generation on our own prompt; returns the payload."""
+    sources, fused = _hybrid_sources(question, filters, deadline, routes)
+    baseline = fused[:NUMBER_OF_RESULTS]
+
+    if deadline.remaining() < MIN_GENERATION_SEC:
+        LOGGER.warning("rag_query_deadline: skipping generation")
+        return _retrieval_only(sources)
+    try:
+        answer, generation = _call_routed(
+            question,
+            lambda model_arn: _generate(question, sources, model_arn),
+            deadline,
+            context_tokens=_estimate_tokens(_format_context(sources)),
+        )
+    except _StageTimeout:
+        LOGGER.warning("rag_query_generation_timeout: returning sources only")
+        return _retrieval_only(sources)
+    LOGGER.info(
+        "rag_query_stats: %s",
+        json.dumps(
+            {
+                "rerank": RERANK_ENABLED,
+                "candidates": len(fused),
+                "context_chunks": len(sources),
+                "prompt_tokens_est_before": _estimate_tokens(
+                    _build_prompt(question, baseline)
+                ),
+                "prompt_tokens_est_after": _estimate_tokens(
+                    _build_prompt(question, sources)
+                ),
+                "prompt_tokens": generation["input_tokens"],
+                "generation_latency_ms": generation["latency_ms"],
+            }
+        ),
+    )
+    return {"answer": answer, "sources": sources}
+
+
+def _answer(question, filters, deadline):
+    """Run the configured retrieval/generation strategy; returns the response payload.
+
+    One KB in "kb" mode goes through retrieve_and_generate. RETRIEVAL_MODE=hybrid,
+    or more than one routed KB (RetrieveAndGenerate takes only one), runs our
+    own retrieval and generation in _answer_hybrid.
+    """
+    routes = _select_kbs(question, filters)
+    if RETRIEVAL_MODE == "hybrid" or len(routes) > 1:
+        return _answer_hybrid(question, filters, deadline, routes)
+    (route,) = routes.values()
+    return _answer_with_kb(question, filters, deadline, route["kb_id"])
+
+
+# --- Async jobs ---
+def _get_job_store():
+    """The job store for this container, built from JOB_STORE_URL on first use."""
+    global _job_store
+    if _job_store is None:
+        _job_store = job_store.from_url(JOB_STORE_URL)
+    return _job_store
+
+
+def _wants_async(data, question):
+    """True when the caller asked for a job (`async: true`, or `auto` and not quick).
+
+    Jobs return 202 and a job id; GET /query/{id} returns the status and result.
+    """
+    mode = data.get("async")
+    if mode == "auto":
+        return _question_shape(question)[0] != "fast"
+    return mode is True or str(mode).lower() == "true"
+
+
+def _check_job_store(context):
+    """Raise when jobs would be self-invoked in Lambda without a shared store."""
+    if getattr(context, "function_name", None) and not _get_job_store().shared:
+        raise RuntimeError(
+            "Async jobs in Lambda need a shared JOB_STORE_URL (s3://bucket/prefix/); "
+            "memory:// and file:// stores only live in one container."
+        )
+
+
+def _dispatch_job(job_id, context):
+    """Start a job in the background: an async self-invoke in Lambda, else a thread."""
+    function_name = getattr(context, "function_name", None)
+    if function_name:
+        _lambda_client().invoke(
+            FunctionName=function_name,
+            InvocationType="Event",
+            Payload=json.dumps({"async_job": {"job_id": job_id}}).encode("utf-8"),
+        )
+    else:
+        _job_executor.submit(_run_job, job_id, context)
+
+
+def _run_job(job_id, context):
+    """Execute a stored job and record its result; used by the background invocation."""
+    store = _get_job_store()
+    record = store.get(job_id)
+    if record is None:
+        LOGGER.warning("rag_query_job_missing: %s", job_id)
+        return {"job_id": job_id, "status": "missing"}
+    store.update(job_id, status=job_store.RUNNING)
+    request = record["request"]
+    started = time.monotonic()
+    try:
+        payload = _answer(
+            request["question"], request.get("filters") or {}, _Deadline(context)
+        )
+    except Exception as exc:
+        LOGGER.exception("rag_query_job_failed: %s", job_id)
+        store.update(job_id, status=job_store.FAILED, error=str(exc))
+        return {"job_id": job_id, "status": job_store.FAILED}
+    store.update(job_id, status=job_store.SUCCEEDED, result=payload)
+    LOGGER.info(
+        "rag_query_job_done: %s in %dms",
+        job_id,
+        int((time.monotonic() - started) * 1000),
+    )
+    return {"job_id": job_id, "status": job_store.SUCCEEDED}
+
+
+def _job_status_response(job_id):
+    """GET /query/{id}: the job's status, plus its result or error when finished."""
+    record = _get_job_store().get(job_id)
+    if record is None:
+        return _json_response(404, {"error": "Unknown job id"})
+    payload = {"job_id": job_id, "status": record["status"]}
+    if record["status"] == job_store.SUCCEEDED:
+        payload["result"] = record.get("result")
+    elif record["status"] == job_store.FAILED:
+        payload["error"] = record.get("error")
+    return _json_response(200, payload)
+
+
+# --- Rate limiting ---
+def _get_rate_limiter():
+    """The limiter for this container from RATE_LIMIT_URL, or None when disabled.
+
+    memory:// keeps buckets per process; dynamodb://table shares them across
+    Lambda containers. Over the limit, requests get 429 with Retry-After.
+    """
+    global _rate_limiter
+    if _rate_limiter is None and RATE_LIMIT_URL:
+        _rate_limiter = rate_limit.from_url(
+            RATE_LIMIT_URL, RATE_LIMIT_RPS, RATE_LIMIT_BURST
+        )
+    return _rate_limiter
+
+
+def _rate_limited_response(event, data=None):
+    """A 429 response when this client is over its limit, else None.
+
+    `data` is the parsed body; the standalone server passes only the event.
+    """
+    if data is None:
+        data = _parse_body(event) or {}
+    key = _rate_limit_key(event, data)
+    limiter = _get_rate_limiter()
+    if key is None or limiter is None:
+        return None
+    try:
+        allowed, retry_after = limiter.check(key)
+    except Exception:
+        # Rather serve the request than fail it because the limiter's store is down.
+        LOGGER.exception("rag_query_rate_limit_unavailable")
+        return None
+    if allowed:
+        return None
+    retry_after = max(1, math.ceil(retry_after))
+    LOGGER.info("rag_query_rate_limited: %s retry_after=%ds", key, retry_after)
+    response = _json_response(
+        429,
+        {"error": "Too many requests, please retry later", "retry_after": retry_after},
+    )
+    response["headers"]["Retry-After"] = str(retry_after)
+    return response
+
+
+# --- Warm-up and answer cache ---
+def _is_warmup(event):
+    """True for our scheduled warm-up input or a bare EventBridge scheduled event."""
+    return bool(event.get("warmup")) or event.get("detail-type") == "Scheduled Event"
+
+
+def _warmup_questions():
+    """WARMUP_QUESTIONS as a list; a bad value is logged and ignored."""
+    if not WARMUP_QUESTIONS.strip():
+        return []
+    try:
+        questions = json.loads(WARMUP_QUESTIONS)
+    except json.JSONDecodeError:
+        LOGGER.warning("rag_query_warmup_bad_questions: %s", WARMUP_QUESTIONS)
+        return []
+    return [str(q).strip() for q in questions if str(q).strip()]
+
+
+def _answer_cache_key(question, filters):
+    """Same key for questions that differ only in case or whitespace."""
+    normalized = " ".join(question.lower().split())
+    return json.dumps([normalized, filters or {}], sort_keys=True)
+
+
+def _cached_answer(question, filters):
+    """A fresh pre-computed answer for this question, or None."""
+    entry = _answer_cache.get(_answer_cache_key(question, filters))
+    if entry is None or time.monotonic() - entry[0] > ANSWER_CACHE_TTL_SEC:
+        return None
+    return entry[1]
+
+
+def _warm_up(context):
+    """Build clients without calling Bedrock, then prime missing cached answers.
+
+    Runs on a scheduled `{"warmup": true}` event. WARMUP_QUESTIONS (a JSON list)
+    are answered into the in-container cache unless a fresh answer is there.
+    """
+    global _cold
+    started = time.monotonic()
+    was_cold, _cold = _cold, False
+    _agent_client()
+    _runtime_client()
+
+    deadline = _Deadline(context)
+    primed, skipped, failed = 0, 0, 0
+    for question in _warmup_questions():
+        if _cached_answer(question, {}) is not None:
+            skipped += 1
+            continue
+        if deadline.remaining() < MIN_GENERATION_SEC:
+            LOGGER.info("rag_query_warmup_out_of_time: %s", question)
+            break
         try:
-            retrieval = client.retrieve(
-                knowledgeBaseId=KB_ID,
-                retrievalQuery={"text": question},
-                retrievalConfiguration={
-                    "vectorSearchConfiguration": {"numberOfResults": 5}
-                },
-            )
-            for item in retrieval.get("retrievalResults", []):
-                sources.append(
-                    {
-                        "text": item.get("content", {}).get("text", ""),
-                        "metadata": item.get("metadata", {}),
-                    }
-                )
+            payload = _answer(question, {}, deadline)
         except Exception:
-            LOGGER.exception("rag_query_retrieve_failed")
+            LOGGER.exception("rag_query_warmup_failed: %s", question)
+            failed += 1
+            continue
+        # A partial (retrieval-only) answer is not worth serving from cache.
+        if payload.get("partial"):
+            failed += 1
+            continue
+        _answer_cache[_answer_cache_key(question, {})] = (time.monotonic(), payload)
+        primed += 1
 
-    # --- Return ---
-    return _json_response(
-        200,
-        {
-            "answer": answer,
-            "sources": sources,
-        },
+    summary = {
+        "warmup": True,
+        "cold_start": was_cold,
+        "primed": primed,
+        "already_cached": skipped,
+        "failed": failed,
+        "duration_ms": int((time.monotonic() - started) * 1000),
+    }
+    LOGGER.info("rag_query_warmup: %s", json.dumps(summary))
+    return summary
+
+
+def _request_method(event):
+    """HTTP method for HTTP API (v2) or REST API (v1) events; POST when absent."""
+    method = event.get("requestContext", {}).get("http", {}).get("method")
+    return (method or event.get("httpMethod") or "POST").upper()
+
+
+@profiling.profiled("rag-query")
+def handler(event, context):
+    """Handle a single RAG query: validate, call Bedrock, return answer and sources."""
+    # --- Background job invocation ---
+    if "async_job" in event:
+        return _run_job(event["async_job"]["job_id"], context)
+
+    # --- Scheduled warm-up ---
+    if _is_warmup(event):
+        return _warm_up(context)
+
+    global _cold
+    _cold = False
+
+    # --- Job status lookup ---
+    job_id = (event.get("pathParameters") or {}).get("id")
+    if _request_method(event) == "GET" and job_id:
+        return _job_status_response(job_id)
+
+    deadline = _Deadline(context, cap_ms=SYNC_DEADLINE_MS)
+
+    # --- Validation ---
+    if not _kb_routes():
+        return _json_response(500, {"error": "BEDROCK_KB_ID is not configured"})
+
+    data = _parse_body(event)
+
+    # The standalone server checks the limit itself before coalescing requests.
+    limited = (
+        None
+        if event.get("rate_limit_checked")
+        else _rate_limited_response(event, data or {})
     )
+    if limited is not None:
+        return limited
+
+    if data is None:
+        return _json_response(400, {"error": "Request body is not valid JSON"})
+
+    question = _extract_question(event, data)
+    if not question:
+        return _json_response(400, {"error": "Missing question"})
+
+    try:
+        filters = _extract_filters(data)
+    except ValueError as exc:
+        return _json_response(400, {"error": str(exc)})
+
+    client_ip = _extract_client_ip(data) or "-"
+    LOGGER.info("rag_query: %s %s", client_ip, question)
+    if filters:
+        LOGGER.info("rag_query_filters: %s", json.dumps(filters))
+
+    # --- Async submission ---
+    if _wants_async(data, question):
+        job_id = uuid.uuid4().hex
+        try:
+            _check_job_store(context)
+            _get_job_store().create(job_id, {"question": question, "filters": filters})
+            _dispatch_job(job_id, context)
+        except Exception as exc:
+            LOGGER.exception("rag_query_job_submit_failed")
+            return _json_response(500, {"error": str(exc)})
+        LOGGER.info("rag_query_job_submitted: %s", job_id)
+        response = _json_response(202, {"job_id": job_id, "status": job_store.PENDING})
+        response["headers"]["Location"] = f"/query/{job_id}"
+        return response
+
+    # --- Pre-computed answer ---
+    cached = _cached_answer(question, filters)
+    if cached is not None:
+        LOGGER.info("rag_query_cache_hit: %s", question)
+        return _json_response(200, cached)
+
+    # --- Retrieve and generate ---
+    try:
+        payload = _answer(question, filters, deadline)
+    except Exception as exc:
+        LOGGER.exception("rag_query_failed")
+        return _json_response(500, {"error": str(exc)})
+
+    # --- Return ---
+    return _json_response(200, payload)
@@ -0,0 +1,46 @@
+"""MEDLINE record helpers shared by ingest, bulk ingest and processing."""
+
+import re
+
+
+def mesh_descriptor(heading):
+    """'*Dementia/therapy' -> 'Dementia': drop the major-topic star and qualifiers."""
+    return heading.lstrip("*").split("/", 1)[0].strip()
+
+
+def format_record(rec):
+    """One parsed MEDLINE record as the .txt block the ingest Lambda writes to raw/."""
+    parts = []
+    if rec.get("PMID"):
+        parts.append(f"PMID: {rec['PMID']}")
+    if rec.get("TI"):
+        parts.append(f"Title: {rec['TI']}")
+    if rec.get("AU"):
+        parts.append(f"Authors: {', '.join(rec['AU'])}")
+    if rec.get("JT"):
+        parts.append(f"Journal: {rec['JT']}")
+    if rec.get("DP"):
+        parts.append(f"Date: {rec['DP']}")
+    if rec.get("MH"):
+        parts.append(f"MeSH Terms: {'; '.join(rec['MH'])}")
+    if rec.get("PT"):
+        parts.append(f"Publication Types: {'; '.join(rec['PT'])}")
+    if rec.get("AB"):
+        parts.append(f"Abstract:\n{rec['AB']}")
+    return "\n".join(parts).strip()
+
+
+def kb_metadata(rec):
+    """Bedrock KB metadata sidecar for one record; attributes filter at query time."""
+    attributes = {"pmid": rec["PMID"]}
+    if rec.get("JT"):
+        attributes["journal"] = rec["JT"]
+    year = re.match(r"\d{4}", rec.get("DP", ""))
+    if year:
+        attributes["year"] = int(year.group(0))
+    mesh = sorted({mesh_descriptor(h) for h in rec.get("MH", []) if h.strip("*")})
+    if mesh:
+        attributes["mesh"] = mesh
+    if rec.get("PT"):
+        attributes["publication_types"] = list(rec["PT"])
+    return {"metadataAttributes": attributes}
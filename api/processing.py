@@ -0,0 +1,252 @@
+"""Processing stage: turn raw PubMed .txt records into knowledge-base documents.
+
+This is the processing notebook's parse/normalize/export logic as an importable
+module. Besides the JSONL export, it writes one `.txt` per record with a
+`.metadata.json` sidecar; Bedrock only reads metadata from sidecars, so that is
+what makes journal, year, MeSH and publication-type filters work at query time.
+It also writes a columnar snapshot (see api/snapshot.py) that stats and later
+reprocessing (`--from-snapshot`) read instead of the raw files.
+
+--raw-dir and --output-dir take api.storage URLs, so the same run reads
+s3://bucket/raw/ and writes s3://bucket/processed/ (the snapshot is only
+written to local output directories).
+
+Run locally: `python -m api.processing --raw-dir data/pubmed_fetch --output-dir data`
+"""
+
+import argparse
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+
+from api import medline, storage
+
+
+# --- Parsing ---
+def parse_record(text):
+    """Parse our .txt fetch format (see the ingest Lambda) into a simple dict."""
+    record = {
+        "pmid": None,
+        "title": "",
+        "authors": "",
+        "journal": "",
+        "date": "",
+        "mesh": [],
+        "publication_types": [],
+        "abstract": "",
+    }
+    abstract_lines = []
+    in_abstract = False
+
+    for line in text.splitlines():
+        if in_abstract:
+            abstract_lines.append(line)
+            continue
+        if line.startswith("PMID: "):
+            record["pmid"] = line.replace("PMID: ", "").strip()
+        elif line.startswith("Title: "):
+            record["title"] = line.replace("Title: ", "").strip()
+        elif line.startswith("Authors: "):
+            record["authors"] = line.replace("Authors: ", "").strip()
+        elif line.startswith("Journal: "):
+            record["journal"] = line.replace("Journal: ", "").strip()
+        elif line.startswith("Date: "):
+            record["date"] = line.replace("Date: ", "").strip()
+        elif line.startswith("MeSH Terms: "):
+            record["mesh"] = _split_list(line.replace("MeSH Terms: ", ""))
+        elif line.startswith("Publication Types: "):
+            record["publication_types"] = _split_list(
+                line.replace("Publication Types: ", "")
+            )
+        elif line.startswith("Abstract:"):
+            in_abstract = True
+            abstract_lines.append(line.replace("Abstract:", "").lstrip())
+
+    record["abstract"] = "\n".join([line for line in abstract_lines if line]).strip()
+    return record
+
+
+def _split_list(value):
+    """Split a '; '-joined field back into its items."""
+    return [item.strip() for item in value.split(";") if item.strip()]
+
+
+# --- Normalization ---
+def normalize_whitespace(text):
+    """Collapse whitespace to single spaces and strip; used for export fields."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def normalize_date(value):
+    """Best-effort YYYY-MM-DD for '2026 Jan 7', '2025 Dec' or '2025'; else the input."""
+    value = (value or "").strip()
+    if not value:
+        return ""
+    try:
+        return datetime.strptime(value, "%Y %b %d").strftime("%Y-%m-%d")
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, "%Y %b").strftime("%Y-%m-01")
+    except ValueError:
+        pass
+    if re.fullmatch(r"\d{4}", value):
+        return f"{value}-01-01"
+    return value
+
+
+# --- Export ---
+def build_record_doc(rec):
+    """Build the {id, text, metadata} document we export and index for one record."""
+    title = normalize_whitespace(rec.get("title", ""))
+    abstract = normalize_whitespace(rec.get("abstract", ""))
+    date = normalize_date(rec.get("date"))
+    year = int(date[:4]) if re.match(r"\d{4}", date) else None
+    return {
+        "id": rec.get("pmid"),
+        "text": "\n".join([t for t in [title, abstract] if t]),
+        "metadata": {
+            "pmid": rec.get("pmid"),
+            "title": title,
+            "journal": rec.get("journal"),
+            "authors": rec.get("authors"),
+            "date": date,
+            "year": year,
+            "mesh": sorted(
+                {
+                    medline.mesh_descriptor(h)
+                    for h in rec.get("mesh", [])
+                    if h.strip("*")
+                }
+            ),
+            "publication_types": list(rec.get("publication_types", [])),
+            "source": "pubmed_fetch",
+        },
+    }
+
+
+def kb_metadata_attributes(doc):
+    """Bedrock KB `.metadata.json` sidecar body for a document (filterable fields only)."""
+    metadata = doc["metadata"]
+    attributes = {"pmid": metadata["pmid"]}
+    for key in ("title", "journal", "year"):
+        if metadata.get(key):
+            attributes[key] = metadata[key]
+    for key in ("mesh", "publication_types"):
+        if metadata.get(key):
+            attributes[key] = metadata[key]
+    return {"metadataAttributes": attributes}
+
+
+def write_jsonl(docs, path):
+    """Write documents as one JSON object per line; returns the count written."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as handle:
+        for doc in docs:
+            handle.write(json.dumps(doc, ensure_ascii=True) + "\n")
+            count += 1
+    return count
+
+
+def export_jsonl(docs, out, key):
+    """write_jsonl into a storage (see api/storage.py); returns the count written."""
+    if isinstance(out, storage.LocalStorage):
+        os.makedirs(out.root, exist_ok=True)
+        return write_jsonl(docs, out.path(key))
+    count = 0
+    with tempfile.TemporaryFile() as spool:
+        for doc in docs:
+            spool.write((json.dumps(doc, ensure_ascii=True) + "\n").encode("utf-8"))
+            count += 1
+        spool.seek(0)
+        out.put(key, spool)
+    return count
+
+
+def write_kb_documents(docs, out_dir):
+    """Write `<pmid>.txt` plus `<pmid>.txt.metadata.json` per document; returns count.
+
+    `out_dir` is a directory, a storage URL, or a storage.Storage.
+    """
+    out = storage.from_url(out_dir) if isinstance(out_dir, str) else out_dir
+    count = 0
+    for doc in docs:
+        if not doc.get("id") or not doc.get("text"):
+            continue
+        key = f"{doc['id']}.txt"
+        out.put(key, doc["text"].encode("utf-8"))
+        out.put(
+            f"{key}.metadata.json",
+            json.dumps(kb_metadata_attributes(doc)).encode("utf-8"),
+        )
+        count += 1
+    out.flush()
+    if out is not out_dir:
+        out.close()
+    return count
+
+
+def load_records(raw_dir):
+    """Parse every raw .txt record in a directory or storage URL, in PMID file order."""
+    raw = storage.from_url(raw_dir) if isinstance(raw_dir, str) else raw_dir
+    keys = [key for key in raw.keys() if key.endswith(".txt") and "/" not in key]
+    return [
+        parse_record(body.decode("utf-8"))
+        for body in raw.get_many(keys)
+        if body is not None
+    ]
+
+
+def main(argv=None):
+    """CLI entry point: raw .txt directory -> JSONL export, KB documents, snapshot."""
+    from api import snapshot
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--raw-dir", default="data/pubmed_fetch")
+    parser.add_argument("--output-dir", default="data")
+    parser.add_argument(
+        "--from-snapshot", help="Read records from this snapshot, not --raw-dir"
+    )
+    parser.add_argument("--no-snapshot", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.from_snapshot:
+        records = list(snapshot.iter_records(args.from_snapshot))
+        source = args.from_snapshot
+    else:
+        records = load_records(args.raw_dir)
+        source = args.raw_dir
+    if not records:
+        raise FileNotFoundError(f"No records found in {source}.")
+    docs = [build_record_doc(rec) for rec in records]
+
+    run_date = datetime.now(timezone.utc).strftime("%Y%m%d")
+    jsonl_key = f"pubmed_records_{run_date}.jsonl"
+    with storage.from_url(args.output_dir) as out:
+        exported = export_jsonl(docs, out, jsonl_key)
+        indexed = write_kb_documents(docs, _join(args.output_dir, "kb_docs"))
+    print(
+        f"Wrote {exported} records to {_join(args.output_dir, jsonl_key)} "
+        f"and {indexed} KB docs to {_join(args.output_dir, 'kb_docs')}"
+    )
+    if args.no_snapshot or args.from_snapshot:
+        return
+    if not isinstance(out, storage.LocalStorage):
+        print("Skipped the snapshot: --output-dir is not a local directory")
+        return
+    snapshot_dir = os.path.join(out.root, "snapshot")
+    rows = snapshot.write_snapshot(records, snapshot_dir)
+    print(f"Wrote a {rows}-record snapshot to {snapshot_dir}")
+
+
+def _join(location, name):
+    """Join a directory or storage URL with a relative name."""
+    if "://" in location:
+        return location + ("" if location.endswith("/") else "/") + name
+    return os.path.join(location, name)
+
+
+if __name__ == "__main__":
+    main()
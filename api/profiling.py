@@ -0,0 +1,115 @@
+"""Opt-in profiling for the Lambda handlers.
+
+With PROFILE_MODE=always every invocation runs under cProfile and tracemalloc;
+with PROFILE_MODE=sample only every PROFILE_EVERY_N-th invocation per container
+does. Each profiled invocation writes two objects to PROFILE_SINK (a local
+directory or an s3://bucket/prefix/), named after the handler and request id:
+
+  <name>/<request_id>.prof  cProfile stats (load with pstats or snakeviz)
+  <name>/<request_id>.json  duration, peak memory, top functions and allocations
+
+When PROFILE_MODE is off (the default) `profiled` returns the handler itself, so
+nothing is added to the call path.
+"""
+
+import functools
+import io
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+
+from api import storage
+
+LOGGER = logging.getLogger("profiling")
+LOGGER.setLevel(logging.INFO)
+
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off").strip().lower()
+PROFILE_EVERY_N = int(os.getenv("PROFILE_EVERY_N", "100"))
+PROFILE_SINK = os.getenv("PROFILE_SINK", "/tmp/profiles")
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+
+
+def profiled(name, mode=None, every_n=None, sink=None):
+    """Decorator for `handler(event, context)`; a no-op unless profiling is enabled."""
+    mode = PROFILE_MODE if mode is None else mode
+    if mode not in ("always", "sample"):
+        return lambda fn: fn
+    every_n = 1 if mode == "always" else max(1, every_n or PROFILE_EVERY_N)
+    sink = sink or PROFILE_SINK
+
+    def decorate(fn):
+        counter = itertools.count(1)
+
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            if next(counter) % every_n:
+                return fn(event, context)
+            return _profile_call(name, sink, fn, event, context)
+
+        return wrapper
+
+    return decorate
+
+
+def _profile_call(name, sink, fn, event, context):
+    """Run one invocation under cProfile + tracemalloc and write the results."""
+    import cProfile
+    import tracemalloc
+
+    request_id = getattr(context, "aws_request_id", None) or uuid.uuid4().hex
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    started = time.monotonic()
+    try:
+        return profiler.runcall(fn, event, context)
+    finally:
+        duration_ms = int((time.monotonic() - started) * 1000)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+        try:
+            _write_profile(
+                name, sink, request_id, profiler, snapshot, peak, duration_ms
+            )
+        except Exception:
+            # A broken sink must never fail the request being profiled.
+            LOGGER.exception("profile_write_failed: %s %s", name, request_id)
+
+
+def _write_profile(name, sink, request_id, profiler, snapshot, peak, duration_ms):
+    import marshal
+    import pstats
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    stats.sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+    allocations = [
+        {
+            "location": str(stat.traceback[0]),
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:PROFILE_TOP_N]
+    ]
+    summary = {
+        "handler": name,
+        "request_id": request_id,
+        "profiled_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "duration_ms": duration_ms,
+        "peak_memory_kb": round(peak / 1024, 1),
+        "top_functions": stats.stream.getvalue(),
+        "top_allocations": allocations,
+    }
+    base = f"{name}/{request_id}"
+    with storage.from_url(sink) as out:
+        out.put(f"{base}.prof", marshal.dumps(stats.stats))
+        out.put(f"{base}.json", json.dumps(summary, indent=2).encode("utf-8"))
+    LOGGER.info(
+        "profile_written: %s",
+        json.dumps({"sink": sink, "key": base, "duration_ms": duration_ms}),
+    )
@@ -0,0 +1,452 @@
+"""Bulk ingest from the PubMed baseline and daily update XML files.
+
+E-utilities top out at a few thousand records a minute; the annual baseline and
+the daily update files (`pubmedYYnNNNN.xml.gz`, from ftp.ncbi.nlm.nih.gov/pubmed/)
+hold everything. This reads those files from a local directory or an
+s3://bucket/prefix/, parses them incrementally (one <PubmedArticle> in memory at a
+time), keeps the records that match our MeSH/topic filter, and writes the same
+outputs as the rest of the pipeline:
+
+  raw        <pmid>.txt + <pmid>.txt.metadata.json, as the ingest Lambda writes
+  processed  records-<file>.jsonl + kb_docs/, as api.processing writes
+
+Outputs are api.storage URLs: a local directory, s3://bucket/prefix/ (writes
+go out concurrently), or memory:// to time parsing without any I/O.
+
+Baseline files hold each PMID once, so they are parsed in parallel (one process
+per file). Update files can revise or delete a PMID that an earlier file wrote,
+so they run one at a time in file-name order, after the baseline. Each PMID in
+an update file supersedes what earlier files wrote for it: a deleted citation,
+or a revision that no longer matches the filter, is removed from raw and
+kb_docs/. Once the update files are done, each records-*.jsonl export is read
+and rewritten at most once, keeping every PMID the updates touched only in its
+newest export. Nothing here talks to NCBI; download the files first.
+
+Run locally:
+  python -m api.pubmed_bulk --baseline data/baseline --updates data/updatefiles \\
+      --raw-out data/pubmed_fetch --processed-out data/processed
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from api import aws_clients, medline, processing, storage
+
+LOGGER = logging.getLogger("pubmed-bulk")
+LOGGER.setLevel(logging.INFO)
+
+# The ingest Lambda's PUBMED_QUERY as data: every group must match, and a group
+# matches on any of its MeSH descriptors (exact, no explosion, so the narrower
+# dementia headings are listed) or title/abstract terms (`*` = prefix).
+DEFAULT_FILTER = [
+    {
+        "mesh": [
+            "Dementia",
+            "Alzheimer Disease",
+            "Dementia, Vascular",
+            "Frontotemporal Dementia",
+            "Lewy Body Disease",
+            "Mild Cognitive Impairment",
+        ]
+    },
+    {
+        "mesh": ["Decision Support Systems, Clinical", "Caregivers"],
+        "tiab": ["caregiver*", "decision support"],
+    },
+]
+
+_MONTHS = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
+
+
+# --- XML -> MEDLINE-style record ---
+def _text(elem):
+    """All text under an element (titles and abstracts carry inline markup)."""
+    return "".join(elem.itertext()).strip() if elem is not None else ""
+
+
+def _pub_date(journal_issue):
+    """MEDLINE DP ('2024 Mar 5', '2024 Mar', '2024') from <PubDate>."""
+    pub_date = journal_issue.find("PubDate") if journal_issue is not None else None
+    if pub_date is None:
+        return ""
+    medline_date = pub_date.findtext("MedlineDate")
+    if medline_date:
+        return medline_date.strip()
+    month = (pub_date.findtext("Month") or "").strip()
+    if month.isdigit() and 1 <= int(month) <= 12:
+        month = _MONTHS[int(month) - 1]
+    day = (pub_date.findtext("Day") or "").strip().lstrip("0")
+    parts = [(pub_date.findtext("Year") or "").strip(), month, day if month else ""]
+    return " ".join(part for part in parts if part)
+
+
+def _mesh_headings(citation):
+    """MEDLINE MH values: '*Dementia/therapy', 'Caregivers/*psychology'."""
+    headings = []
+    for heading in citation.iterfind("MeshHeadingList/MeshHeading"):
+        descriptor = heading.find("DescriptorName")
+        if descriptor is None or not descriptor.text:
+            continue
+        star = "*" if descriptor.get("MajorTopicYN") == "Y" else ""
+        value = star + descriptor.text.strip()
+        for qualifier in heading.iterfind("QualifierName"):
+            star = "*" if qualifier.get("MajorTopicYN") == "Y" else ""
+            value += f"/{star}{(qualifier.text or '').strip()}"
+        headings.append(value)
+    return headings
+
+
+def article_to_medline(article):
+    """One <PubmedArticle> as the dict Bio.Medline.parse would give for it."""
+    citation = article.find("MedlineCitation")
+    if citation is None:
+        return None
+    pmid = (citation.findtext("PMID") or "").strip()
+    art = citation.find("Article")
+    if not pmid or art is None:
+        return None
+
+    rec = {"PMID": pmid}
+    title = _text(art.find("ArticleTitle"))
+    if title:
+        rec["TI"] = title
+    sections = []
+    for part in art.iterfind("Abstract/AbstractText"):
+        text = _text(part)
+        if text:
+            label = part.get("Label")
+            sections.append(f"{label}: {text}" if label else text)
+    if sections:
+        rec["AB"] = " ".join(sections)
+    authors = []
+    for author in art.iterfind("AuthorList/Author"):
+        last = (author.findtext("LastName") or "").strip()
+        if last:
+            initials = (author.findtext("Initials") or "").strip()
+            authors.append(f"{last} {initials}".strip())
+        elif author.findtext("CollectiveName"):
+            authors.append(author.findtext("CollectiveName").strip())
+    if authors:
+        rec["AU"] = authors
+    journal = (art.findtext("Journal/Title") or "").strip()
+    if journal:
+        rec["JT"] = journal
+    date = _pub_date(art.find("Journal/JournalIssue"))
+    if date:
+        rec["DP"] = date
+    mesh = _mesh_headings(citation)
+    if mesh:
+        rec["MH"] = mesh
+    types = [_text(pt) for pt in art.iterfind("PublicationTypeList/PublicationType")]
+    if types:
+        rec["PT"] = [pt for pt in types if pt]
+    return rec
+
+
+def iter_citations(stream):
+    """Yield ("article", record) and ("delete", pmid) from a PubMed XML stream.
+
+    Each element is cleared once handled, so memory stays flat however big the file.
+    """
+    root = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event != "end":
+            continue
+        if elem.tag == "PubmedArticle":
+            rec = article_to_medline(elem)
+            if rec:
+                yield "article", rec
+            root.clear()
+        elif elem.tag == "DeleteCitation":
+            for pmid in elem.iterfind("PMID"):
+                if pmid.text:
+                    yield "delete", pmid.text.strip()
+            root.clear()
+
+
+# --- Filter ---
+def _term_pattern(term):
+    """caregiver* -> prefix match; other terms match as whole words/phrases."""
+    body = re.escape(term.rstrip("*").lower())
+    return rf"\b{body}" + ("" if term.endswith("*") else r"\b")
+
+
+def compile_filter(groups):
+    """Predicate over MEDLINE records for AND-of-OR groups (see DEFAULT_FILTER)."""
+    compiled = [
+        (
+            {heading.lower() for heading in group.get("mesh", [])},
+            [re.compile(_term_pattern(term)) for term in group.get("tiab", [])],
+        )
+        for group in groups
+    ]
+
+    def matches(rec):
+        descriptors = {
+            medline.mesh_descriptor(heading).lower() for heading in rec.get("MH", [])
+        }
+        tiab = f"{rec.get('TI', '')} {rec.get('AB', '')}".lower()
+        return all(
+            descriptors & mesh or any(pattern.search(tiab) for pattern in terms)
+            for mesh, terms in compiled
+        )
+
+    return matches
+
+
+# --- Input / output locations ---
+def list_files(source):
+    """Sorted .xml.gz (or .xml) files under a local directory or s3://bucket/prefix."""
+    if source.startswith("s3://"):
+        bucket, _, prefix = source[len("s3://") :].partition("/")
+        paginator = aws_clients.client("s3").get_paginator("list_objects_v2")
+        keys = [
+            obj["Key"]
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+            for obj in page.get("Contents", [])
+            if obj["Key"].endswith((".xml.gz", ".xml"))
+        ]
+        return [f"s3://{bucket}/{key}" for key in sorted(keys)]
+    return [
+        os.path.join(source, name)
+        for name in sorted(os.listdir(source))
+        if name.endswith((".xml.gz", ".xml"))
+    ]
+
+
+def _open(path):
+    """Binary stream for a local or s3:// file, gunzipped on the fly if needed."""
+    if not path.startswith("s3://"):
+        return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+    bucket, _, key = path[len("s3://") :].partition("/")
+    body = aws_clients.client("s3").get_object(Bucket=bucket, Key=key)["Body"]
+    return gzip.GzipFile(fileobj=body) if path.endswith(".gz") else body
+
+
+# --- Per-file worker ---
+def _remove(raw, processed, pmid):
+    """Drop a PMID's raw record and KB document (missing keys are fine)."""
+    for out, prefix in ((raw, ""), (processed, "kb_docs/")):
+        if out:
+            out.delete(f"{prefix}{pmid}.txt")
+            out.delete(f"{prefix}{pmid}.txt.metadata.json")
+
+
+def _drop_superseded(processed, owners, batch=64):
+    """Rewrite records-*.jsonl exports once, keeping each PMID in `owners[pmid]`.
+
+    `owners` maps every PMID the update files touched to the export holding its
+    newest version (None when it was deleted or no longer matches).
+    """
+    keys = [key for key in processed.keys("records-") if key.endswith(".jsonl")]
+    rewritten = 0
+    for start in range(0, len(keys), batch):
+        chunk = keys[start : start + batch]
+        for key, body in zip(chunk, processed.get_many(chunk)):
+            lines = (body or b"").splitlines(keepends=True)
+            kept, seen = [], set()
+            # Newest line first, so a PMID revised twice in one file keeps its last.
+            for line in reversed(lines):
+                pmid = json.loads(line)["id"]
+                if pmid in owners and (owners[pmid] != key or pmid in seen):
+                    continue
+                seen.add(pmid)
+                kept.append(line)
+            if len(kept) == len(lines):
+                continue
+            if kept:
+                processed.put(key, b"".join(reversed(kept)))
+            else:
+                processed.delete(key)
+            rewritten += 1
+    return rewritten
+
+
+def process_file(
+    path,
+    raw_out=None,
+    processed_out=None,
+    filter_groups=None,
+    update=False,
+    owners=None,
+):
+    """Parse one file and write matching records; returns that file's counts.
+
+    With `update`, every PMID in the file replaces what earlier files wrote:
+    articles that no longer match are removed from raw and kb_docs/, and
+    `owners` (when given) records which export now holds each PMID, for
+    _drop_superseded to apply once every update file is done.
+    """
+    started = time.monotonic()
+    matches = compile_filter(DEFAULT_FILTER if filter_groups is None else filter_groups)
+    stem = os.path.basename(path).split(".")[0]
+    stats = {"file": path, "articles": 0, "matched": 0, "deleted": 0}
+    export_key = f"records-{stem}.jsonl"
+    touched = {}  # update files only: PMID -> export now holding it
+
+    # The JSONL export is spooled to a temp file so memory stays flat per file too.
+    # Leaving the stack flushes both outputs, so a file's writes land before the next.
+    with ExitStack() as stack:
+        raw = stack.enter_context(storage.from_url(raw_out)) if raw_out else None
+        processed = (
+            stack.enter_context(storage.from_url(processed_out))
+            if processed_out
+            else None
+        )
+        stream = stack.enter_context(_open(path))
+        jsonl = stack.enter_context(tempfile.TemporaryFile())
+        for kind, item in iter_citations(stream):
+            if kind == "delete":
+                _remove(raw, processed, item)
+                if update:
+                    touched[item] = None
+                stats["deleted"] += 1
+                continue
+            stats["articles"] += 1
+            pmid = item["PMID"]
+            text = medline.format_record(item) if matches(item) else ""
+            if not text:
+                if update:
+                    _remove(raw, processed, pmid)
+                    touched[pmid] = None
+                continue
+            if update:
+                touched[pmid] = export_key
+            stats["matched"] += 1
+            if raw:
+                raw.put(f"{pmid}.txt", text.encode("utf-8"))
+                raw.put(
+                    f"{pmid}.txt.metadata.json",
+                    json.dumps(medline.kb_metadata(item)).encode("utf-8"),
+                )
+            if processed:
+                doc = processing.build_record_doc(processing.parse_record(text))
+                processed.put(f"kb_docs/{pmid}.txt", doc["text"].encode("utf-8"))
+                processed.put(
+                    f"kb_docs/{pmid}.txt.metadata.json",
+                    json.dumps(processing.kb_metadata_attributes(doc)).encode("utf-8"),
+                )
+                jsonl.write((json.dumps(doc, ensure_ascii=True) + "\n").encode("utf-8"))
+        if processed and jsonl.tell():
+            jsonl.seek(0)
+            processed.put(export_key, jsonl)
+    if owners is not None:
+        owners.update(touched)
+
+    stats["seconds"] = round(time.monotonic() - started, 3)
+    LOGGER.info("pubmed_bulk_file: %s", json.dumps(stats))
+    return stats
+
+
+def run(
+    baseline=None,
+    updates=None,
+    raw_out=None,
+    processed_out=None,
+    filter_groups=None,
+    workers=None,
+):
+    """Baseline files in parallel, then update files in order; returns a summary."""
+    if not (raw_out or processed_out):
+        raise ValueError("Set raw_out and/or processed_out")
+    started = time.monotonic()
+    files = []
+    if baseline:
+        paths = list_files(baseline)
+        # Spawned, not forked: the parent may hold threads and pooled S3 clients.
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            futures = [
+                pool.submit(process_file, path, raw_out, processed_out, filter_groups)
+                for path in paths
+            ]
+            files.extend(future.result() for future in futures)
+    rewritten = 0
+    if updates:
+        owners = {}
+        for path in list_files(updates):
+            files.append(
+                process_file(
+                    path,
+                    raw_out,
+                    processed_out,
+                    filter_groups,
+                    update=True,
+                    owners=owners,
+                )
+            )
+        if processed_out and owners:
+            with storage.from_url(processed_out) as processed:
+                rewritten = _drop_superseded(processed, owners)
+
+    seconds = time.monotonic() - started
+    articles = sum(f["articles"] for f in files)
+    return {
+        "files": len(files),
+        "articles": articles,
+        "matched": sum(f["matched"] for f in files),
+        "deleted": sum(f["deleted"] for f in files),
+        "exports_rewritten": rewritten,
+        "seconds": round(seconds, 3),
+        "articles_per_sec": round(articles / seconds, 1) if seconds else None,
+        "per_file": files,
+    }
+
+
+def main(argv=None):
+    """CLI entry point: baseline/update XML -> raw and/or processed records."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--baseline", help="Directory or s3:// prefix of baseline files"
+    )
+    parser.add_argument("--updates", help="Directory or s3:// prefix of update files")
+    parser.add_argument("--raw-out", help="Where to write raw .txt + sidecars")
+    parser.add_argument("--processed-out", help="Where to write JSONL + kb_docs/")
+    parser.add_argument(
+        "--filter", help="JSON file with MeSH/tiab groups (default: DEFAULT_FILTER)"
+    )
+    parser.add_argument("--all", action="store_true", help="Keep every article")
+    parser.add_argument(
+        "--workers", type=int, help="Baseline processes (default: CPUs)"
+    )
+    args = parser.parse_args(argv)
+
+    if not (args.baseline or args.updates):
+        parser.error("pass --baseline and/or --updates")
+    if not (args.raw_out or args.processed_out):
+        parser.error("pass --raw-out and/or --processed-out")
+    filter_groups = None
+    if args.all:
+        filter_groups = []
+    elif args.filter:
+        with open(args.filter, "r", encoding="utf-8") as handle:
+            filter_groups = json.load(handle)
+
+    summary = run(
+        baseline=args.baseline,
+        updates=args.updates,
+        raw_out=args.raw_out,
+        processed_out=args.processed_out,
+        filter_groups=filter_groups,
+        workers=args.workers,
+    )
+    summary.pop("per_file")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Per-client token-bucket rate limiting for the query API.
+
+Each client gets a bucket of `burst` tokens that refills at `rate` tokens per
+second; a request takes one token or is rejected with the seconds until the next
+token. Pick where the buckets live with a URL: `memory://` keeps them in the
+process (the standalone server, or one Lambda container), `dynamodb://table`
+shares them across Lambda containers. An empty URL or `none://` turns limiting off.
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+from api import aws_clients
+
+
+class BucketStore:
+    """Base class: backends implement take() atomically for one bucket."""
+
+    def take(self, key, rate, burst, now):
+        """Spend one token from `key`'s bucket; returns (allowed, retry_after_sec)."""
+        raise NotImplementedError
+
+
+def _refill(tokens, updated_at, rate, burst, now):
+    """Tokens in a bucket at `now`, given its last recorded state."""
+    return min(float(burst), tokens + max(0.0, now - updated_at) * rate)
+
+
+def _spend(tokens, rate):
+    """Apply one request to a refilled bucket: (allowed, tokens_after, retry_after)."""
+    if tokens >= 1.0:
+        return True, tokens - 1.0, 0.0
+    return False, tokens, (1.0 - tokens) / rate
+
+
+class MemoryBucketStore(BucketStore):
+    """Process-local buckets; shared by every thread in the process.
+
+    A bucket that has refilled to `burst` is the same as no bucket, so those are
+    dropped every `sweep_interval` seconds to keep memory bounded by active clients.
+    """
+
+    def __init__(self, sweep_interval=60.0):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval
+        self._next_sweep = None
+
+    def take(self, key, rate, burst, now):
+        with self._lock:
+            if self._next_sweep is None or now >= self._next_sweep:
+                self._sweep(rate, burst, now)
+            tokens, updated_at = self._buckets.get(key, (float(burst), now))
+            tokens = _refill(tokens, updated_at, rate, burst, now)
+            allowed, tokens, retry_after = _spend(tokens, rate)
+            self._buckets[key] = (tokens, now)
+        return allowed, retry_after
+
+    def _sweep(self, rate, burst, now):
+        self._buckets = {
+            key: (tokens, updated_at)
+            for key, (tokens, updated_at) in self._buckets.items()
+            if _refill(tokens, updated_at, rate, burst, now) < burst
+        }
+        self._next_sweep = now + self._sweep_interval
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class DynamoDBBucketStore(BucketStore):
+    """One item per client (`pk`, `tokens`, `updated_at`), updated with optimistic locking.
+
+    Items carry an `expires_at` attribute; enable TTL on it so idle buckets go away.
+    """
+
+    MAX_RETRIES = 3
+
+    def __init__(self, table, client=None):
+        self._table = table
+        self._client = client or aws_clients.client("dynamodb")
+
+    def take(self, key, rate, burst, now):
+        from botocore.exceptions import ClientError
+
+        for _ in range(self.MAX_RETRIES):
+            item = self._client.get_item(
+                TableName=self._table, Key={"pk": {"S": key}}, ConsistentRead=True
+            ).get("Item")
+            if item:
+                previous = item["updated_at"]["N"]
+                tokens = _refill(
+                    float(item["tokens"]["N"]), float(previous), rate, burst, now
+                )
+                condition = {
+                    "ConditionExpression": "updated_at = :previous",
+                    "ExpressionAttributeValues": {":previous": {"N": previous}},
+                }
+            else:
+                tokens = float(burst)
+                condition = {"ConditionExpression": "attribute_not_exists(pk)"}
+            allowed, tokens, retry_after = _spend(tokens, rate)
+            try:
+                self._client.put_item(
+                    TableName=self._table,
+                    Item={
+                        "pk": {"S": key},
+                        "tokens": {"N": repr(tokens)},
+                        "updated_at": {"N": repr(now)},
+                        "expires_at": {"N": str(int(now + burst / rate) + 60)},
+                    },
+                    **condition,
+                )
+            except ClientError as exc:
+                code = exc.response.get("Error", {}).get("Code")
+                if code == "ConditionalCheckFailedException":
+                    continue  # another container spent from this bucket; re-read
+                raise
+            return allowed, retry_after
+        # Heavy contention on one key is itself a sign of a noisy client.
+        return False, 1.0 / rate
+
+
+class RateLimiter:
+    """Token bucket per client key on top of a BucketStore."""
+
+    def __init__(self, store, rate, burst):
+        self._store = store
+        self.rate = float(rate)
+        self.burst = float(burst)
+
+    def check(self, key, now=None):
+        """(allowed, retry_after_sec) for one request from `key`."""
+        now = time.time() if now is None else now
+        return self._store.take(key, self.rate, self.burst, now)
+
+
+def from_url(url, rate, burst):
+    """Build a limiter from `memory://` or `dynamodb://table`; None when disabled."""
+    parsed = urlparse(url or "none://")
+    if parsed.scheme == "none" or rate <= 0:
+        return None
+    if parsed.scheme == "memory":
+        return RateLimiter(MemoryBucketStore(), rate, burst)
+    if parsed.scheme == "dynamodb":
+        return RateLimiter(DynamoDBBucketStore(parsed.netloc), rate, burst)
+    raise ValueError(f"Unsupported rate limit URL: {url}")
@@ -0,0 +1,406 @@
+"""Rotate the processed/ set in S3: stage, archive, promote, then flip a pointer.
+
+The knowledge base syncs processed/kb_docs/, so a sync must never see it half
+old, half new. S3 has no atomic rename; instead one small pointer object
+(POINTER_KEY) says which set processed/ holds and whether it is complete, and a
+rotation only touches processed/ between two pointer writes:
+
+  1. stage    upload the new set to staging/processed/<version>/ (in parallel)
+  2. archive  server-side copy the live set to archive/processed/<old version>/
+  3. pointer  {"status": "promoting", "version": <new>, "objects": {...}}
+  4. promote  server-side copy staging -> processed/ (in parallel)
+  5. prune    delete live keys that are not in the new set (DeleteObjects, 1000/call)
+  6. pointer  {"status": "current", ...}; start KB syncs only after this
+  7. cleanup  delete the staged copies, then clear "staging" in the pointer
+
+Staging and archive prefixes sit outside processed/, so the KB never indexes
+them. If a run dies after step 3, `--resume` finishes it from the pointer; if it
+dies before, processed/ is untouched and the rotation can simply be re-run. A
+run that dies during cleanup leaves "staging" set; `--resume` (or the next
+rotation) deletes what is left. Every phase is timed and the report is printed
+as JSON.
+
+Promote and prune still rewrite processed/ in place, and the Bedrock data
+source reads it directly, not through the pointer. The pointer only protects
+syncs that check it: start every sync through start_sync (`--sync`, `make
+sync-kb`, Cell 7 of the processing notebook), which refuses unless the pointer
+is current, and don't schedule syncs or start them from the console. When
+BEDROCK_KB_ID and BEDROCK_KB_DATA_SOURCE_ID are set, a rotation likewise
+refuses to write the promoting pointer while a sync is still running.
+
+Run locally:
+  python -m api.rotation --bucket <bucket> --source data --include "pubmed_records_*.jsonl" "kb_docs/*"
+  python -m api.rotation --bucket <bucket> --sync
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api import aws_clients, storage
+
+LOGGER = logging.getLogger("rotation")
+LOGGER.setLevel(logging.INFO)
+
+LIVE_PREFIX = os.getenv("PROCESSED_PREFIX", "processed/")
+STAGING_PREFIX = os.getenv("STAGING_PREFIX", "staging/processed/")
+ARCHIVE_PREFIX = os.getenv("ARCHIVE_PREFIX", "archive/processed/")
+POINTER_KEY = os.getenv("PROCESSED_POINTER_KEY", "manifests/processed-current.json")
+KB_ID = os.getenv("BEDROCK_KB_ID", "")
+KB_DATA_SOURCE_ID = os.getenv("BEDROCK_KB_DATA_SOURCE_ID", "")
+DEFAULT_INCLUDE = ("*.jsonl", "kb_docs/*")
+# CopyObject handles up to 5 GB in one request; past this, copy in parts.
+COPY_MULTIPART_THRESHOLD = 512 * 1024 * 1024
+
+PROMOTING = "promoting"
+CURRENT = "current"
+
+
+def _prefix(prefix):
+    return prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+
+# --- Listing and pointer ---
+def list_objects(client, bucket, prefix):
+    """{key relative to prefix: size} for every object under `prefix`."""
+    paginator = client.get_paginator("list_objects_v2")
+    return {
+        obj["Key"][len(prefix) :]: obj.get("Size", 0)
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for obj in page.get("Contents", [])
+    }
+
+
+def read_pointer(client, bucket, key=None):
+    """The pointer record, or None before the first rotation."""
+    from botocore.exceptions import ClientError
+
+    try:
+        resp = client.get_object(Bucket=bucket, Key=key or POINTER_KEY)
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(resp["Body"].read().decode("utf-8"))
+
+
+def _write_pointer(client, bucket, key, record):
+    # A single PUT is atomic: readers see the old record or the new one.
+    client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(record, indent=2, sort_keys=True).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+# --- Copy / delete ---
+def copy_objects(client, bucket, pairs, sizes, workers):
+    """Server-side copy (source key, dest key) pairs in parallel; returns bytes."""
+
+    def copy(pair):
+        source, dest = pair
+        if sizes.get(source, 0) >= COPY_MULTIPART_THRESHOLD:
+            client.copy({"Bucket": bucket, "Key": source}, bucket, dest)
+        else:
+            client.copy_object(
+                Bucket=bucket, CopySource={"Bucket": bucket, "Key": source}, Key=dest
+            )
+        return sizes.get(source, 0)
+
+    if not pairs:
+        return 0
+    with ThreadPoolExecutor(
+        max_workers=min(workers, len(pairs)), thread_name_prefix="s3-copy"
+    ) as pool:
+        return sum(pool.map(copy, pairs))
+
+
+def delete_objects(client, bucket, keys):
+    """Bulk delete (1000 keys per DeleteObjects call)."""
+    with storage.S3Storage(bucket, client=client) as out:
+        out.delete_many(keys)
+
+
+def local_files(directory, include=DEFAULT_INCLUDE):
+    """{key: path} for files under `directory` whose relative path matches `include`."""
+    found = {}
+    for current, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(current, name)
+            key = os.path.relpath(path, directory).replace(os.sep, "/")
+            if any(fnmatch.fnmatch(key, pattern) for pattern in include):
+                found[key] = path
+    return dict(sorted(found.items()))
+
+
+def _cleanup(client, bucket, pointer_key, record):
+    """Delete a finished rotation's staged copies, then clear the pointer's staging."""
+    staged = list_objects(client, bucket, record["staging"])
+    delete_objects(client, bucket, [record["staging"] + key for key in staged])
+    record = dict(record, staging=None)
+    _write_pointer(client, bucket, pointer_key, record)
+    return len(staged)
+
+
+def _stage(client, bucket, files, staging, workers):
+    with storage.S3Storage(bucket, staging, client=client, max_workers=workers) as out:
+        for key, path in files.items():
+            size = os.path.getsize(path)
+            with open(path, "rb") as handle:
+                # Small files go through the PUT pool; big ones stream as multipart.
+                out.put(
+                    key, handle.read() if size < out.multipart_threshold else handle
+                )
+    return {key: os.path.getsize(path) for key, path in files.items()}
+
+
+# --- Knowledge base sync ---
+def running_syncs(agent, kb_id, data_source_id):
+    """IDs of the data source's ingestion jobs that are starting or in progress."""
+    resp = agent.list_ingestion_jobs(
+        knowledgeBaseId=kb_id,
+        dataSourceId=data_source_id,
+        filters=[
+            {
+                "attribute": "STATUS",
+                "operator": "EQ",
+                "values": ["STARTING", "IN_PROGRESS"],
+            }
+        ],
+    )
+    return [job["ingestionJobId"] for job in resp.get("ingestionJobSummaries", [])]
+
+
+def start_sync(
+    bucket,
+    kb_id=None,
+    data_source_id=None,
+    client=None,
+    agent=None,
+    pointer_key=None,
+):
+    """Start a KB ingestion job once the pointer says processed/ is complete."""
+    kb_id = kb_id or KB_ID
+    data_source_id = data_source_id or KB_DATA_SOURCE_ID
+    if not (kb_id and data_source_id):
+        raise ValueError("Set BEDROCK_KB_ID and BEDROCK_KB_DATA_SOURCE_ID")
+    client = client or aws_clients.client("s3")
+    pointer = read_pointer(client, bucket, pointer_key)
+    if pointer and pointer.get("status") != CURRENT:
+        raise RuntimeError(
+            f"Rotation {pointer['version']} is {pointer['status']}; "
+            "finish it with --resume before syncing."
+        )
+    agent = agent or aws_clients.client("bedrock-agent")
+    job = agent.start_ingestion_job(knowledgeBaseId=kb_id, dataSourceId=data_source_id)[
+        "ingestionJob"
+    ]
+    result = {
+        "knowledgeBaseId": kb_id,
+        "dataSourceId": data_source_id,
+        "ingestionJobId": job["ingestionJobId"],
+        "version": pointer.get("version") if pointer else None,
+    }
+    LOGGER.info("kb_sync_started: %s", json.dumps(result))
+    return result
+
+
+# --- Rotation ---
+def rotate(
+    bucket,
+    source_dir=None,
+    include=DEFAULT_INCLUDE,
+    version=None,
+    resume=False,
+    workers=None,
+    client=None,
+    live_prefix=None,
+    staging_prefix=None,
+    archive_prefix=None,
+    pointer_key=None,
+    kb_id=None,
+    data_source_id=None,
+    agent=None,
+):
+    """Run (or with resume=True, finish) a rotation; returns the timing report."""
+    client = client or aws_clients.client("s3")
+    kb_id = kb_id or KB_ID
+    data_source_id = data_source_id or KB_DATA_SOURCE_ID
+    workers = workers or storage.MAX_WORKERS
+    live = _prefix(live_prefix or LIVE_PREFIX)
+    pointer_key = pointer_key or POINTER_KEY
+    timings = {}
+    started = time.perf_counter()
+
+    def phase(name, fn, *args):
+        phase_started = time.perf_counter()
+        result = fn(*args)
+        timings[name] = round(time.perf_counter() - phase_started, 3)
+        return result
+
+    pointer = phase("read_pointer", read_pointer, client, bucket, pointer_key)
+    pending_cleanup = (
+        pointer and pointer.get("status") == CURRENT and pointer.get("staging")
+    )
+    archived = 0
+    if resume and pending_cleanup:
+        cleaned = phase("cleanup", _cleanup, client, bucket, pointer_key, pointer)
+        report = {
+            "bucket": bucket,
+            "version": pointer["version"],
+            "resumed": True,
+            "cleaned": cleaned,
+            "seconds": timings,
+            "total_seconds": round(time.perf_counter() - started, 3),
+        }
+        LOGGER.info("processed_rotated: %s", json.dumps(report))
+        return report
+    if resume:
+        if not pointer or pointer.get("status") != PROMOTING:
+            raise RuntimeError("Nothing to resume: no rotation is in progress.")
+        record = pointer
+    else:
+        if pointer and pointer.get("status") == PROMOTING:
+            raise RuntimeError(
+                f"Rotation {pointer['version']} is in progress; finish it with --resume."
+            )
+        if pending_cleanup:
+            phase("cleanup_previous", _cleanup, client, bucket, pointer_key, pointer)
+        files = local_files(source_dir, include)
+        if not files:
+            raise FileNotFoundError(
+                f"No files matching {list(include)} in {source_dir}."
+            )
+        version = version or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        staging = _prefix(staging_prefix or STAGING_PREFIX) + version + "/"
+        objects = phase("stage", _stage, client, bucket, files, staging, workers)
+
+        # Archive whatever processed/ holds now, under the version it was rotated in as.
+        previous = pointer.get("version") if pointer else None
+        live_objects = phase("list_live", list_objects, client, bucket, live)
+        archive = _prefix(archive_prefix or ARCHIVE_PREFIX) + (
+            previous or f"unversioned-{version}"
+        )
+        pairs = [(live + key, f"{archive}/{key}") for key in live_objects]
+        phase(
+            "archive",
+            copy_objects,
+            client,
+            bucket,
+            pairs,
+            {live + key: size for key, size in live_objects.items()},
+            workers,
+        )
+        archived = len(pairs)
+        record = {
+            "status": PROMOTING,
+            "version": version,
+            "previous": previous,
+            "archive": f"{archive}/" if pairs else None,
+            "staging": staging,
+            "live_prefix": live,
+            "objects": objects,
+        }
+        if kb_id and data_source_id:
+            agent = agent or aws_clients.client("bedrock-agent")
+            syncing = phase("check_syncs", running_syncs, agent, kb_id, data_source_id)
+            if syncing:
+                delete_objects(client, bucket, [staging + key for key in objects])
+                raise RuntimeError(
+                    f"KB ingestion job(s) {', '.join(syncing)} are reading "
+                    f"{live}; rotate once they finish."
+                )
+        phase("pointer_promoting", _write_pointer, client, bucket, pointer_key, record)
+
+    # From here on the pointer says processed/ is changing; every step is idempotent.
+    staging, objects = record["staging"], record["objects"]
+    pairs = [(staging + key, live + key) for key in objects]
+    copied_bytes = phase(
+        "promote",
+        copy_objects,
+        client,
+        bucket,
+        pairs,
+        {staging + key: size for key, size in objects.items()},
+        workers,
+    )
+    live_objects = phase("list_promoted", list_objects, client, bucket, live)
+    stale = [live + key for key in live_objects if key not in objects]
+    phase("prune", delete_objects, client, bucket, stale)
+    record = dict(
+        record,
+        status=CURRENT,
+        rotated_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    )
+    phase("pointer_current", _write_pointer, client, bucket, pointer_key, record)
+    phase("cleanup", _cleanup, client, bucket, pointer_key, record)
+
+    seconds = time.perf_counter() - started
+    report = {
+        "bucket": bucket,
+        "version": record["version"],
+        "previous": record.get("previous"),
+        "resumed": bool(resume),
+        "objects": len(objects),
+        "bytes": sum(objects.values()),
+        "archived": archived,
+        "promoted": len(pairs),
+        "promoted_bytes": copied_bytes,
+        "pruned": len(stale),
+        "workers": workers,
+        "seconds": timings,
+        "total_seconds": round(seconds, 3),
+        "copies_per_sec": (
+            round((archived + len(pairs)) / seconds, 1) if seconds else None
+        ),
+    }
+    LOGGER.info("processed_rotated: %s", json.dumps(report))
+    return report
+
+
+def main(argv=None):
+    """CLI entry point: rotate a local processed set into s3://<bucket>/processed/."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bucket", default=os.getenv("S3_BUCKET"))
+    parser.add_argument("--source", help="Local directory holding the new set")
+    parser.add_argument(
+        "--include",
+        nargs="+",
+        default=list(DEFAULT_INCLUDE),
+        help="Glob patterns (relative to --source) for the files in the set",
+    )
+    parser.add_argument("--version", help="Set version (default: UTC timestamp)")
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--workers", type=int, help="Parallel copies/uploads")
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Then start a KB ingestion job (BEDROCK_KB_ID, BEDROCK_KB_DATA_SOURCE_ID)",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.bucket:
+        parser.error("pass --bucket or set S3_BUCKET")
+    if not (args.source or args.resume or args.sync):
+        parser.error("pass --source, or --resume to finish an interrupted rotation")
+    if args.source or args.resume:
+        report = rotate(
+            args.bucket,
+            args.source,
+            include=args.include,
+            version=args.version,
+            resume=args.resume,
+            workers=args.workers,
+        )
+        print(json.dumps(report, indent=2))
+    if args.sync:
+        print(json.dumps(start_sync(args.bucket), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Standalone asyncio HTTP server for the query service (e.g. on ECS next to the UI).
+
+Wraps the same orchestration as the query Lambda but keeps one process serving
+many in-flight requests: Bedrock clients are shared and connection-pooled, the
+blocking handler runs on a worker pool, and identical questions that arrive
+while one is already being answered wait on that single Bedrock call instead of
+making their own.
+
+Routes: POST /query, GET /query/{id}, GET /health.
+Run: `python -m api.server --port 8080` (same env vars as the Lambda).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from api import aws_clients, lambda_query_handler
+
+LOGGER = logging.getLogger("rag-server")
+LOGGER.setLevel(logging.INFO)
+
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "64"))
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "64"))
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_TIMEOUT_SEC = 15
+
+
+def configure_clients(max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS):
+    """Swap the handler's Bedrock clients and stage pool for server-sized ones."""
+    lambda_query_handler.client = aws_clients.client(
+        "bedrock-agent-runtime", max_pool_connections=max_pool_connections
+    )
+    lambda_query_handler.runtime_client = aws_clients.client(
+        "bedrock-runtime", max_pool_connections=max_pool_connections
+    )
+    lambda_query_handler._executor = ThreadPoolExecutor(
+        max_workers=max_pool_connections, thread_name_prefix="rag-query"
+    )
+
+
+class QueryServer:
+    """HTTP/1.1 front end that turns requests into API Gateway-style handler events."""
+
+    def __init__(self, handler=None, workers=SERVER_WORKERS, rate_limit=None):
+        self._handler = handler or lambda_query_handler.handler
+        # event -> 429 response or None; checked per client before coalescing.
+        if rate_limit is None and handler is None:
+            rate_limit = lambda_query_handler._rate_limited_response
+        self._rate_limit = rate_limit
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag")
+        self._in_flight = {}
+        self.coalesced = 0
+
+    # --- Dispatch ---
+    async def dispatch(self, method, path, body, client_ip, headers=None):
+        """Route one request; returns an API Gateway-style response dict."""
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        if method == "GET" and path == "/health":
+            return {"statusCode": 200, "headers": {}, "body": '{"status": "ok"}'}
+        if method == "GET" and path.startswith("/query/"):
+            event = {
+                "requestContext": {"http": {"method": "GET"}},
+                "pathParameters": {"id": path[len("/query/") :]},
+            }
+            return await self._run(event)
+        if method == "POST" and path == "/query":
+            try:
+                text = body.decode("utf-8")
+            except UnicodeDecodeError:
+                return _error(400, "Request body must be UTF-8 JSON")
+            event = {
+                "requestContext": {"http": {"method": "POST", "sourceIp": client_ip}},
+                "headers": dict(headers or {}),
+                "body": text,
+                "isBase64Encoded": False,
+            }
+            if self._rate_limit is not None:
+                # Per client, before joining anyone else's in-flight call: a limited
+                # client must not be served by coalescing, nor hand its 429 to others.
+                loop = asyncio.get_running_loop()
+                limited = await loop.run_in_executor(
+                    self._pool, self._rate_limit, event
+                )
+                if limited is not None:
+                    return limited
+                event["rate_limit_checked"] = True
+            key = _coalesce_key(body)
+            if key is None:
+                return await self._run(event)
+            return await self._run_coalesced(key, event)
+        return _error(404, "Not found")
+
+    async def _run(self, event):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self._handler, event, None)
+
+    async def _run_coalesced(self, key, event):
+        """Share one handler call between identical concurrent questions."""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(self._run(event))
+        self._in_flight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+
+    # --- HTTP ---
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until it closes or idles out."""
+        peer = writer.get_extra_info("peername")
+        peer_ip = peer[0] if peer else "-"
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        _read_request(reader), KEEP_ALIVE_TIMEOUT_SEC
+                    )
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                except ValueError as exc:
+                    await _write_response(writer, _error(400, str(exc)), False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                # The socket peer, not X-Forwarded-For: any client can set that header.
+                try:
+                    response = await self.dispatch(method, path, body, peer_ip, headers)
+                except Exception:
+                    LOGGER.exception("rag_server_request_failed")
+                    response = _error(500, "Internal server error")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await _write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        """Listen until cancelled."""
+        server = await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_HEADER_BYTES
+        )
+        LOGGER.info("rag_server_listening: %s:%s", host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def _coalesce_key(body):
+    """Key for identical synchronous questions; None when the request can't be shared."""
+    try:
+        data = json.loads(body or b"{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict) or data.get("async") or not data.get("question"):
+        return None
+    question = " ".join(str(data["question"]).lower().split())
+    return json.dumps([question, data.get("filters") or {}], sort_keys=True)
+
+
+def _error(status_code, message):
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"error": message}),
+    }
+
+
+async def _read_request(reader):
+    """Parse one HTTP/1.1 request; None on a clean EOF between requests."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial:
+            return None
+        raise
+    except asyncio.LimitOverrunError:
+        raise ValueError("Request headers too large") from None
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise ValueError("Malformed request line") from None
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0") or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+async def _write_response(writer, response, keep_alive):
+    body = (response.get("body") or "").encode("utf-8")
+    status = response.get("statusCode", 200)
+    headers = {"Content-Type": "application/json", **(response.get("headers") or {})}
+    headers["Content-Length"] = str(len(body))
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+def main(argv=None):
+    """CLI entry point."""
+    parser = argparse.ArgumentParser(description="Mamoru query HTTP server")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8080")))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    configure_clients()
+    asyncio.run(QueryServer().serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Columnar snapshot of the processed corpus (Parquet, partitioned by year).
+
+The processing stage writes one row per record next to its JSONL export:
+
+  <dir>/year=2024/part-0.parquet   pmid, title, abstract, authors, journal, date,
+                                   year, mesh, publication_types (sorted by PMID)
+  <dir>/pmid_index.parquet         pmid -> year, to read one partition per lookup
+
+Corpus stats, filtered exports and reprocessing then scan columns instead of
+re-parsing every raw .txt file. Needs pyarrow (in requirements.txt).
+
+Run locally:
+  python -m api.snapshot stats data/snapshot
+  python -m api.snapshot export data/snapshot out.jsonl --year 2024 --mesh Dementia
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from api import processing
+
+INDEX_FILE = "pmid_index.parquet"
+COLUMNS = (
+    "pmid",
+    "title",
+    "abstract",
+    "authors",
+    "journal",
+    "date",
+    "mesh",
+    "publication_types",
+)
+# The processing notebook's signal terms, for the "signal match" share.
+SIGNAL_TERMS = (
+    "caregiver",
+    "caregiving",
+    "decision support",
+    "clinical decision support",
+    "cdss",
+    "dementia",
+    "alzheimer",
+    "mild cognitive impairment",
+)
+
+
+def _pyarrow():
+    """Import pyarrow on first use; only snapshot work needs it."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as exc:  # pragma: no cover - runtime dependency check
+        raise RuntimeError("pyarrow is required for corpus snapshots.") from exc
+    return pyarrow
+
+
+def _schema(pa):
+    return pa.schema(
+        [
+            ("pmid", pa.string()),
+            ("title", pa.string()),
+            ("abstract", pa.string()),
+            ("authors", pa.string()),
+            ("journal", pa.string()),
+            ("date", pa.string()),
+            ("year", pa.int16()),
+            ("mesh", pa.list_(pa.string())),
+            ("publication_types", pa.list_(pa.string())),
+        ]
+    )
+
+
+def _year(date):
+    normalized = processing.normalize_date(date)
+    return int(normalized[:4]) if re.match(r"\d{4}", normalized) else None
+
+
+# --- Write ---
+def write_snapshot(records, out_dir):
+    """Write parsed records (processing.parse_record dicts); returns the row count.
+
+    The snapshot is built in a temp directory next to `out_dir` and swapped in,
+    so a rewrite never leaves partitions (years) the new records no longer have.
+    """
+    pa = _pyarrow()
+    rows = sorted(
+        (rec for rec in records if rec.get("pmid")), key=lambda rec: rec["pmid"]
+    )
+    columns = {name: [rec.get(name) for rec in rows] for name in COLUMNS}
+    columns["year"] = [_year(rec.get("date")) for rec in rows]
+    table = pa.Table.from_pydict(columns, schema=_schema(pa))
+
+    out_dir = os.path.abspath(out_dir)
+    parent = os.path.dirname(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    name = os.path.basename(out_dir)
+    staging = tempfile.mkdtemp(prefix=f".{name}-new-", dir=parent)
+    try:
+        pa.dataset.write_dataset(
+            table,
+            staging,
+            format="parquet",
+            partitioning=pa.dataset.partitioning(
+                pa.schema([("year", pa.int16())]), flavor="hive"
+            ),
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        pa.parquet.write_table(
+            table.select(["pmid", "year"]), os.path.join(staging, INDEX_FILE)
+        )
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # Two renames on the same filesystem; the old snapshot is deleted last.
+    old = None
+    if os.path.exists(out_dir):
+        old = tempfile.mkdtemp(prefix=f".{name}-old-", dir=parent)
+        os.replace(out_dir, os.path.join(old, name))
+    os.replace(staging, out_dir)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+    return table.num_rows
+
+
+# --- Read ---
+def _dataset(snapshot_dir):
+    pa = _pyarrow()
+    return pa.dataset.dataset(
+        snapshot_dir,
+        format="parquet",
+        partitioning=pa.dataset.partitioning(
+            pa.schema([("year", pa.int16())]), flavor="hive"
+        ),
+        exclude_invalid_files=True,
+        ignore_prefixes=[INDEX_FILE, "."],
+    )
+
+
+def scan(snapshot_dir, year=None, journal=None, mesh=None, columns=None):
+    """Rows matching the filters as a pyarrow Table; year filters prune partitions."""
+    pa = _pyarrow()
+    field = pa.dataset.field
+    conditions = []
+    if year is not None:
+        years = [year] if isinstance(year, int) else list(year)
+        conditions.append(field("year").isin(years))
+    if journal:
+        conditions.append(field("journal") == journal)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    read = columns
+    if mesh and columns is not None and "mesh" not in columns:
+        read = list(columns) + ["mesh"]
+    table = _dataset(snapshot_dir).to_table(columns=read, filter=expression)
+    if mesh:
+        # MeSH lists hold '*Dementia/therapy'-style headings; match descriptors.
+        descriptors = pa.compute.list_flatten(table["mesh"])
+        descriptors = pa.compute.replace_substring_regex(
+            pa.compute.replace_substring_regex(descriptors, r"^\*", ""), r"/.*$", ""
+        )
+        hits = pa.compute.equal(descriptors, mesh)
+        parents = pa.compute.list_parent_indices(table["mesh"])
+        keep = pa.compute.unique(pa.compute.filter(parents, hits))
+        table = table.take(keep)
+    if read is not columns:
+        table = table.select(list(columns))
+    return table
+
+
+def lookup(snapshot_dir, pmids):
+    """Rows for the given PMIDs, reading only the partitions the index points to."""
+    pa = _pyarrow()
+    field = pa.dataset.field
+    pmids = [str(pmid) for pmid in pmids]
+    index = pa.parquet.read_table(
+        os.path.join(snapshot_dir, INDEX_FILE),
+        filters=[("pmid", "in", pmids)],
+    )
+    years = [y for y in set(index["year"].to_pylist()) if y is not None]
+    expression = field("pmid").isin(pmids)
+    if index.num_rows and None not in index["year"].to_pylist():
+        expression = field("year").isin(years) & expression
+    return _dataset(snapshot_dir).to_table(filter=expression)
+
+
+def iter_records(snapshot_dir, **filters):
+    """processing.parse_record-shaped dicts, so exports can be rebuilt without .txt."""
+    table = scan(snapshot_dir, **filters)
+    for row in table.select(list(COLUMNS)).to_pylist():
+        row["mesh"] = row["mesh"] or []
+        row["publication_types"] = row["publication_types"] or []
+        yield row
+
+
+def stats(snapshot_dir, top_journals=10):
+    """The processing notebook's corpus summary, computed as column scans."""
+    pa = _pyarrow()
+    pc = pa.compute
+    table = scan(snapshot_dir, columns=["title", "abstract", "journal", "year"])
+    total = table.num_rows
+    abstract_len = pc.utf8_length(pc.fill_null(table["abstract"], ""))
+    with_abstract = pc.sum(pc.greater(abstract_len, 0)).as_py() or 0
+    haystack = pc.utf8_lower(
+        pc.binary_join_element_wise(
+            pc.fill_null(table["title"], ""), pc.fill_null(table["abstract"], ""), " "
+        )
+    )
+    pattern = "|".join(re.escape(term) for term in SIGNAL_TERMS)
+    signal = pc.sum(pc.match_substring_regex(haystack, pattern)).as_py() or 0
+
+    def counts(column, limit=None):
+        pairs = [
+            (item["values"], item["counts"])
+            for item in pc.value_counts(table[column]).to_pylist()
+        ]
+        pairs.sort(key=lambda pair: (-pair[1], str(pair[0])))
+        return dict(pairs[:limit] if limit else pairs)
+
+    return {
+        "total_records": total,
+        "with_abstract": with_abstract,
+        "with_abstract_pct": round(with_abstract / max(total, 1) * 100, 1),
+        "signal_match_pct": round(signal / max(total, 1) * 100, 1),
+        "avg_abstract_len_chars": int(
+            (pc.mean(abstract_len).as_py() or 0) if total else 0
+        ),
+        "top_journals": counts("journal", top_journals),
+        "records_per_year": {
+            str(year): count
+            for year, count in sorted(
+                counts("year").items(), key=lambda item: str(item[0])
+            )
+        },
+    }
+
+
+def main(argv=None):
+    """CLI entry point: corpus stats, or a filtered JSONL export, from a snapshot."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats_cmd = commands.add_parser("stats", help="Print the corpus summary")
+    stats_cmd.add_argument("snapshot_dir")
+    export_cmd = commands.add_parser("export", help="Write matching records as JSONL")
+    export_cmd.add_argument("snapshot_dir")
+    export_cmd.add_argument("output")
+    export_cmd.add_argument("--year", type=int, nargs="+")
+    export_cmd.add_argument("--journal")
+    export_cmd.add_argument("--mesh", help="MeSH descriptor, e.g. Dementia")
+    args = parser.parse_args(argv)
+
+    if args.command == "stats":
+        print(json.dumps(stats(args.snapshot_dir), indent=2))
+        return
+    records = iter_records(
+        args.snapshot_dir, year=args.year, journal=args.journal, mesh=args.mesh
+    )
+    docs = (processing.build_record_doc(rec) for rec in records)
+    count = processing.write_jsonl(docs, args.output)
+    print(f"Wrote {count} records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""Object storage for the ingest and processing pipelines.
+
+Ingest, bulk ingest, processing and profiling read and write keyed objects
+(`123.txt`, `kb_docs/123.txt.metadata.json`, ...) through one interface, so
+the same pipeline runs at disk speed locally and at full concurrency against
+S3. Pick a backend with a URL: `s3://bucket/prefix/` in AWS, a local directory
+(or `file:///path`), or `memory://` for tests and benchmarks.
+
+The S3 backend does not block on each write: PUTs run on a thread pool (at
+most STORAGE_MAX_PENDING queued), bodies over STORAGE_MULTIPART_THRESHOLD_MB
+and file objects go through boto3's multipart transfer, and deletes are sent
+1000 keys per DeleteObjects call. Call `flush()` (or use the storage as a
+context manager) to wait for pending writes; it raises the first failure.
+Tune with STORAGE_MAX_WORKERS and the two settings above.
+"""
+
+import io
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from api import aws_clients
+
+MAX_WORKERS = int(os.getenv("STORAGE_MAX_WORKERS", "16"))
+MAX_PENDING = int(os.getenv("STORAGE_MAX_PENDING", "256"))
+MULTIPART_THRESHOLD = int(
+    float(os.getenv("STORAGE_MULTIPART_THRESHOLD_MB", "8")) * 1024 * 1024
+)
+# DeleteObjects takes at most this many keys per request.
+DELETE_BATCH = 1000
+
+
+def _as_bytes(body):
+    return body.encode("utf-8") if isinstance(body, str) else body
+
+
+def _may_hold(directory, prefix):
+    """True when keys under `directory` (a "a/b/" path) can start with `prefix`."""
+    directory = directory.replace(os.sep, "/")
+    return directory.startswith(prefix) or prefix.startswith(directory)
+
+
+class Storage:
+    """Base class: backends implement _put, _get, _delete and keys.
+
+    `on_put(seconds)`, when set, is called with each write's latency.
+    """
+
+    on_put = None
+    # Backends that write from worker threads time (and report) PUTs themselves.
+    concurrent = False
+
+    def put(self, key, body):
+        """Write `body` (bytes, str, or a binary file object) under `key`."""
+        if self.on_put is None or self.concurrent:
+            self._put(key, _as_bytes(body))
+            return
+        started = time.perf_counter()
+        self._put(key, _as_bytes(body))
+        self.on_put(time.perf_counter() - started)
+
+    def get(self, key):
+        """The object's bytes, or None if there is no such key."""
+        return self._get(key)
+
+    def get_many(self, keys):
+        """Bodies for `keys`, in order (None for missing keys)."""
+        return [self._get(key) for key in keys]
+
+    def delete(self, key):
+        """Remove `key`; missing keys are not an error."""
+        self._delete(key)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self._delete(key)
+
+    def keys(self, prefix=""):
+        """Sorted keys under `prefix`."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Wait for buffered writes and deletes (no-op for synchronous backends)."""
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def discard(self):
+        """Drop buffered work without raising (used when the caller failed)."""
+
+    def _put(self, key, body):
+        raise NotImplementedError
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+
+class MemoryStorage(Storage):
+    """Process-local dict of key -> bytes; fine for tests and benchmarks."""
+
+    def __init__(self, on_put=None):
+        self.objects = {}
+        self.on_put = on_put
+        self._lock = threading.Lock()
+
+    def _put(self, key, body):
+        if not isinstance(body, bytes):
+            body = body.read()
+        with self._lock:
+            self.objects[key] = body
+
+    def _get(self, key):
+        with self._lock:
+            return self.objects.get(key)
+
+    def _delete(self, key):
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def keys(self, prefix=""):
+        with self._lock:
+            return sorted(key for key in self.objects if key.startswith(prefix))
+
+
+class LocalStorage(Storage):
+    """Files under a local directory; keys are relative paths."""
+
+    def __init__(self, root, on_put=None):
+        self.root = root
+        self.on_put = on_put
+        self._dirs = set()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def _put(self, key, body):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        if directory not in self._dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._dirs.add(directory)
+        with open(path, "wb") as handle:
+            if isinstance(body, bytes):
+                handle.write(body)
+            else:
+                shutil.copyfileobj(body, handle)
+
+    def _get(self, key):
+        try:
+            with open(self.path(key), "rb") as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+    def _delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys(self, prefix=""):
+        start = os.path.join(self.root, prefix.rpartition("/")[0])
+        found = []
+        for current, dirs, files in os.walk(start):
+            rel = os.path.relpath(current, self.root)
+            # Only descend into directories that can hold keys under `prefix`.
+            dirs[:] = [
+                name
+                for name in dirs
+                if _may_hold(("" if rel == "." else f"{rel}/") + name + "/", prefix)
+            ]
+            for name in files:
+                key = name if rel == "." else f"{rel}/{name}".replace(os.sep, "/")
+                if key.startswith(prefix):
+                    found.append(key)
+        return sorted(found)
+
+
+class S3Storage(Storage):
+    """Objects under an S3 prefix, written concurrently from a thread pool.
+
+    `on_put(seconds)` is called from the worker thread that ran the PUT.
+    """
+
+    concurrent = True
+
+    def __init__(
+        self,
+        bucket,
+        prefix="",
+        client=None,
+        max_workers=None,
+        max_pending=None,
+        multipart_threshold=None,
+        on_put=None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.max_workers = max_workers or MAX_WORKERS
+        self.multipart_threshold = multipart_threshold or MULTIPART_THRESHOLD
+        self.on_put = on_put
+        self._client = client or aws_clients.client("s3")
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(max_pending or MAX_PENDING)
+        self._futures = []
+        self._deletes = {}  # insertion-ordered set of keys
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return self.prefix + key
+
+    # --- Writes ---
+    def _put(self, key, body):
+        with self._lock:
+            # A write supersedes a delete of the same key still in the buffer.
+            self._deletes.pop(key, None)
+        if not isinstance(body, bytes):
+            # File objects belong to the caller; upload before returning.
+            self._upload(key, body)
+            return
+        self._slots.acquire()
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="s3-put"
+            )
+        try:
+            future = self._pool.submit(self._put_now, key, body)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._futures.append(future)
+
+    def _put_now(self, key, body):
+        if len(body) >= self.multipart_threshold:
+            self._upload(key, io.BytesIO(body))
+            return
+        started = time.perf_counter()
+        self._client.put_object(Bucket=self.bucket, Key=self._key(key), Body=body)
+        if self.on_put:
+            self.on_put(time.perf_counter() - started)
+
+    def _upload(self, key, fileobj):
+        from boto3.s3.transfer import TransferConfig
+
+        started = time.perf_counter()
+        self._client.upload_fileobj(
+            fileobj,
+            self.bucket,
+            self._key(key),
+            Config=TransferConfig(
+                multipart_threshold=self.multipart_threshold,
+                max_concurrency=self.max_workers,
+            ),
+        )
+        if self.on_put:
+            self.on_put(time.perf_counter() - started)
+
+    def _delete(self, key):
+        with self._lock:
+            self._deletes[key] = None
+            full = len(self._deletes) >= DELETE_BATCH
+        if full:
+            self.flush()
+
+    def delete_many(self, keys):
+        with self._lock:
+            self._deletes.update(dict.fromkeys(keys))
+        self.flush()
+
+    def _send_deletes(self):
+        with self._lock:
+            pending, self._deletes = list(self._deletes), {}
+        for start in range(0, len(pending), DELETE_BATCH):
+            chunk = pending[start : start + DELETE_BATCH]
+            resp = self._client.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    "Objects": [{"Key": self._key(key)} for key in chunk],
+                    "Quiet": True,
+                },
+            )
+            errors = resp.get("Errors") or []
+            if errors:
+                raise RuntimeError(
+                    f"S3 delete failed for {len(errors)} keys: {errors[0]}"
+                )
+
+    def flush(self):
+        # PUTs first: a buffered delete may target a key written just before it.
+        with self._lock:
+            futures, self._futures = self._futures, []
+        errors = [future.exception() for future in futures]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise errors[0]
+        self._send_deletes()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def discard(self):
+        with self._lock:
+            self._futures, self._deletes = [], {}
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    # --- Reads ---
+    def _get(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            resp = self._client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return resp["Body"].read()
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if len(keys) < 2:
+            return [self._get(key) for key in keys]
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(keys)), thread_name_prefix="s3-get"
+        ) as pool:
+            return list(pool.map(self._get, keys))
+
+    def keys(self, prefix=""):
+        paginator = self._client.get_paginator("list_objects_v2")
+        found = [
+            obj["Key"][len(self.prefix) :]
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix))
+            for obj in page.get("Contents", [])
+        ]
+        return sorted(found)
+
+
+def from_url(url, on_put=None, **s3_options):
+    """Build storage from `memory://`, `s3://bucket/prefix/`, `file:///path` or a path.
+
+    `s3_options` (max_workers, max_pending, ...) only apply to S3Storage.
+    """
+    parsed = urlparse(url or "memory://")
+    if parsed.scheme == "memory":
+        return MemoryStorage(on_put=on_put)
+    if parsed.scheme == "s3":
+        return S3Storage(
+            parsed.netloc, parsed.path.lstrip("/"), on_put=on_put, **s3_options
+        )
+    if parsed.scheme == "file":
+        return LocalStorage(parsed.path, on_put=on_put)
+    if parsed.scheme == "" or len(parsed.scheme) == 1:  # plain or Windows paths
+        return LocalStorage(url, on_put=on_put)
+    raise ValueError(f"Unsupported storage URL: {url}")
@@ -0,0 +1,271 @@
+"""Run metrics as CloudWatch Embedded Metric Format (EMF) log lines.
+
+Lambda ships stdout to CloudWatch Logs, and CloudWatch turns any line that is a
+JSON object with an `_aws` block into metrics, so no PutMetricData calls (or
+IAM for them) are needed. Lines are printed, not logged: the Lambda log format
+prefixes logger output, and EMF needs the bare JSON object.
+
+The ingest Lambda uses `IngestTelemetry` to time each EFetch batch (request,
+bytes read, parse, S3 PUTs, throttle sleep) and to summarize the run in its
+response. PUTs run concurrently (api.storage), so each PUT's latency and the
+wall time the batch spent waiting on storage are tracked separately. Set
+METRICS_NAMESPACE to change the namespace, or to "off" to stop emitting EMF
+(the summary is still returned).
+"""
+
+import json
+import math
+import os
+import sys
+import time
+
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "PubMedRAG/Ingest")
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+
+def percentiles(values, points=DEFAULT_PERCENTILES):
+    """{"p50": ..., "max": ...} by nearest rank; empty dict for no values."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        rank = max(1, math.ceil(point / 100 * len(ordered)))
+        result[f"p{point}"] = round(ordered[rank - 1], 2)
+    result["max"] = round(ordered[-1], 2)
+    return result
+
+
+def emf_record(namespace, metrics, dimensions=None, properties=None, timestamp=None):
+    """One EMF object; `metrics` maps name -> (value, unit)."""
+    dimensions = dimensions or {}
+    record = {
+        "_aws": {
+            "Timestamp": int((timestamp or time.time()) * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": namespace,
+                    "Dimensions": [sorted(dimensions)],
+                    "Metrics": [
+                        {"Name": name, "Unit": unit}
+                        for name, (_, unit) in metrics.items()
+                    ],
+                }
+            ],
+        },
+        **dimensions,
+        **(properties or {}),
+    }
+    record.update({name: value for name, (value, _) in metrics.items()})
+    return record
+
+
+def emit(namespace, metrics, dimensions=None, properties=None, stream=None):
+    """Print one EMF line (no-op when namespace is "off")."""
+    if not namespace or namespace == "off":
+        return
+    line = json.dumps(emf_record(namespace, metrics, dimensions, properties))
+    stream = stream or sys.stdout
+    stream.write(line + "\n")
+    stream.flush()
+
+
+class MeteredStream:
+    """Wrap an EFetch handle to count the bytes read and the time spent reading.
+
+    Medline.parse pulls lines as it goes, so network time and parse time are
+    interleaved; timing the reads separates them.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+
+    def _count(self, chunk):
+        if chunk:
+            self.bytes_read += len(
+                chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            )
+        return chunk
+
+    def read(self, *args):
+        started = time.perf_counter()
+        chunk = self._stream.read(*args)
+        self.read_seconds += time.perf_counter() - started
+        return self._count(chunk)
+
+    def readline(self, *args):
+        started = time.perf_counter()
+        line = self._stream.readline(*args)
+        self.read_seconds += time.perf_counter() - started
+        return self._count(line)
+
+    def __iter__(self):
+        iterator = iter(self._stream)
+        while True:
+            started = time.perf_counter()
+            try:
+                line = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.read_seconds += time.perf_counter() - started
+            yield self._count(line)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class IngestTelemetry:
+    """Per-batch ingest metrics, emitted as EMF, plus a run summary."""
+
+    def __init__(self, namespace=None, function_name=None, stream=None):
+        self.namespace = METRICS_NAMESPACE if namespace is None else namespace
+        self.dimensions = {"Function": function_name or "pubmed-ingest"}
+        self.stream = stream
+        self.started = time.perf_counter()
+        self.esearch_ms = 0.0
+        self.sleep_ms = 0.0
+        self.put_ms = []
+        self.wait_ms = 0.0
+        self.batches = []
+        self._batch = None
+
+    # --- Recording ---
+    def searched(self, seconds):
+        self.esearch_ms = seconds * 1000
+
+    def start_batch(self, retstart, requested):
+        self._batch = {
+            "retstart": retstart,
+            "requested": requested,
+            "started": time.perf_counter(),
+            "request_ms": 0.0,
+            "stream": None,
+            "records_parsed": 0,
+            "records_written": 0,
+            "put_ms": [],
+            "wait_ms": 0.0,
+            "sleep_ms": 0.0,
+        }
+
+    def fetched(self, stream, request_seconds):
+        """EFetch returned a handle after `request_seconds`; returns it metered."""
+        self._batch["request_ms"] = request_seconds * 1000
+        self._batch["stream"] = MeteredStream(stream)
+        return self._batch["stream"]
+
+    def parsed(self):
+        self._batch["records_parsed"] += 1
+
+    def put(self, seconds):
+        """One PUT's latency; storage calls this from its worker threads."""
+        self._batch["put_ms"].append(seconds * 1000)
+
+    def waited(self, seconds):
+        """Wall time the batch spent blocked in storage calls (enqueue or flush)."""
+        self._batch["wait_ms"] += seconds * 1000
+
+    def written(self):
+        self._batch["records_written"] += 1
+
+    def slept(self, seconds):
+        self.sleep_ms += seconds * 1000
+        if self._batch is not None:
+            self._batch["sleep_ms"] += seconds * 1000
+
+    def end_batch(self):
+        """Close the current batch, emit its EMF line, and return its metrics."""
+        batch, self._batch = self._batch, None
+        elapsed_ms = (time.perf_counter() - batch["started"]) * 1000
+        stream = batch["stream"]
+        read_ms = stream.read_seconds * 1000 if stream else 0.0
+        self.put_ms.extend(batch["put_ms"])
+        self.wait_ms += batch["wait_ms"]
+        metrics = {
+            "retstart": batch["retstart"],
+            "requested": batch["requested"],
+            "efetch_ms": round(batch["request_ms"] + read_ms, 2),
+            "efetch_bytes": stream.bytes_read if stream else 0,
+            "records_parsed": batch["records_parsed"],
+            "records_written": batch["records_written"],
+            "parse_ms": round(
+                max(0.0, elapsed_ms - read_ms - batch["wait_ms"] - batch["sleep_ms"]),
+                2,
+            ),
+            "s3_put_count": len(batch["put_ms"]),
+            "s3_put_ms": percentiles(batch["put_ms"]),
+            "s3_wait_ms": round(batch["wait_ms"], 2),
+            "elapsed_ms": round(elapsed_ms, 2),
+            "records_per_sec": _rate(batch["records_written"], elapsed_ms),
+        }
+        self.batches.append(metrics)
+        emit(
+            self.namespace,
+            {
+                "EFetchLatency": (metrics["efetch_ms"], "Milliseconds"),
+                "EFetchBytes": (metrics["efetch_bytes"], "Bytes"),
+                "RecordsParsed": (metrics["records_parsed"], "Count"),
+                "ParseTime": (metrics["parse_ms"], "Milliseconds"),
+                "S3PutLatencyP50": (metrics["s3_put_ms"].get("p50", 0), "Milliseconds"),
+                "S3PutLatencyP99": (metrics["s3_put_ms"].get("p99", 0), "Milliseconds"),
+                "RecordsPerSecond": (metrics["records_per_sec"], "Count/Second"),
+            },
+            self.dimensions,
+            {"event": "pubmed_ingest_batch", "retstart": batch["retstart"]},
+            self.stream,
+        )
+        return metrics
+
+    # --- Summary ---
+    def summary(self, written):
+        """Run totals for the handler's response; also emitted as one EMF line."""
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        efetch_ms = sum(batch["efetch_ms"] for batch in self.batches)
+        parse_ms = sum(batch["parse_ms"] for batch in self.batches)
+        stages = {
+            "esearch": self.esearch_ms,
+            "efetch": efetch_ms,
+            "parse": parse_ms,
+            "s3_put": self.wait_ms,
+            "sleep": self.sleep_ms,
+        }
+        result = {
+            "batches": len(self.batches),
+            "esearch_ms": round(self.esearch_ms, 2),
+            "efetch_ms": round(efetch_ms, 2),
+            "efetch_ms_per_batch": percentiles(
+                [batch["efetch_ms"] for batch in self.batches]
+            ),
+            "efetch_bytes": sum(batch["efetch_bytes"] for batch in self.batches),
+            "records_parsed": sum(batch["records_parsed"] for batch in self.batches),
+            "parse_ms": round(parse_ms, 2),
+            "s3_put_count": len(self.put_ms),
+            "s3_put_ms": percentiles(self.put_ms),
+            "s3_wait_ms": round(self.wait_ms, 2),
+            "sleep_ms": round(self.sleep_ms, 2),
+            "elapsed_ms": round(elapsed_ms, 2),
+            "records_per_sec": _rate(written, elapsed_ms),
+            # Where most of the wall time went; the first place to look when slow.
+            "bottleneck": max(stages, key=stages.get) if elapsed_ms else None,
+        }
+        emit(
+            self.namespace,
+            {
+                "RunDuration": (result["elapsed_ms"], "Milliseconds"),
+                "RecordsWritten": (written, "Count"),
+                "EFetchTime": (result["efetch_ms"], "Milliseconds"),
+                "S3WaitTime": (result["s3_wait_ms"], "Milliseconds"),
+                "SleepTime": (result["sleep_ms"], "Milliseconds"),
+                "RecordsPerSecond": (result["records_per_sec"], "Count/Second"),
+            },
+            self.dimensions,
+            {"event": "pubmed_ingest_run", "bottleneck": result["bottleneck"]},
+            self.stream,
+        )
+        return result
+
+
+def _rate(count, elapsed_ms):
+    return round(count / (elapsed_ms / 1000), 1) if elapsed_ms > 0 else 0.0
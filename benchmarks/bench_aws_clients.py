@@ -0,0 +1,107 @@
+"""Warm-invocation overhead: per-call boto3 clients vs the shared client layer.
+
+"Before" builds the S3 and Secrets Manager clients inside every invocation and
+fetches the NCBI secret each time, like the ingest Lambda used to. "After" goes
+through api.aws_clients, so a warm container reuses its clients and the cached
+secret. No AWS calls are made: the Secrets Manager round trip is simulated with
+a fixed delay (--secret-rtt-ms).
+
+Run: `python -m benchmarks.bench_aws_clients --invocations 50`
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import boto3
+
+from api import aws_clients
+
+SECRET = {"ncbi_email": "you@example.com", "ncbi_api_key": ""}
+
+
+class SimulatedSecretsClient:
+    """Stands in for Secrets Manager with a fixed network round trip."""
+
+    def __init__(self, rtt_sec):
+        self._rtt_sec = rtt_sec
+
+    def get_secret_value(self, SecretId):  # noqa: N803
+        time.sleep(self._rtt_sec)
+        return {"SecretString": json.dumps(SECRET)}
+
+
+def _before(rtt_sec):
+    boto3.client("s3")
+    boto3.client("secretsmanager")
+    SimulatedSecretsClient(rtt_sec).get_secret_value(SecretId="arn")
+
+
+def _after(rtt_sec):
+    aws_clients.client("s3")
+    aws_clients.client("secretsmanager")
+    aws_clients.get_secret("arn")
+
+
+def _time_invocations(func, invocations, rtt_sec):
+    samples = []
+    for _ in range(invocations):
+        start = time.perf_counter()
+        func(rtt_sec)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "invocations": invocations,
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p50_ms": round(statistics.median(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def run(invocations=50, secret_rtt_ms=30.0):
+    """Return before/after timings for `invocations` warm invocations."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    rtt_sec = secret_rtt_ms / 1000.0
+    before = _time_invocations(_before, invocations, rtt_sec)
+
+    aws_clients.clear_cache()
+    real_client = aws_clients.client
+    simulated = SimulatedSecretsClient(rtt_sec)
+    aws_clients.client = lambda service, **kwargs: (
+        simulated if service == "secretsmanager" else real_client(service, **kwargs)
+    )
+    try:
+        # The first call is the cold start; the rest are warm invocations.
+        _after(rtt_sec)
+        after = _time_invocations(_after, invocations, rtt_sec)
+    finally:
+        aws_clients.client = real_client
+        aws_clients.clear_cache()
+    return {
+        "benchmark": "aws_clients_warm_invocation",
+        "secret_rtt_ms": secret_rtt_ms,
+        "before": before,
+        "after": after,
+        "speedup": round(before["mean_ms"] / max(after["mean_ms"], 1e-6), 1),
+    }
+
+
+def main(argv=None):
+    """CLI entry point: print the JSON result (and optionally write it to a file)."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invocations", type=int, default=50)
+    parser.add_argument("--secret-rtt-ms", type=float, default=30.0)
+    parser.add_argument("--output", help="Write the JSON result here as well")
+    args = parser.parse_args(argv)
+
+    result = run(args.invocations, args.secret_rtt_ms)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Cold-start cost of the Lambda handlers: import time and first client init.
+
+Each handler is imported in a fresh interpreter with `-X importtime`, so the
+numbers match what a new Lambda container pays during init. We also record which
+heavy dependencies (boto3, botocore, Biopython) got pulled in by the import; the
+handlers load those on first use, and tests/test_import_time.py fails if that
+regresses or the import gets much slower than the baseline.
+
+Run: `python -m benchmarks.bench_import_time` (add `--update-baseline` after an
+intentional change to refresh benchmarks/baselines/import_time.json).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HANDLERS = ("api.lambda_query_handler", "api.lambda_ingest_handler")
+HEAVY_MODULES = ("boto3", "botocore", "Bio")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baselines", "import_time.json")
+
+_IMPORT_SCRIPT = """
+import json, sys
+import {module}
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))
+"""
+
+_INIT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from api import aws_clients
+for service in ("bedrock-agent-runtime", "bedrock-runtime", "s3"):
+    aws_clients.client(service)
+print(json.dumps((time.perf_counter() - start) * 1000))
+"""
+
+
+def _run(args):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=REPO_ROOT,
+        env=env,
+    )
+
+
+def _parse_importtime(stderr, module):
+    """Cumulative microseconds for `module` from `-X importtime` output."""
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.strip() == module:
+            return int(cumulative)
+    raise ValueError(f"{module} not found in importtime output")
+
+
+def measure_import(module):
+    """Import `module` in a fresh interpreter; returns its import time and heavy deps."""
+    script = _IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    _run(["-c", script])  # first run writes the .pyc files, like a packaged Lambda
+    result = _run(["-X", "importtime", "-c", script])
+    return {
+        "module": module,
+        "import_ms": round(_parse_importtime(result.stderr, module) / 1000, 2),
+        "heavy_modules": json.loads(result.stdout.strip().splitlines()[-1]),
+    }
+
+
+def measure_first_client_init():
+    """Milliseconds to import boto3 and build the handlers' clients (paid on first use)."""
+    result = _run(["-c", _INIT_SCRIPT])
+    return round(json.loads(result.stdout.strip().splitlines()[-1]), 2)
+
+
+def load_baseline(path=BASELINE_PATH):
+    """The committed baseline: {module: import_ms}."""
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def run():
+    """Measure every handler and the deferred client init."""
+    return {
+        "benchmark": "handler_cold_start",
+        "python": sys.version.split()[0],
+        "handlers": [measure_import(module) for module in HANDLERS],
+        "first_client_init_ms": measure_first_client_init(),
+    }
+
+
+def main(argv=None):
+    """CLI entry point: print the JSON result; optionally write it or refresh the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="Write the JSON result here as well")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    result = run()
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    if args.update_baseline:
+        baseline = {item["module"]: item["import_ms"] for item in result["handlers"]}
+        with open(BASELINE_PATH, "w", encoding="utf-8") as handle:
+            json.dump(baseline, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+
+
+if __name__ == "__main__":
+    main()
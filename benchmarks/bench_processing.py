@@ -0,0 +1,248 @@
+"""Micro-benchmarks for the ingest and processing hot paths.
+
+Synthetic MEDLINE records (deterministic, at several corpus sizes) are pushed
+through each stage on its own and through the whole raw -> processed pipeline:
+
+  medline_parse     Bio.Medline.parse over the EFetch text
+  format_record     medline.format_record (MEDLINE dict -> raw .txt)
+  kb_metadata       medline.kb_metadata, the KB metadata sidecar
+  parse_record      processing.parse_record (raw .txt -> record dict)
+  normalize_date    processing.normalize_date over PubMed DP values
+  build_record_doc  processing.build_record_doc
+  jsonl_export      processing.write_jsonl
+  end_to_end        raw .txt directory -> JSONL export + KB documents
+
+Each stage reports the best of --repeats runs as microseconds per record and
+records/sec. --check compares against benchmarks/baselines/processing.json and
+exits non-zero on a regression; --update-baseline rewrites it.
+
+Run: `python -m benchmarks.bench_processing --sizes 1000 10000 --check`
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from api import medline, processing
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baselines", "processing.json"
+)
+DEFAULT_SIZES = (100, 1000, 10000)
+# A stage regresses when it is this many times slower per record than the baseline.
+DEFAULT_TOLERANCE = 2.0
+
+_MONTHS = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
+_WORDS = (
+    "dementia caregiver burden sleep agitation intervention cohort randomized trial "
+    "cognitive decline alzheimer nursing home quality of life support outcome risk "
+    "assessment community primary care memory clinic family depression therapy"
+).split()
+_MESH = [
+    "*Dementia/therapy",
+    "Caregivers/psychology",
+    "Humans",
+    "Aged",
+    "*Alzheimer Disease/diagnosis",
+    "Sleep Wake Disorders",
+    "Psychomotor Agitation/prevention & control",
+]
+_TYPES = ["Journal Article", "Randomized Controlled Trial", "Review"]
+
+
+# --- Fixtures ---
+def _sentence(rng, words):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _wrap(tag, text, width=76):
+    """MEDLINE field with 6-space continuation lines, as EFetch returns it."""
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    lines.append(line)
+    return f"{tag:<4}- {lines[0]}" + "".join(f"\n      {rest}" for rest in lines[1:])
+
+
+def _date(rng):
+    year = rng.randint(1995, 2026)
+    shape = rng.random()
+    if shape < 0.6:
+        return f"{year} {rng.choice(_MONTHS)} {rng.randint(1, 28)}"
+    if shape < 0.9:
+        return f"{year} {rng.choice(_MONTHS)}"
+    return str(year)
+
+
+def synthetic_medline(count, seed=0):
+    """EFetch-style MEDLINE text for `count` records."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        fields = [
+            f"PMID- {40000000 + i}",
+            _wrap("TI", _sentence(rng, rng.randint(8, 18))),
+            _wrap(
+                "AB", " ".join(_sentence(rng, rng.randint(12, 25)) for _ in range(8))
+            ),
+            *[f"AU  - Author{rng.randint(1, 999)} {chr(65 + j)}" for j in range(4)],
+            "JT  - Journal of Synthetic Dementia Research",
+            f"DP  - {_date(rng)}",
+            *[f"MH  - {heading}" for heading in rng.sample(_MESH, 4)],
+            *[f"PT  - {kind}" for kind in rng.sample(_TYPES, 2)],
+        ]
+        records.append("\n".join(fields))
+    return "\n\n".join(records) + "\n"
+
+
+def _parse_medline(text):
+    from Bio import Medline
+
+    return list(Medline.parse(io.StringIO(text)))
+
+
+# --- Stages ---
+def _best_of(repeats, fn):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_size(count, repeats=3, seed=0):
+    """Time every stage on `count` synthetic records; {stage: timing}."""
+    medline_text = synthetic_medline(count, seed)
+    medline_records = _parse_medline(medline_text)
+    raw_texts = [medline.format_record(rec) for rec in medline_records]
+    parsed = [processing.parse_record(text) for text in raw_texts]
+    dates = [rec.get("DP", "") for rec in medline_records]
+    docs = [processing.build_record_doc(rec) for rec in parsed]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_dir = os.path.join(tmp, "raw")
+        os.makedirs(raw_dir)
+        for rec, text in zip(medline_records, raw_texts):
+            with open(os.path.join(raw_dir, f"{rec['PMID']}.txt"), "w") as handle:
+                handle.write(text)
+        jsonl_path = os.path.join(tmp, "export.jsonl")
+        out_dir = os.path.join(tmp, "out")
+
+        def end_to_end():
+            records = processing.load_records(raw_dir)
+            built = [processing.build_record_doc(rec) for rec in records]
+            processing.write_jsonl(built, os.path.join(out_dir, "records.jsonl"))
+            processing.write_kb_documents(built, os.path.join(out_dir, "kb_docs"))
+
+        os.makedirs(out_dir)
+        stages = {
+            "medline_parse": lambda: _parse_medline(medline_text),
+            "format_record": lambda: [
+                medline.format_record(rec) for rec in medline_records
+            ],
+            "kb_metadata": lambda: [
+                medline.kb_metadata(rec) for rec in medline_records
+            ],
+            "parse_record": lambda: [processing.parse_record(t) for t in raw_texts],
+            "normalize_date": lambda: [processing.normalize_date(d) for d in dates],
+            "build_record_doc": lambda: [
+                processing.build_record_doc(rec) for rec in parsed
+            ],
+            "jsonl_export": lambda: processing.write_jsonl(docs, jsonl_path),
+            "end_to_end": end_to_end,
+        }
+        results = {}
+        for name, fn in stages.items():
+            seconds = _best_of(repeats, fn)
+            results[name] = {
+                "us_per_record": round(seconds / count * 1e6, 3),
+                "records_per_sec": round(count / seconds, 1) if seconds else None,
+            }
+    return results
+
+
+def run(sizes=DEFAULT_SIZES, repeats=3, seed=0):
+    """Run every size; returns the JSON-ready result."""
+    return {
+        "benchmark": "processing_hot_paths",
+        "python": sys.version.split()[0],
+        "repeats": repeats,
+        "sizes": {str(count): run_size(count, repeats, seed) for count in sizes},
+    }
+
+
+# --- Baseline ---
+def load_baseline(path=BASELINE_PATH):
+    """The committed baseline: {size: {stage: us_per_record}}."""
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def baseline_from(result):
+    """Reduce a run to what we keep in the baseline file."""
+    return {
+        size: {stage: timing["us_per_record"] for stage, timing in stages.items()}
+        for size, stages in result["sizes"].items()
+    }
+
+
+def regressions(result, baseline, tolerance=DEFAULT_TOLERANCE, slack_us=0.0):
+    """Stages slower than tolerance x baseline (+ slack_us), as readable strings."""
+    found = []
+    for size, stages in result["sizes"].items():
+        expected = baseline.get(size, {})
+        for stage, timing in stages.items():
+            limit = expected.get(stage)
+            if (
+                limit is not None
+                and timing["us_per_record"] > limit * tolerance + slack_us
+            ):
+                found.append(
+                    f"{stage}@{size}: {timing['us_per_record']}us/record "
+                    f"> {tolerance}x baseline {limit}us"
+                )
+    return found
+
+
+def main(argv=None):
+    """CLI entry point: print results; optionally check or refresh the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON result here as well")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    result = run(args.sizes, args.repeats)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as handle:
+            json.dump(baseline_from(result), handle, indent=2, sort_keys=True)
+            handle.write("\n")
+    if args.check:
+        found = regressions(result, load_baseline(), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
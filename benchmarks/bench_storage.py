@@ -0,0 +1,144 @@
+"""Write throughput of the api.storage backends the pipelines run on.
+
+Writes --objects raw-record-sized bodies (a .txt and its metadata sidecar, as
+the ingest Lambda writes them) through each backend and reports objects/sec:
+
+  memory          MemoryStorage (the pipeline's own overhead)
+  local           LocalStorage in a temp directory (disk speed)
+  s3_serial       S3Storage with one worker: one blocking PUT at a time, as
+                  ingest wrote before; S3 is a local fake with --put-latency-ms
+  s3_concurrent   the same fake behind S3Storage's thread pool (--workers)
+
+Pass --s3-url s3://bucket/prefix/ to add a run against a real bucket (needs
+AWS credentials; the objects are deleted afterwards).
+
+Run: `python -m benchmarks.bench_storage --objects 1000 --put-latency-ms 20`
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+
+from api import storage
+
+DEFAULT_OBJECTS = 1000
+DEFAULT_PUT_LATENCY_MS = 20.0
+DEFAULT_WORKERS = storage.MAX_WORKERS
+
+
+class FakeS3:
+    """put_object/delete_objects that sleep like a network round trip."""
+
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):  # noqa: N803
+        time.sleep(self.latency)
+        with self._lock:
+            self.objects[Key] = len(Body)
+
+    def delete_objects(self, Bucket, Delete):  # noqa: N803
+        time.sleep(self.latency)
+        with self._lock:
+            for obj in Delete["Objects"]:
+                self.objects.pop(obj["Key"], None)
+        return {}
+
+
+def bodies(count, seed=0):
+    """(key, body) pairs shaped like raw records and their sidecars."""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(count // 2):
+        pmid = 40000000 + i
+        text = f"PMID: {pmid}\nTitle: Synthetic\nAbstract:\n" + "x" * rng.randint(
+            800, 2400
+        )
+        pairs.append((f"{pmid}.txt", text.encode("utf-8")))
+        pairs.append(
+            (
+                f"{pmid}.txt.metadata.json",
+                json.dumps({"metadataAttributes": {"pmid": str(pmid)}}).encode(),
+            )
+        )
+    return pairs
+
+
+def time_writes(out, pairs):
+    """Seconds to put every pair and flush, plus the delete_many cleanup time."""
+    started = time.perf_counter()
+    for key, body in pairs:
+        out.put(key, body)
+    out.flush()
+    write_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    out.delete_many([key for key, _ in pairs])
+    out.close()
+    return write_seconds, time.perf_counter() - started
+
+
+def run(
+    objects=DEFAULT_OBJECTS,
+    put_latency_ms=DEFAULT_PUT_LATENCY_MS,
+    workers=DEFAULT_WORKERS,
+    s3_url=None,
+):
+    """Time every backend; returns the JSON-ready result."""
+    pairs = bodies(objects)
+    tmp = tempfile.TemporaryDirectory()
+    backends = {
+        "memory": lambda: storage.MemoryStorage(),
+        "local": lambda: storage.LocalStorage(tmp.name),
+        "s3_serial": lambda: storage.S3Storage(
+            "bench", client=FakeS3(put_latency_ms), max_workers=1, max_pending=1
+        ),
+        "s3_concurrent": lambda: storage.S3Storage(
+            "bench", client=FakeS3(put_latency_ms), max_workers=workers
+        ),
+    }
+    if s3_url:
+        backends["s3_real"] = lambda: storage.from_url(s3_url, max_workers=workers)
+    results = {}
+    with tmp:
+        for name, build in backends.items():
+            write_seconds, delete_seconds = time_writes(build(), pairs)
+            results[name] = {
+                "write_seconds": round(write_seconds, 3),
+                "objects_per_sec": round(len(pairs) / write_seconds, 1),
+                "delete_seconds": round(delete_seconds, 3),
+            }
+    return {
+        "benchmark": "storage",
+        "objects": len(pairs),
+        "bytes": sum(len(body) for _, body in pairs),
+        "fake_put_latency_ms": put_latency_ms,
+        "workers": workers,
+        "backends": results,
+    }
+
+
+def main(argv=None):
+    """CLI entry point: print the JSON result (and optionally write it to a file)."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=DEFAULT_OBJECTS)
+    parser.add_argument("--put-latency-ms", type=float, default=DEFAULT_PUT_LATENCY_MS)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--s3-url", help="Also write to (and clean up) this prefix")
+    parser.add_argument("--output", help="Write the JSON result here as well")
+    args = parser.parse_args(argv)
+
+    result = run(args.objects, args.put_latency_ms, args.workers, args.s3_url)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Bytes the Streamlit UI sends to the browser per script run.
+
+Runs ui/app.py under Streamlit's AppTest against a local stub of the query API
+and sums the serialized size of every element the script emits: on the first
+run (welcome page), on a plain rerun, and on a rerun with answered questions in
+the history. Streamlit re-sends these elements on every rerun, so this is the
+per-interaction cost. The app's CSS and JS are inlined into the first run only;
+files under ui/static/ are listed separately, but only the logo is fetched from
+there (once, then served from cache).
+
+First paint needs a real browser: measure it with Lighthouse or the DevTools
+Performance panel against `make run-ui`.
+
+Needs the UI requirements (`pip install -r ui/requirements.txt`).
+Run: `python -m benchmarks.bench_ui_payload --answers 3`
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "ui", "app.py")
+STATIC_DIR = os.path.join(REPO_ROOT, "ui", "static")
+
+
+class _StubAPI(BaseHTTPRequestHandler):
+    """POST /query -> a fixed answer with three sources."""
+
+    def do_POST(self):  # noqa: N802
+        length = int(self.headers.get("Content-Length", 0))
+        question = json.loads(self.rfile.read(length) or b"{}").get("question", "")
+        body = json.dumps(
+            {
+                "answer": f"Stub answer to: {question}. " * 20,
+                "sources": [
+                    {
+                        "text": f"PMID: {39000000 + i} Stub abstract. " * 40,
+                        "metadata": {"pmid": str(39000000 + i), "title": "Stub"},
+                    }
+                    for i in range(3)
+                ],
+            }
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def element_bytes(node):
+    """Serialized size of an AppTest element tree node and its children."""
+    proto = getattr(node, "proto", None)
+    total = proto.ByteSize() if proto is not None else 0
+    for child in getattr(node, "children", {}).values():
+        total += element_bytes(child)
+    return total
+
+
+def static_assets(static_dir=STATIC_DIR):
+    """{file name: bytes} for the assets the browser caches."""
+    if not os.path.isdir(static_dir):
+        return {}
+    return {
+        name: os.path.getsize(os.path.join(static_dir, name))
+        for name in sorted(os.listdir(static_dir))
+    }
+
+
+def _wait_for_answer(app, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while "pending_query" in app.session_state and time.monotonic() < deadline:
+        time.sleep(0.05)
+        app.run()
+
+
+def run(app_path=APP_PATH, answers=3):
+    """Measure one session: first run, a rerun, and reruns after `answers` questions."""
+    import streamlit
+    from streamlit.testing.v1 import AppTest
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), _StubAPI)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    saved_env = {name: os.environ.get(name) for name in ("RAG_API_URL",)}
+    os.environ["RAG_API_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    # AppTest has no browser connection, so there is no client IP to look up.
+    saved_context = getattr(streamlit, "context", None)
+    streamlit.context = None
+    try:
+        app = AppTest.from_file(app_path, default_timeout=30)
+        app.run()
+        first_run = element_bytes(app._tree)
+        app.run()
+        rerun = element_bytes(app._tree)
+        with_answers = {}
+        for i in range(answers):
+            app.text_input(key="question_input").set_value(f"Question {i}?").run()
+            if "pending_query" not in app.session_state:
+                app.button(key="ask_button").click().run()
+            _wait_for_answer(app)
+            app.run()
+            with_answers[str(i + 1)] = element_bytes(app._tree)
+    finally:
+        stub.shutdown()
+        streamlit.context = saved_context
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    assets = static_assets(os.path.join(os.path.dirname(app_path), "static"))
+    return {
+        "benchmark": "ui_payload",
+        "streamlit": streamlit.__version__,
+        "app": os.path.relpath(app_path),
+        "first_run_bytes": first_run,
+        "rerun_bytes": rerun,
+        "rerun_bytes_after_answers": with_answers,
+        "static_assets_bytes": assets,
+        "static_assets_total_bytes": sum(assets.values()),
+    }
+
+
+def main(argv=None):
+    """CLI entry point: print the JSON result (and optionally write it to a file)."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--app", default=APP_PATH, help="App script (e.g. an older copy to compare)"
+    )
+    parser.add_argument("--answers", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON result here as well")
+    args = parser.parse_args(argv)
+
+    result = run(os.path.abspath(args.app), args.answers)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
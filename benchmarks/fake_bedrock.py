@@ -0,0 +1,204 @@
+"""Local stand-ins for the Bedrock clients used by the query handler.
+
+FakeAgentRuntime answers `retrieve` and `retrieve_and_generate`, FakeRuntime
+answers `converse`. Each call sleeps for a latency drawn from a configurable
+distribution and can fail or come back without citations at a configured rate,
+so the query path can be load-tested without AWS. Documents come from a small
+synthetic corpus (or one you pass in) and are ranked by word overlap.
+
+Latency specs: `fixed:MS`, `uniform:LOW_MS:HIGH_MS` or `lognormal:MEDIAN_MS:SIGMA`.
+"""
+
+import math
+import random
+import re
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+DEFAULT_DOCUMENTS = [
+    {
+        "pmid": str(30000000 + i),
+        "title": title,
+        "text": f"{title}. {body}",
+    }
+    for i, (title, body) in enumerate(
+        [
+            (
+                "Sleep disturbances in dementia",
+                "Light therapy and structured daytime activity reduce night-time "
+                "waking and sundowning in people with dementia.",
+            ),
+            (
+                "Caregiver burden in early Alzheimer's disease",
+                "Family caregivers report stress, depression and reduced quality of "
+                "life; psychoeducation and respite care lower caregiver burden.",
+            ),
+            (
+                "Non-pharmacological interventions for agitation",
+                "Music therapy, person-centred care and caregiver training reduce "
+                "agitation and aggression in nursing-home residents with dementia.",
+            ),
+            (
+                "Antipsychotic use in dementia",
+                "Antipsychotics carry stroke and mortality risks; guidelines advise "
+                "non-drug approaches first for behavioural symptoms.",
+            ),
+            (
+                "Clinical decision support for dementia diagnosis",
+                "Decision support systems in primary care improve detection of mild "
+                "cognitive impairment and timely referral.",
+            ),
+            (
+                "Wandering and safety",
+                "GPS tracking, environmental design and supervision reduce wandering "
+                "incidents among community-dwelling people with dementia.",
+            ),
+            (
+                "Nutrition and weight loss in dementia",
+                "Finger foods, assisted feeding and oral supplements help maintain "
+                "weight in advanced dementia.",
+            ),
+            (
+                "Exercise and cognitive decline",
+                "Aerobic and resistance exercise programmes slow functional decline "
+                "in mild to moderate Alzheimer's disease.",
+            ),
+        ]
+    )
+]
+
+
+def parse_latency(spec):
+    """Turn a latency spec into a function returning seconds."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    values = [float(v) for v in args.split(":") if v]
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        low, high = values
+        return lambda rng: rng.uniform(low, high) / 1000
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma) / 1000
+    raise ValueError(f"Unsupported latency spec: {spec}")
+
+
+def _throttled(operation):
+    return ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+        operation,
+    )
+
+
+class _FakeClient:
+    """Shared latency / failure behaviour for the fakes."""
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, time_scale=1.0, seed=0):
+        self._latency = parse_latency(latency)
+        self._error_rate = error_rate
+        self._time_scale = time_scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _call(self, operation, latency=None):
+        """Sleep, maybe fail, and return a uniform draw for the caller's own choices."""
+        with self._lock:  # one draw sequence per client, so seeded runs repeat
+            self.calls += 1
+            latency = (latency or self._latency)(self._rng) * self._time_scale
+            fails = self._rng.random() < self._error_rate
+            roll = self._rng.random()
+        if latency > 0:
+            time.sleep(latency)
+        if fails:
+            raise _throttled(operation)
+        return roll
+
+
+class FakeAgentRuntime(_FakeClient):
+    """Fake `bedrock-agent-runtime`: retrieve and retrieve_and_generate."""
+
+    def __init__(
+        self,
+        latency="fixed:0",
+        generate_latency=None,
+        error_rate=0.0,
+        empty_citation_rate=0.0,
+        documents=None,
+        time_scale=1.0,
+        seed=0,
+    ):
+        super().__init__(latency, error_rate, time_scale, seed)
+        self._generate_latency = parse_latency(generate_latency or latency)
+        self._empty_citation_rate = empty_citation_rate
+        self._documents = documents or DEFAULT_DOCUMENTS
+        self._index = [
+            set(_WORD.findall(doc["text"].lower())) for doc in self._documents
+        ]
+
+    def _search(self, text, limit):
+        words = set(_WORD.findall(text.lower()))
+        scored = sorted(
+            (
+                (len(words & doc_words) / (len(words) or 1), i)
+                for i, doc_words in enumerate(self._index)
+            ),
+            key=lambda pair: (-pair[0], pair[1]),
+        )
+        results = []
+        for score, i in scored[:limit]:
+            doc = self._documents[i]
+            results.append(
+                {
+                    "content": {"text": doc["text"]},
+                    "metadata": {"pmid": doc["pmid"], "title": doc.get("title", "")},
+                    "location": {"s3Location": {"uri": f"s3://fake/{doc['pmid']}.txt"}},
+                    "score": round(score, 4),
+                }
+            )
+        return results
+
+    @staticmethod
+    def _limit(config):
+        vector = config.get("vectorSearchConfiguration", {})
+        return vector.get("numberOfResults", 5)
+
+    def retrieve(
+        self, knowledgeBaseId, retrievalQuery, retrievalConfiguration=None
+    ):  # noqa: N803
+        """Top matches for the query text."""
+        self._call("Retrieve")
+        limit = self._limit(retrievalConfiguration or {})
+        return {"retrievalResults": self._search(retrievalQuery["text"], limit)}
+
+    def retrieve_and_generate(
+        self, input, retrieveAndGenerateConfiguration
+    ):  # noqa: A002,N803
+        """A canned answer citing the top matches (or none, at the empty rate)."""
+        roll = self._call("RetrieveAndGenerate", self._generate_latency)
+        kb_config = retrieveAndGenerateConfiguration["knowledgeBaseConfiguration"]
+        limit = self._limit(kb_config.get("retrievalConfiguration", {}))
+        references = self._search(input["text"], limit)
+        citations = []
+        if roll >= self._empty_citation_rate:
+            citations = [{"retrievedReferences": references}]
+        return {
+            "output": {"text": f"Fake answer about {input['text'][:60]}"},
+            "citations": citations,
+        }
+
+
+class FakeRuntime(_FakeClient):
+    """Fake `bedrock-runtime`: converse returns a short canned answer."""
+
+    def converse(self, modelId, messages, **kwargs):  # noqa: N803
+        self._call("Converse")
+        question = messages[-1]["content"][0]["text"][-80:]
+        return {
+            "output": {"message": {"content": [{"text": f"Fake answer: {question}"}]}},
+            "usage": {"inputTokens": 0, "outputTokens": 0},
+        }
@@ -0,0 +1,326 @@
+"""Offline load test for the query path, with Bedrock replaced by local fakes.
+
+Drives `lambda_query_handler.handler` directly (mode `handler`, one call per
+simulated Lambda invocation) or the standalone asyncio server over HTTP (mode
+`server`) with a question corpus at a target concurrency, and reports latency
+percentiles, throughput, status counts, error rate and the share of answers that
+came back without sources. The fake's latency, error and empty-citation rates
+are configurable (see benchmarks/fake_bedrock.py), so runs are free and
+repeatable; compare the JSON artifacts across commits.
+
+Run: `python -m benchmarks.load_test --mode handler --concurrency 16 --requests 400`
+"""
+
+import argparse
+import asyncio
+import contextlib
+import http.client
+import itertools
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api import lambda_query_handler, server
+from benchmarks.fake_bedrock import FakeAgentRuntime, FakeRuntime
+from benchmarks.stats import summarize_ms
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "data", "questions.json")
+
+
+class _LambdaContext:
+    """Just enough of the Lambda context for the handler's deadline."""
+
+    def __init__(self, remaining_ms):
+        self._remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self._remaining_ms
+
+
+@contextlib.contextmanager
+def fake_bedrock(agent, runtime, stage_workers):
+    """Point the query handler at the fakes (no rate limit, empty answer cache)."""
+    handler = lambda_query_handler
+    names = (
+        "client",
+        "runtime_client",
+        "KB_ID",
+        "KB_ROUTES",
+        "RATE_LIMIT_URL",
+        "_rate_limiter",
+        "_answer_cache",
+        "_executor",
+    )
+    saved = {name: getattr(handler, name) for name in names}
+    handler.client = agent
+    handler.runtime_client = runtime
+    handler.KB_ID = "kb-load-test"
+    handler.KB_ROUTES = ""
+    handler.RATE_LIMIT_URL = ""
+    handler._rate_limiter = None
+    handler._answer_cache = {}
+    # Each real Lambda container has its own stage pool; one shared pool of the
+    # default size would become the bottleneck here instead of the fake Bedrock.
+    handler._executor = ThreadPoolExecutor(
+        max_workers=stage_workers, thread_name_prefix="rag-query"
+    )
+    try:
+        yield
+    finally:
+        handler._executor.shutdown(wait=False)
+        for name, value in saved.items():
+            setattr(handler, name, value)
+
+
+def _handler_sender(remaining_ms):
+    def send(question):
+        event = {"body": json.dumps({"question": question}), "isBase64Encoded": False}
+        response = lambda_query_handler.handler(event, _LambdaContext(remaining_ms))
+        return response["statusCode"], json.loads(response["body"])
+
+    return send
+
+
+class _ServerThread:
+    """Runs a QueryServer on an ephemeral localhost port in a background loop."""
+
+    def __init__(self, workers):
+        self.query_server = server.QueryServer(workers=workers)
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self.query_server.handle_connection, "127.0.0.1", 0)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    async def _shutdown(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def close(self):
+        """Stop listening, wait for open connections to finish, then stop the loop."""
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def _server_sender(port, connections):
+    """Sender over one keep-alive connection per worker thread (kept in `connections`)."""
+    local = threading.local()
+
+    def send(question):
+        if getattr(local, "conn", None) is None:
+            local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            connections.append(local.conn)
+        body = json.dumps({"question": question})
+        try:
+            local.conn.request(
+                "POST", "/query", body, {"Content-Type": "application/json"}
+            )
+            resp = local.conn.getresponse()
+            payload = json.loads(resp.read() or b"{}")
+        except (OSError, http.client.HTTPException):
+            local.conn.close()
+            local.conn = None
+            raise
+        return resp.status, payload
+
+    return send
+
+
+def drive(send, questions, concurrency, total_requests):
+    """Send `total_requests` questions from `concurrency` workers; returns samples."""
+    counter = itertools.count()
+    lock = threading.Lock()
+    samples = []
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter)
+            if i >= total_requests:
+                return
+            question = questions[i % len(questions)]
+            started = time.perf_counter()
+            try:
+                status, payload = send(question)
+            except Exception:
+                status, payload = 0, {}
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                samples.append((elapsed_ms, status, payload))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, duration):
+    """Latency percentiles, throughput, status counts, error and empty-source rates."""
+    total = len(samples)
+    ok = [(ms, payload) for ms, status, payload in samples if status == 200]
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    empty = sum(1 for _, payload in ok if not payload.get("sources"))
+    return {
+        "requests": total,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(total / duration, 2) if duration else 0.0,
+        "latency": summarize_ms([ms for ms, _, _ in samples]),
+        "latency_ok": summarize_ms([ms for ms, _ in ok]),
+        "status_counts": statuses,
+        "error_rate": round((total - len(ok)) / total, 4) if total else 0.0,
+        "empty_sources_rate": round(empty / len(ok), 4) if ok else 0.0,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    mode="handler",
+    concurrency=8,
+    total_requests=200,
+    questions=None,
+    retrieve_latency="lognormal:150:0.4",
+    generate_latency="lognormal:1500:0.5",
+    error_rate=0.01,
+    empty_citation_rate=0.05,
+    time_scale=1.0,
+    remaining_ms=29000,
+    seed=0,
+):
+    """Run one load test and return the JSON-ready result."""
+    if questions is None:
+        with open(QUESTIONS_PATH, "r", encoding="utf-8") as handle:
+            questions = json.load(handle)
+    agent = FakeAgentRuntime(
+        latency=retrieve_latency,
+        generate_latency=generate_latency,
+        error_rate=error_rate,
+        empty_citation_rate=empty_citation_rate,
+        time_scale=time_scale,
+        seed=seed,
+    )
+    runtime = FakeRuntime(
+        latency=generate_latency,
+        error_rate=error_rate,
+        time_scale=time_scale,
+        seed=seed,
+    )
+
+    extra = {}
+    with fake_bedrock(agent, runtime, stage_workers=max(8, concurrency * 2)):
+        if mode == "handler":
+            samples, duration = drive(
+                _handler_sender(remaining_ms), questions, concurrency, total_requests
+            )
+        elif mode == "server":
+            server_thread = _ServerThread(workers=concurrency)
+            connections = []
+            try:
+                samples, duration = drive(
+                    _server_sender(server_thread.port, connections),
+                    questions,
+                    concurrency,
+                    total_requests,
+                )
+            finally:
+                for conn in connections:
+                    conn.close()
+                server_thread.close()
+            extra["coalesced"] = server_thread.query_server.coalesced
+        else:
+            raise ValueError(f"Unsupported mode: {mode}")
+
+    return {
+        "benchmark": "query_load_test",
+        "commit": _git_commit(),
+        "mode": mode,
+        "retrieval_mode": lambda_query_handler.RETRIEVAL_MODE,
+        "concurrency": concurrency,
+        "fake": {
+            "retrieve_latency": retrieve_latency,
+            "generate_latency": generate_latency,
+            "error_rate": error_rate,
+            "empty_citation_rate": empty_citation_rate,
+            "time_scale": time_scale,
+            "seed": seed,
+            "bedrock_calls": agent.calls + runtime.calls,
+        },
+        **summarize(samples, duration),
+        **extra,
+    }
+
+
+def main(argv=None):
+    """CLI entry point: print the JSON result (and optionally write it to a file)."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["handler", "server"], default="handler")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--questions", help="JSON list of questions")
+    parser.add_argument("--retrieve-latency", default="lognormal:150:0.4")
+    parser.add_argument("--generate-latency", default="lognormal:1500:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--empty-citation-rate", type=float, default=0.05)
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="Multiply fake latencies (e.g. 0.1 for a quick smoke run)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON result here as well")
+    parser.add_argument(
+        "--verbose", action="store_true", help="Keep the handler's error logs"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        # Injected failures would otherwise print a traceback per request.
+        logging.getLogger("rag-query").setLevel(logging.CRITICAL)
+
+    questions = None
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as handle:
+            questions = json.load(handle)
+    result = run(
+        mode=args.mode,
+        concurrency=args.concurrency,
+        total_requests=args.requests,
+        questions=questions,
+        retrieve_latency=args.retrieve_latency,
+        generate_latency=args.generate_latency,
+        error_rate=args.error_rate,
+        empty_citation_rate=args.empty_citation_rate,
+        time_scale=args.time_scale,
+        seed=args.seed,
+    )
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
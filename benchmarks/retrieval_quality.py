@@ -0,0 +1,286 @@
+"""Retrieval quality and latency benchmark over a golden question set.
+
+Each golden question lists the PMIDs a good retrieval should return. For every
+question we time one retrieval on the chosen backend and score the ranked PMIDs
+with recall@k, MRR and nDCG@k, next to latency and the size of the context the
+model would be given. Run it before and after changing chunking,
+NUMBER_OF_RESULTS, the retrieval mode or re-ranking, and compare the JSON.
+
+Backends:
+  local     BM25 over a corpus JSONL (the processing stage's export format)
+  kb        the query handler's KB vector retrieve
+  hybrid    the query handler's hybrid retrieval (RRF, re-ranking if enabled)
+  recorded  replay results saved earlier with --record (no AWS needed)
+With --fake, kb and hybrid run against benchmarks/fake_bedrock.py over the corpus.
+
+The bundled golden set (benchmarks/data/golden/) is a synthetic fixture with
+made-up PMIDs; point --golden and --corpus at a curated set for the real KB.
+
+Run: `python -m benchmarks.retrieval_quality --backend local`
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+
+from api import lambda_query_handler
+from benchmarks.fake_bedrock import FakeAgentRuntime
+from benchmarks.stats import summarize_ms
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "data", "golden")
+GOLDEN_PATH = os.path.join(GOLDEN_DIR, "questions.json")
+CORPUS_PATH = os.path.join(GOLDEN_DIR, "corpus.jsonl")
+
+
+# --- Metrics ---
+def recall_at_k(ranked, relevant, k):
+    """Share of the relevant PMIDs found in the top k."""
+    if not relevant:
+        return 0.0
+    return len(set(ranked[:k]) & set(relevant)) / len(relevant)
+
+
+def reciprocal_rank(ranked, relevant):
+    """1/rank of the first relevant PMID, 0 if none was retrieved."""
+    for rank, pmid in enumerate(ranked, start=1):
+        if pmid in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked, relevant, k):
+    """Binary-relevance nDCG over the top k."""
+    dcg = sum(
+        1.0 / math.log2(rank + 1)
+        for rank, pmid in enumerate(ranked[:k], start=1)
+        if pmid in relevant
+    )
+    ideal = sum(
+        1.0 / math.log2(rank + 1) for rank in range(1, min(k, len(relevant)) + 1)
+    )
+    return dcg / ideal if ideal else 0.0
+
+
+def ranked_pmids(sources):
+    """PMIDs in rank order, first occurrence only (chunks of one paper count once)."""
+    seen = []
+    for source in sources:
+        key = lambda_query_handler._source_key(source)
+        if key.startswith("pmid:") and key[5:] not in seen:
+            seen.append(key[5:])
+    return seen
+
+
+# --- Backends ---
+def load_corpus(path):
+    """Documents from a JSONL export: one {id, text, metadata} object per line."""
+    with open(path, "r", encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def _as_source(doc):
+    return {
+        "text": doc["text"],
+        "metadata": {"pmid": doc["id"], **doc.get("metadata", {})},
+    }
+
+
+def local_backend(corpus):
+    """BM25 (the handler's local scorer) over the whole corpus."""
+    candidates = [_as_source(doc) for doc in corpus]
+
+    def retrieve(question, k):
+        scores = lambda_query_handler._score_candidates(question, candidates)
+        order = sorted(range(len(candidates)), key=lambda i: (-scores[i], i))
+        return [candidates[i] for i in order[:k] if scores[i] > 0]
+
+    return retrieve
+
+
+def kb_backend():
+    """The handler's KB vector retrieve, on whatever client it has."""
+
+    def retrieve(question, k):
+        return lambda_query_handler._vector_retrieve(question, k, {})
+
+    return retrieve
+
+
+def hybrid_backend():
+    """The handler's hybrid retrieval, returning the context it would generate from."""
+
+    def retrieve(question, k):
+        handler = lambda_query_handler
+        saved = handler.NUMBER_OF_RESULTS
+        handler.NUMBER_OF_RESULTS = k
+        try:
+            sources, _ = handler._hybrid_sources(question, {}, handler._Deadline(None))
+        finally:
+            handler.NUMBER_OF_RESULTS = saved
+        return sources
+
+    return retrieve
+
+
+def recorded_backend(path):
+    """Replay sources saved by a previous run with --record."""
+    with open(path, "r", encoding="utf-8") as handle:
+        recorded = json.load(handle)
+
+    def retrieve(question, k):
+        return recorded.get(question, [])[:k]
+
+    return retrieve
+
+
+# --- Runner ---
+def evaluate(retrieve, golden, ks=(1, 3, 5), record=None):
+    """Run every golden question through `retrieve` and score the results."""
+    depth = max(ks)
+    per_question = []
+    latencies = []
+    context_tokens = []
+    for item in golden:
+        started = time.perf_counter()
+        sources = retrieve(item["question"], depth)
+        latency_ms = (time.perf_counter() - started) * 1000
+        if record is not None:
+            record[item["question"]] = sources
+        ranked = ranked_pmids(sources)
+        relevant = set(item["relevant_pmids"])
+        tokens = lambda_query_handler._estimate_tokens(
+            lambda_query_handler._format_context(sources)
+        )
+        latencies.append(latency_ms)
+        context_tokens.append(tokens)
+        per_question.append(
+            {
+                "question": item["question"],
+                "retrieved": ranked,
+                "relevant": sorted(relevant),
+                "reciprocal_rank": round(reciprocal_rank(ranked, relevant), 4),
+                **{
+                    f"recall@{k}": round(recall_at_k(ranked, relevant, k), 4)
+                    for k in ks
+                },
+                "latency_ms": round(latency_ms, 2),
+                "context_tokens": tokens,
+            }
+        )
+
+    count = len(per_question) or 1
+    quality = {"mrr": round(sum(q["reciprocal_rank"] for q in per_question) / count, 4)}
+    for k in ks:
+        quality[f"recall@{k}"] = round(
+            sum(q[f"recall@{k}"] for q in per_question) / count, 4
+        )
+        quality[f"ndcg@{k}"] = round(
+            sum(ndcg_at_k(q["retrieved"], set(q["relevant"]), k) for q in per_question)
+            / count,
+            4,
+        )
+    return {
+        "questions": len(per_question),
+        "quality": quality,
+        "latency": summarize_ms(latencies),
+        "context_tokens": {
+            "mean": round(sum(context_tokens) / count, 1),
+            "max": max(context_tokens, default=0),
+        },
+        "per_question": per_question,
+    }
+
+
+def run(
+    backend="local",
+    golden_path=GOLDEN_PATH,
+    corpus_path=CORPUS_PATH,
+    ks=(1, 3, 5),
+    fake=False,
+    recorded_path=None,
+    record_path=None,
+):
+    """Build the backend, evaluate the golden set, and return the JSON-ready result."""
+    with open(golden_path, "r", encoding="utf-8") as handle:
+        golden = json.load(handle)
+
+    handler = lambda_query_handler
+    saved = (handler.client, handler.KB_ID, handler.KB_ROUTES)
+    if fake and backend in ("kb", "hybrid"):
+        documents = [
+            {
+                "pmid": doc["id"],
+                "title": doc.get("metadata", {}).get("title", ""),
+                "text": doc["text"],
+            }
+            for doc in load_corpus(corpus_path)
+        ]
+        handler.client = FakeAgentRuntime(documents=documents)
+        # One fake KB, so the handler routes every question to it.
+        handler.KB_ID, handler.KB_ROUTES = "kb-fake", ""
+    try:
+        if backend == "local":
+            retrieve = local_backend(load_corpus(corpus_path))
+        elif backend == "kb":
+            retrieve = kb_backend()
+        elif backend == "hybrid":
+            retrieve = hybrid_backend()
+        elif backend == "recorded":
+            retrieve = recorded_backend(recorded_path)
+        else:
+            raise ValueError(f"Unsupported backend: {backend}")
+        record = {} if record_path else None
+        result = evaluate(retrieve, golden, ks, record)
+    finally:
+        handler.client, handler.KB_ID, handler.KB_ROUTES = saved
+
+    if record_path:
+        with open(record_path, "w", encoding="utf-8") as handle:
+            json.dump(record, handle, indent=2)
+    return {
+        "benchmark": "retrieval_quality",
+        "backend": backend,
+        "fake": fake,
+        "golden": os.path.relpath(golden_path),
+        **result,
+    }
+
+
+def main(argv=None):
+    """CLI entry point: print the JSON result (and optionally write it to a file)."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--backend", choices=["local", "kb", "hybrid", "recorded"], default="local"
+    )
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--fake", action="store_true", help="Use the fake KB client")
+    parser.add_argument("--recorded", help="Results file for --backend recorded")
+    parser.add_argument("--record", help="Save this run's results for later replay")
+    parser.add_argument("--summary", action="store_true", help="Omit per-question rows")
+    parser.add_argument("--output", help="Write the JSON result here as well")
+    args = parser.parse_args(argv)
+
+    result = run(
+        backend=args.backend,
+        golden_path=args.golden,
+        corpus_path=args.corpus,
+        ks=tuple(sorted(args.k)),
+        fake=args.fake,
+        recorded_path=args.recorded,
+        record_path=args.record,
+    )
+    if args.summary:
+        result.pop("per_question")
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
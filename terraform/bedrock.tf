@@ -8,9 +8,13 @@ module "bedrock" {
   kb_name           = "pubmed-rag-knowledge-base"
   kb_description    = "Knowledge base for PubMed RAG system with processed articles"
 
+  # Only the per-record KB documents: the JSONL exports next to them hold the
+  # same abstracts, without the metadata sidecars the query filters need.
+  # Rotations rewrite this prefix in place; start syncs with `make sync-kb`,
+  # which waits for the rotation pointer (api/rotation.py), not on a schedule.
   create_s3_data_source      = true
   kb_s3_data_source          = aws_s3_bucket.data.arn
-  s3_inclusion_prefixes      = [var.processed_prefix]
+  s3_inclusion_prefixes      = ["${var.processed_prefix}kb_docs/"]
   data_deletion_policy       = "RETAIN"
 
   number_of_shards   = "2"
@@ -1,7 +1,15 @@
+# Package the api/ modules so the handler can import the shared AWS client layer.
 data "archive_file" "pubmed_ingest_lambda" {
   type        = "zip"
-  source_file = "${path.module}/../api/lambda_ingest_handler.py"
   output_path = "${path.module}/pubmed_ingest_lambda.zip"
+
+  dynamic "source" {
+    for_each = fileset("${path.module}/../api", "*.py")
+    content {
+      content  = file("${path.module}/../api/${source.value}")
+      filename = "api/${source.value}"
+    }
+  }
 }
 
 data "aws_iam_policy_document" "pubmed_ingest_assume" {
@@ -29,6 +37,11 @@ data "aws_iam_policy_document" "pubmed_ingest_policy" {
     resources = ["${aws_s3_bucket.data.arn}/${var.raw_prefix}*"]
   }
 
+  statement {
+    actions   = ["s3:PutObject"]
+    resources = ["${aws_s3_bucket.data.arn}/${var.profiles_prefix}*"]
+  }
+
   statement {
     actions   = ["secretsmanager:GetSecretValue"]
     resources = [aws_secretsmanager_secret.ncbi_credentials.arn]
@@ -53,7 +66,7 @@ resource "aws_iam_role_policy" "pubmed_ingest" {
 resource "aws_lambda_function" "pubmed_ingest" {
   function_name = "${var.rag_api_name}-ingest"
   role          = aws_iam_role.pubmed_ingest.arn
-  handler       = "lambda_ingest_handler.handler"
+  handler       = "api.lambda_ingest_handler.handler"
   runtime       = "python3.11"
   timeout       = 900
   memory_size   = 1024
@@ -63,12 +76,16 @@ resource "aws_lambda_function" "pubmed_ingest" {
 
   environment {
     variables = {
-      NCBI_SECRET_ARN = aws_secretsmanager_secret.ncbi_credentials.arn
-      S3_BUCKET       = aws_s3_bucket.data.bucket
-      RAW_PREFIX      = var.raw_prefix
-      PUBMED_QUERY    = var.pubmed_query
-      RETMAX          = var.pubmed_retmax
-      BATCH_SIZE      = var.pubmed_batch_size
+      NCBI_SECRET_ARN   = aws_secretsmanager_secret.ncbi_credentials.arn
+      S3_BUCKET         = aws_s3_bucket.data.bucket
+      RAW_PREFIX        = var.raw_prefix
+      PUBMED_QUERY      = var.pubmed_query
+      RETMAX            = var.pubmed_retmax
+      BATCH_SIZE        = var.pubmed_batch_size
+      PROFILE_MODE      = var.lambda_profile_mode
+      PROFILE_EVERY_N   = tostring(var.lambda_profile_every_n)
+      PROFILE_SINK      = "s3://${aws_s3_bucket.data.bucket}/${var.profiles_prefix}"
+      METRICS_NAMESPACE = var.ingest_metrics_namespace
     }
   }
 
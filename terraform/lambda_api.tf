@@ -1,7 +1,15 @@
+# Package the whole api/ package so the handler can import its sibling modules.
 data "archive_file" "rag_lambda" {
   type        = "zip"
-  source_file = "${path.module}/../api/lambda_query_handler.py"
   output_path = "${path.module}/rag_lambda.zip"
+
+  dynamic "source" {
+    for_each = fileset("${path.module}/../api", "*.py")
+    content {
+      content  = file("${path.module}/../api/${source.value}")
+      filename = "api/${source.value}"
+    }
+  }
 }
 
 data "aws_iam_policy_document" "rag_lambda_assume" {
@@ -32,6 +40,34 @@ data "aws_iam_policy_document" "rag_lambda_policy" {
     resources = ["*"]
   }
 
+  statement {
+    actions   = ["aoss:APIAccessAll"]
+    resources = [module.bedrock.default_collection.arn]
+  }
+
+  # Async jobs: records under jobs/ and a background self-invoke.
+  statement {
+    actions   = ["s3:GetObject", "s3:PutObject"]
+    resources = ["${aws_s3_bucket.data.arn}/${var.jobs_prefix}*"]
+  }
+
+  # Opt-in profiles (PROFILE_MODE); see api/profiling.py.
+  statement {
+    actions   = ["s3:PutObject"]
+    resources = ["${aws_s3_bucket.data.arn}/${var.profiles_prefix}*"]
+  }
+
+  # Per-client rate-limit buckets shared across containers.
+  statement {
+    actions   = ["dynamodb:GetItem", "dynamodb:PutItem"]
+    resources = [aws_dynamodb_table.rag_rate_limit.arn]
+  }
+
+  statement {
+    actions   = ["lambda:InvokeFunction"]
+    resources = ["arn:aws:lambda:${var.aws_region}:${data.aws_caller_identity.current.account_id}:function:${var.rag_api_name}-query"]
+  }
+
   statement {
     actions = [
       "aws-marketplace:ViewSubscriptions",
@@ -59,9 +95,11 @@ resource "aws_iam_role_policy" "rag_lambda" {
 resource "aws_lambda_function" "rag_query" {
   function_name = "${var.rag_api_name}-query"
   role          = aws_iam_role.rag_lambda.arn
-  handler       = "lambda_query_handler.handler"
+  handler       = "api.lambda_query_handler.handler"
   runtime       = "python3.11"
-  timeout       = 30
+  # Synchronous requests stop at SYNC_DEADLINE_MS (API Gateway's 30s limit);
+  # the longer function timeout is for background async jobs.
+  timeout       = 120
   memory_size   = 512
 
   filename         = data.archive_file.rag_lambda.output_path
@@ -69,14 +107,56 @@ resource "aws_lambda_function" "rag_query" {
 
   environment {
     variables = {
-      BEDROCK_KB_ID     = module.bedrock.default_kb_identifier
-      BEDROCK_MODEL_ARN = var.bedrock_model_arn
+      BEDROCK_KB_ID           = module.bedrock.default_kb_identifier
+      BEDROCK_MODEL_ARN       = var.bedrock_model_arn
+      BEDROCK_FAST_MODEL_ARN  = var.bedrock_fast_model_arn
+      BEDROCK_KB_ROUTES       = jsonencode(var.rag_kb_routes)
+      RETRIEVAL_MODE          = var.rag_retrieval_mode
+      LEXICAL_SEARCH_ENDPOINT = module.bedrock.default_collection.collection_endpoint
+      SYNC_DEADLINE_MS        = "29000"
+      JOB_STORE_URL           = "s3://${aws_s3_bucket.data.bucket}/${var.jobs_prefix}"
+      WARMUP_QUESTIONS        = jsonencode(var.rag_warmup_questions)
+      RATE_LIMIT_URL          = var.rag_rate_limit_enabled ? "dynamodb://${aws_dynamodb_table.rag_rate_limit.name}" : ""
+      RATE_LIMIT_RPS          = tostring(var.rag_rate_limit_rps)
+      RATE_LIMIT_BURST        = tostring(var.rag_rate_limit_burst)
+      CLIENT_IP_SECRET        = var.rag_client_ip_secret
+      PROFILE_MODE            = var.lambda_profile_mode
+      PROFILE_EVERY_N         = tostring(var.lambda_profile_every_n)
+      PROFILE_SINK            = "s3://${aws_s3_bucket.data.bucket}/${var.profiles_prefix}"
+    }
+  }
+
+  lifecycle {
+    # Without the secret the UI's forwarded client_ip is not trusted, so every UI
+    # user would be keyed on the UI's NAT address and share one bucket.
+    precondition {
+      condition     = !var.rag_rate_limit_enabled || var.rag_client_ip_secret != ""
+      error_message = "rag_rate_limit_enabled needs rag_client_ip_secret (and CLIENT_IP_SECRET set to the same value in the UI's environment)."
     }
   }
 
   tags = var.tags
 }
 
+# Token buckets for per-client rate limiting (one item per client, expired by TTL).
+resource "aws_dynamodb_table" "rag_rate_limit" {
+  name         = "${var.rag_api_name}-rate-limit"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = var.tags
+}
+
 resource "aws_cloudwatch_log_group" "rag_lambda" {
   name              = "/aws/lambda/${aws_lambda_function.rag_query.function_name}"
   retention_in_days = 14
@@ -89,7 +169,7 @@ resource "aws_apigatewayv2_api" "rag_api" {
 
   cors_configuration {
     allow_headers = ["Content-Type", "Authorization"]
-    allow_methods = ["POST", "OPTIONS"]
+    allow_methods = ["GET", "POST", "OPTIONS"]
     allow_origins = ["*"]
   }
 
@@ -109,6 +189,12 @@ resource "aws_apigatewayv2_route" "rag_query" {
   target    = "integrations/${aws_apigatewayv2_integration.rag_api.id}"
 }
 
+resource "aws_apigatewayv2_route" "rag_query_job" {
+  api_id    = aws_apigatewayv2_api.rag_api.id
+  route_key = "GET /query/{id}"
+  target    = "integrations/${aws_apigatewayv2_integration.rag_api.id}"
+}
+
 resource "aws_apigatewayv2_stage" "rag_api" {
   api_id      = aws_apigatewayv2_api.rag_api.id
   name        = "$default"
@@ -128,3 +214,25 @@ resource "aws_lambda_permission" "rag_api" {
   principal     = "apigateway.amazonaws.com"
   source_arn    = "${aws_apigatewayv2_api.rag_api.execution_arn}/*/*"
 }
+
+# Scheduled warm-up: keeps a container initialized and refreshes pre-computed
+# answers for var.rag_warmup_questions (see WARMUP_QUESTIONS in the handler).
+resource "aws_cloudwatch_event_rule" "rag_query_warmup" {
+  name                = "${var.rag_api_name}-query-warmup"
+  schedule_expression = var.rag_warmup_schedule
+  tags                = var.tags
+}
+
+resource "aws_cloudwatch_event_target" "rag_query_warmup" {
+  rule  = aws_cloudwatch_event_rule.rag_query_warmup.name
+  arn   = aws_lambda_function.rag_query.arn
+  input = jsonencode({ warmup = true })
+}
+
+resource "aws_lambda_permission" "rag_query_warmup" {
+  statement_id  = "AllowEventBridgeWarmup"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.rag_query.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.rag_query_warmup.arn
+}
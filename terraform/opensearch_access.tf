@@ -44,3 +44,27 @@ resource "aws_opensearchserverless_access_policy" "kb_admins" {
     }
   ])
 }
+
+# Read-only access for the query Lambda's lexical (keyword) retrieval leg.
+resource "aws_opensearchserverless_access_policy" "rag_query_read" {
+  name = "os-read-${substr(var.rag_api_name, 0, 16)}"
+  type = "data"
+
+  policy = jsonencode([
+    {
+      Rules = [
+        {
+          ResourceType = "index"
+          Resource = [
+            "index/${module.bedrock.default_collection.name}/*"
+          ]
+          Permission = [
+            "aoss:DescribeIndex",
+            "aoss:ReadDocument"
+          ]
+        }
+      ],
+      Principal = [aws_iam_role.rag_lambda.arn]
+    }
+  ])
+}
@@ -3,6 +3,44 @@ data "aws_lb" "streamlit_alb" {
   depends_on = [module.streamlit_app]
 }
 
+resource "aws_cloudfront_cache_policy" "streamlit_static" {
+  name        = "${var.streamlit_app_name}-static"
+  min_ttl     = 86400
+  default_ttl = 31536000
+  max_ttl     = 31536000
+
+  parameters_in_cache_key_and_forwarded_to_origin {
+    enable_accept_encoding_gzip   = true
+    enable_accept_encoding_brotli = true
+
+    cookies_config {
+      cookie_behavior = "none"
+    }
+    headers_config {
+      header_behavior = "none"
+    }
+    # The asset version is in the query string.
+    query_strings_config {
+      query_string_behavior = "whitelist"
+      query_strings {
+        items = ["v"]
+      }
+    }
+  }
+}
+
+resource "aws_cloudfront_response_headers_policy" "streamlit_static" {
+  name = "${var.streamlit_app_name}-static"
+
+  custom_headers_config {
+    items {
+      header   = "Cache-Control"
+      value    = "public, max-age=31536000, immutable"
+      override = true
+    }
+  }
+}
+
 resource "aws_cloudfront_distribution" "streamlit_custom" {
   depends_on = [aws_acm_certificate_validation.streamlit]
 
@@ -37,6 +75,19 @@ resource "aws_cloudfront_distribution" "streamlit_custom" {
     response_headers_policy_id = "60669652-455b-4ae9-85a4-c4c02393f86c"
   }
 
+  # Static UI media (the logo) carry a content hash (?v=...), so they can be
+  # cached at the edge and in browsers for a year. CSS/JS are inlined by the app.
+  ordered_cache_behavior {
+    path_pattern               = "/app/static/*"
+    allowed_methods            = ["GET", "HEAD", "OPTIONS"]
+    cached_methods             = ["GET", "HEAD"]
+    target_origin_id           = "${var.streamlit_app_name}-alb-origin"
+    viewer_protocol_policy     = "redirect-to-https"
+    compress                   = true
+    cache_policy_id            = aws_cloudfront_cache_policy.streamlit_static.id
+    response_headers_policy_id = aws_cloudfront_response_headers_policy.streamlit_static.id
+  }
+
   restrictions {
     geo_restriction {
       restriction_type = "none"
@@ -21,6 +21,12 @@ variable "processed_prefix" {
   default     = "processed/"
 }
 
+variable "jobs_prefix" {
+  description = "Prefix for async query job records within the bucket (expired after a day)."
+  type        = string
+  default     = "jobs/"
+}
+
 variable "tags" {
   description = "Tags to apply to the S3 bucket."
   type        = map(string)
@@ -49,6 +55,94 @@ variable "bedrock_model_arn" {
   default     = "arn:aws:bedrock:us-east-1::foundation-model/anthropic.claude-3-5-sonnet-20240620-v1:0"
 }
 
+variable "bedrock_fast_model_arn" {
+  description = "Optional faster Bedrock model ARN for easy questions; empty disables routing."
+  type        = string
+  default     = ""
+}
+
+variable "rag_kb_routes" {
+  description = "Extra knowledge bases to federate queries over: route name -> KB id, routing keywords and per-KB timeout. Empty: the default KB only."
+  type        = map(object({
+    kb_id       = string
+    keywords    = optional(list(string), [])
+    timeout_sec = optional(number)
+  }))
+  default = {}
+}
+
+variable "rag_retrieval_mode" {
+  description = "Query retrieval mode: kb (RetrieveAndGenerate) or hybrid (vector + lexical with RRF)."
+  type        = string
+  default     = "kb"
+}
+
+variable "rag_rate_limit_enabled" {
+  description = "Per-client rate limiting for the query API. Needs rag_client_ip_secret, also set as CLIENT_IP_SECRET in the UI's environment, or every UI user shares one bucket."
+  type        = bool
+  default     = false
+}
+
+variable "rag_rate_limit_rps" {
+  description = "Per-client sustained request rate for the query API (requests/second)."
+  type        = number
+  default     = 1
+}
+
+variable "rag_rate_limit_burst" {
+  description = "Per-client burst size for the query API rate limit."
+  type        = number
+  default     = 10
+}
+
+variable "rag_client_ip_secret" {
+  description = "Shared secret the UI sends (X-Client-IP-Secret) so the query API rate-limits on the client_ip it forwards. Required when rag_rate_limit_enabled."
+  type        = string
+  default     = ""
+  sensitive   = true
+}
+
+variable "lambda_profile_mode" {
+  description = "Profiling for both Lambdas: off, always, or sample (every lambda_profile_every_n-th invocation)."
+  type        = string
+  default     = "off"
+}
+
+variable "lambda_profile_every_n" {
+  description = "With lambda_profile_mode = sample, profile one in this many invocations per container."
+  type        = number
+  default     = 100
+}
+
+variable "ingest_metrics_namespace" {
+  description = "CloudWatch namespace for the ingest Lambda's EMF batch metrics (\"off\" to disable)."
+  type        = string
+  default     = "PubMedRAG/Ingest"
+}
+
+variable "profiles_prefix" {
+  description = "S3 prefix for cProfile/tracemalloc output."
+  type        = string
+  default     = "profiles/"
+}
+
+variable "rag_warmup_schedule" {
+  description = "EventBridge schedule for the query Lambda warm-up event."
+  type        = string
+  default     = "rate(5 minutes)"
+}
+
+variable "rag_warmup_questions" {
+  description = "Popular questions whose answers each warm-up pre-computes and caches (empty: just initialize)."
+  type        = list(string)
+  # Same as the sample questions on the UI's welcome screen (ui/app.py).
+  default = [
+    "What are evidence-based strategies for managing sleep disturbances in people with dementia?",
+    "What does the research say about caregiver burden in early-stage Alzheimer's disease?",
+    "Are there effective non-pharmacological interventions for agitation in dementia patients?",
+  ]
+}
+
 variable "rag_api_name" {
   description = "Name prefix for the RAG API."
   type        = string
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from api import aws_clients
+
+
+class DummySecretsClient:
+    def __init__(self, secret):
+        self._secret = secret
+        self.calls = 0
+
+    def get_secret_value(self, SecretId):  # noqa: N803,D401
+        """Return a canned secret string and count the calls."""
+        self.calls += 1
+        return {"SecretString": json.dumps(self._secret)}
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    aws_clients.clear_cache()
+    yield
+    aws_clients.clear_cache()
+
+
+def test_client_is_created_once_per_service(monkeypatch):
+    created = []
+
+    def fake_client(service, config=None):
+        created.append((service, config))
+        return object()
+
+    monkeypatch.setattr("boto3.client", fake_client)
+
+    first = aws_clients.client("s3")
+    assert aws_clients.client("s3") is first
+    assert aws_clients.client("s3", max_pool_connections=64) is not first
+    assert [service for service, _ in created] == ["s3", "s3"]
+
+
+def test_client_config_is_tuned():
+    config = aws_clients.client_config("s3")
+    assert config.max_pool_connections == aws_clients.MAX_POOL_CONNECTIONS
+    assert config.connect_timeout == aws_clients.CONNECT_TIMEOUT_SEC
+    assert config.read_timeout == aws_clients.READ_TIMEOUT_SEC
+    assert config.tcp_keepalive is True
+    assert config.retries["mode"] == "adaptive"
+
+    bedrock = aws_clients.client_config("bedrock-runtime", max_pool_connections=64)
+    assert bedrock.max_pool_connections == 64
+    assert bedrock.read_timeout > aws_clients.READ_TIMEOUT_SEC
+
+
+def test_get_secret_is_cached_until_ttl(monkeypatch):
+    secrets = DummySecretsClient({"ncbi_email": "you@example.com"})
+    monkeypatch.setattr(aws_clients, "client", lambda service: secrets)
+    now = [1000.0]
+    monkeypatch.setattr(aws_clients.time, "monotonic", lambda: now[0])
+
+    assert aws_clients.get_secret("arn", ttl=60)["ncbi_email"] == "you@example.com"
+    aws_clients.get_secret("arn", ttl=60)
+    assert secrets.calls == 1
+
+    now[0] += 61
+    aws_clients.get_secret("arn", ttl=60)
+    assert secrets.calls == 2
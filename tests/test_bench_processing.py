@@ -0,0 +1,30 @@
+from api import processing
+from benchmarks import bench_processing
+
+# Small runs on shared CI machines are noisy; this catches order-of-magnitude
+# regressions. Use `python -m benchmarks.bench_processing --check` for finer ones.
+TOLERANCE = 4.0
+SLACK_US = 25.0
+
+
+def test_synthetic_medline_round_trips_through_the_pipeline():
+    records = bench_processing._parse_medline(bench_processing.synthetic_medline(3))
+    assert [rec["PMID"] for rec in records] == ["40000000", "40000001", "40000002"]
+
+    text = bench_processing.medline.format_record(records[0])
+    doc = processing.build_record_doc(processing.parse_record(text))
+    assert doc["id"] == "40000000"
+    assert doc["metadata"]["year"] is not None
+    assert doc["metadata"]["mesh"]
+
+
+def test_hot_paths_stay_within_baseline():
+    result = {"sizes": {"100": bench_processing.run_size(100, repeats=2)}}
+
+    assert set(result["sizes"]["100"]) == set(bench_processing.load_baseline()["100"])
+    assert (
+        bench_processing.regressions(
+            result, bench_processing.load_baseline(), TOLERANCE, SLACK_US
+        )
+        == []
+    )
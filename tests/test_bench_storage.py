@@ -0,0 +1,10 @@
+from benchmarks import bench_storage
+
+
+def test_run_times_every_backend_and_cleans_up():
+    result = bench_storage.run(objects=20, put_latency_ms=0, workers=4)
+
+    assert result["objects"] == 20
+    assert set(result["backends"]) == {"memory", "local", "s3_serial", "s3_concurrent"}
+    for timing in result["backends"].values():
+        assert timing["objects_per_sec"] > 0
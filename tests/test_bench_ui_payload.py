@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from benchmarks import bench_ui_payload
+
+
+class DummyProto:
+    def __init__(self, size):
+        self._size = size
+
+    def ByteSize(self):  # noqa: N802
+        return self._size
+
+
+def test_element_bytes_sums_the_whole_tree():
+    tree = SimpleNamespace(
+        children={
+            0: SimpleNamespace(proto=DummyProto(100), children={}),
+            1: SimpleNamespace(
+                proto=DummyProto(10),
+                children={0: SimpleNamespace(proto=DummyProto(5), children={})},
+            ),
+        }
+    )
+    assert bench_ui_payload.element_bytes(tree) == 115
+
+
+def test_static_assets_lists_bundled_files(tmp_path):
+    (tmp_path / "app.css").write_text("body {}")
+    assert bench_ui_payload.static_assets(str(tmp_path)) == {"app.css": 7}
+    assert bench_ui_payload.static_assets(str(tmp_path / "missing")) == {}
+    assert "mamoru-logo.png" in bench_ui_payload.static_assets()
@@ -0,0 +1,33 @@
+import pytest
+
+from benchmarks import bench_import_time
+
+# Generous headroom: CI machines are noisier than the one that wrote the baseline,
+# but a heavy dependency creeping back into import time is an order of magnitude.
+TOLERANCE = 3.0
+SLACK_MS = 50.0
+
+
+@pytest.mark.parametrize("module", bench_import_time.HANDLERS)
+def test_handler_import_stays_lazy_and_fast(module):
+    baseline = bench_import_time.load_baseline()
+    result = bench_import_time.measure_import(module)
+
+    assert result["heavy_modules"] == []
+    assert result["import_ms"] <= baseline[module] * TOLERANCE + SLACK_MS
+
+
+def test_clients_are_created_once_and_reused(monkeypatch):
+    from api import lambda_query_handler as query_handler
+
+    created = []
+    monkeypatch.setattr(query_handler, "client", None)
+    monkeypatch.setattr(
+        query_handler.aws_clients,
+        "client",
+        lambda service: created.append(service) or object(),
+    )
+
+    first = query_handler._agent_client()
+    assert query_handler._agent_client() is first
+    assert created == ["bedrock-agent-runtime"]
@@ -0,0 +1,60 @@
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from api import job_store
+
+
+class DummyS3Client:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):  # noqa: N803,D401
+        """Store the object body in memory."""
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):  # noqa: N803,D401
+        """Return a stored body or raise NoSuchKey."""
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+@pytest.mark.parametrize("backend", ["memory", "file", "s3"])
+def test_job_lifecycle(backend, tmp_path):
+    s3 = DummyS3Client()
+    store = {
+        "memory": lambda: job_store.MemoryJobStore(),
+        "file": lambda: job_store.FileJobStore(str(tmp_path / "jobs")),
+        "s3": lambda: job_store.S3JobStore("bucket", "jobs/", client=s3),
+    }[backend]()
+
+    assert store.get("missing") is None
+    created = store.create("job-1", {"question": "What is dementia?"})
+    assert created["status"] == job_store.PENDING
+
+    store.update("job-1", status=job_store.SUCCEEDED, result={"answer": "A"})
+    record = store.get("job-1")
+    assert record["status"] == job_store.SUCCEEDED
+    assert record["result"] == {"answer": "A"}
+    assert record["request"] == {"question": "What is dementia?"}
+    if backend == "s3":
+        assert json.loads(s3.objects[("bucket", "jobs/job-1.json")])["job_id"] == (
+            "job-1"
+        )
+
+
+def test_update_unknown_job_raises():
+    with pytest.raises(KeyError):
+        job_store.MemoryJobStore().update("nope", status=job_store.RUNNING)
+
+
+def test_from_url_picks_backend(tmp_path):
+    assert isinstance(job_store.from_url("memory://"), job_store.MemoryJobStore)
+    assert isinstance(
+        job_store.from_url(f"file://{tmp_path}/jobs"), job_store.FileJobStore
+    )
+    with pytest.raises(ValueError):
+        job_store.from_url("redis://localhost")
@@ -3,9 +3,17 @@ from types import SimpleNamespace
 
 import pytest
 
+from api import aws_clients
 from api import lambda_ingest_handler as ingest_handler
 
 
+@pytest.fixture(autouse=True)
+def _fresh_aws_clients():
+    aws_clients.clear_cache()
+    yield
+    aws_clients.clear_cache()
+
+
 class DummySecretsClient:
     def __init__(self, secret):
         self._secret = secret
@@ -86,24 +94,6 @@ class DummyEntrezMissingHistory(DummyEntrezModule):
         return {"Count": "1"}
 
 
-def test_format_record_includes_required_fields():
-    rec = {
-        "PMID": "123",
-        "TI": "Title",
-        "AU": ["A", "B"],
-        "JT": "Journal",
-        "DP": "2025",
-        "AB": "Abstract",
-    }
-    text = ingest_handler._format_record(rec)
-    assert "PMID: 123" in text
-    assert "Title: Title" in text
-    assert "Authors: A, B" in text
-    assert "Journal: Journal" in text
-    assert "Date: 2025" in text
-    assert "Abstract:" in text
-
-
 def test_handler_writes_records_to_s3(monkeypatch):
     secret = {"ncbi_email": "you@example.com", "ncbi_api_key": ""}
     secrets_client = DummySecretsClient(secret)
@@ -120,7 +110,7 @@ def test_handler_writes_records_to_s3(monkeypatch):
     monkeypatch.setenv("RAW_PREFIX", "raw/")
 
     monkeypatch.setattr(
-        ingest_handler.boto3,
+        ingest_handler.aws_clients,
         "client",
         lambda service: secrets_client if service == "secretsmanager" else s3_client,
     )
@@ -134,13 +124,22 @@ def test_handler_writes_records_to_s3(monkeypatch):
     assert result["statusCode"] == 200
     body = json.loads(result["body"])
     assert body["written"] == 2
-    assert len(s3_client.put_calls) == 2
+    # Records are written concurrently, so the PUT order is not fixed.
+    keys = sorted(call["Key"] for call in s3_client.put_calls)
+    assert keys == [
+        "raw/1.txt",
+        "raw/1.txt.metadata.json",
+        "raw/2.txt",
+        "raw/2.txt.metadata.json",
+    ]
 
 
 def test_get_secret_value_handles_binary(monkeypatch):
     secret = {"ncbi_email": "you@example.com", "ncbi_api_key": ""}
     monkeypatch.setattr(
-        ingest_handler.boto3, "client", lambda service: DummySecretsBinaryClient(secret)
+        ingest_handler.aws_clients,
+        "client",
+        lambda service: DummySecretsBinaryClient(secret),
     )
     loaded = ingest_handler._get_secret_value("arn:aws:secretsmanager:::secret/test")
     assert loaded["ncbi_email"] == "you@example.com"
@@ -170,7 +169,7 @@ def test_handler_requires_email_in_secret(monkeypatch):
     monkeypatch.setenv("NCBI_SECRET_ARN", "arn:aws:secretsmanager:::secret/test")
     monkeypatch.setenv("S3_BUCKET", "bucket")
     monkeypatch.setattr(
-        ingest_handler.boto3,
+        ingest_handler.aws_clients,
         "client",
         lambda service: (
             secrets_client if service == "secretsmanager" else DummyS3Client()
@@ -188,7 +187,7 @@ def test_handler_requires_webenv_and_query_key(monkeypatch):
     monkeypatch.setenv("NCBI_SECRET_ARN", "arn:aws:secretsmanager:::secret/test")
     monkeypatch.setenv("S3_BUCKET", "bucket")
     monkeypatch.setattr(
-        ingest_handler.boto3,
+        ingest_handler.aws_clients,
         "client",
         lambda service: (
             secrets_client if service == "secretsmanager" else DummyS3Client()
@@ -204,3 +203,76 @@ def test_handler_requires_webenv_and_query_key(monkeypatch):
         ingest_handler.handler(
             {}, SimpleNamespace(get_remaining_time_in_millis=lambda: 1)
         )
+
+
+def test_handler_reports_batch_telemetry(monkeypatch, capsys):
+    secret = {"ncbi_email": "you@example.com", "ncbi_api_key": "key"}
+    secrets_client = DummySecretsClient(secret)
+    s3_client = DummyS3Client()
+    entrez = DummyEntrezModule(records=[{"PMID": "1", "TI": "Title 1"}, {"TI": "x"}])
+
+    monkeypatch.setenv("NCBI_SECRET_ARN", "arn:aws:secretsmanager:::secret/test")
+    monkeypatch.setenv("S3_BUCKET", "bucket")
+    monkeypatch.setenv("BATCH_SIZE", "1")
+    monkeypatch.setattr(
+        ingest_handler.aws_clients,
+        "client",
+        lambda service: secrets_client if service == "secretsmanager" else s3_client,
+    )
+    monkeypatch.setattr(ingest_handler, "Entrez", entrez)
+    monkeypatch.setattr(ingest_handler, "Medline", DummyMedline)
+    monkeypatch.setattr(ingest_handler.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(ingest_handler.telemetry, "METRICS_NAMESPACE", "Test/Ingest")
+
+    result = ingest_handler.handler(
+        {},
+        SimpleNamespace(
+            function_name="ingest-fn", get_remaining_time_in_millis=lambda: 10_000_000
+        ),
+    )
+
+    body = json.loads(result["body"])
+    summary = body["telemetry"]
+    assert body["stopped_early"] is False
+    # Two batches of one; the dummy handle returns both records each time.
+    assert summary["batches"] == 2
+    assert summary["records_parsed"] == 4
+    assert summary["s3_put_count"] == 4
+    assert set(summary["s3_put_ms"]) == {"p50", "p90", "p99", "max"}
+    assert summary["bottleneck"] in {"esearch", "efetch", "parse", "s3_put", "sleep"}
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    events = [line["event"] for line in lines]
+    assert events == ["pubmed_ingest_batch", "pubmed_ingest_batch", "pubmed_ingest_run"]
+    directive = lines[0]["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == "Test/Ingest"
+    assert directive["Dimensions"] == [["Function"]]
+    assert lines[0]["Function"] == "ingest-fn"
+    assert lines[0]["RecordsParsed"] == 2
+    assert {metric["Name"] for metric in directive["Metrics"]} >= {
+        "EFetchLatency",
+        "EFetchBytes",
+        "S3PutLatencyP99",
+    }
+
+
+def test_handler_writes_to_local_storage_url(monkeypatch, tmp_path):
+    secret = {"ncbi_email": "you@example.com", "ncbi_api_key": ""}
+    monkeypatch.setenv("NCBI_SECRET_ARN", "arn:aws:secretsmanager:::secret/test")
+    monkeypatch.delenv("S3_BUCKET", raising=False)
+    monkeypatch.setenv("RAW_STORAGE_URL", str(tmp_path / "raw"))
+    monkeypatch.setattr(
+        ingest_handler.aws_clients, "client", lambda service: DummySecretsClient(secret)
+    )
+    monkeypatch.setattr(
+        ingest_handler, "Entrez", DummyEntrezModule(records=[{"PMID": "7", "TI": "T"}])
+    )
+    monkeypatch.setattr(ingest_handler, "Medline", DummyMedline)
+
+    result = ingest_handler.handler(
+        {}, SimpleNamespace(get_remaining_time_in_millis=lambda: 10_000_000)
+    )
+
+    assert json.loads(result["body"])["written"] == 1
+    assert (tmp_path / "raw" / "7.txt").read_text() == "PMID: 7\nTitle: T"
+    assert (tmp_path / "raw" / "7.txt.metadata.json").exists()
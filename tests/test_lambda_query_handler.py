@@ -4,6 +4,8 @@ import os
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
+import pytest
+
 # Set AWS region before importing to avoid NoRegionError
 os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
 os.environ.setdefault("AWS_REGION", "us-east-1")
@@ -108,6 +110,7 @@ def test_handler_returns_400_on_invalid_json(monkeypatch):
     event = {"body": "{", "isBase64Encoded": False}
     result = query_handler.handler(event, SimpleNamespace())
     assert result["statusCode"] == 400
+    assert json.loads(result["body"])["error"] == "Request body is not valid JSON"
 
 
 def test_handler_accepts_base64_body(monkeypatch):
@@ -125,3 +128,669 @@ def test_handler_accepts_base64_body(monkeypatch):
 
     result = query_handler.handler(event, SimpleNamespace())
     assert result["statusCode"] == 200
+
+
+class DummyRuntimeClient:
+    def __init__(self, text="Hybrid answer."):
+        self._text = text
+        self.calls = []
+
+    def converse(self, **kwargs):  # noqa: D401
+        """Return a canned Converse response."""
+        self.calls.append(kwargs)
+        return {"output": {"message": {"content": [{"text": self._text}]}}}
+
+
+def test_fuse_rankings_rewards_agreement_and_dedupes_by_pmid():
+    vector = [
+        {"text": "A", "metadata": {"pmid": "1"}},
+        {"text": "B", "metadata": {"pmid": "2"}},
+        {"text": "A second chunk", "metadata": {"pmid": "1"}},
+    ]
+    lexical = [
+        {"text": "PMID: 3\nTitle: C", "metadata": {}},
+        {"text": "B lexical", "metadata": {"pmid": "2"}},
+    ]
+    fused = query_handler._fuse_rankings([vector, lexical], k=60)
+    keys = [query_handler._source_key(source) for source in fused]
+    assert keys == ["pmid:2", "pmid:1", "pmid:3"]
+    # The best-ranked chunk for a PMID wins.
+    assert fused[1]["text"] == "A"
+
+
+def test_hybrid_mode_fuses_legs_and_generates(monkeypatch):
+    runtime = DummyRuntimeClient()
+    monkeypatch.setattr(query_handler, "runtime_client", runtime)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(query_handler, "LEXICAL_SEARCH_ENDPOINT", "https://aoss")
+    monkeypatch.setattr(
+        query_handler,
+        "_vector_retrieve",
+        lambda question, n, filters: [
+            {"text": "Vector doc.", "metadata": {"pmid": "1"}}
+        ],
+    )
+    monkeypatch.setattr(
+        query_handler,
+        "_lexical_retrieve",
+        lambda question, n, filters: [
+            {"text": "Lexical doc.", "metadata": {"pmid": "2"}}
+        ],
+    )
+
+    event = {"body": json.dumps({"question": "What is sundowning?"})}
+    result = query_handler.handler(event, SimpleNamespace())
+
+    assert result["statusCode"] == 200
+    body = json.loads(result["body"])
+    assert body["answer"] == "Hybrid answer."
+    assert {s["metadata"]["pmid"] for s in body["sources"]} == {"1", "2"}
+    prompt = runtime.calls[0]["messages"][0]["content"][0]["text"]
+    assert "Vector doc." in prompt and "Lexical doc." in prompt
+    assert "What is sundowning?" in prompt
+
+
+def test_hybrid_mode_degrades_to_single_leg_on_timeout(monkeypatch):
+    import threading
+
+    release = threading.Event()
+
+    def slow_lexical(question, n, filters):
+        release.wait(5)
+        return [{"text": "Too late.", "metadata": {"pmid": "9"}}]
+
+    monkeypatch.setattr(query_handler, "runtime_client", DummyRuntimeClient())
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(query_handler, "LEXICAL_SEARCH_ENDPOINT", "https://aoss")
+    monkeypatch.setattr(query_handler, "LEXICAL_TIMEOUT_SEC", 0.05)
+    monkeypatch.setattr(
+        query_handler,
+        "_vector_retrieve",
+        lambda question, n, filters: [
+            {"text": "Vector doc.", "metadata": {"pmid": "1"}}
+        ],
+    )
+    monkeypatch.setattr(query_handler, "_lexical_retrieve", slow_lexical)
+
+    event = {"body": json.dumps({"question": "What is sundowning?"})}
+    try:
+        result = query_handler.handler(event, SimpleNamespace())
+    finally:
+        release.set()
+
+    body = json.loads(result["body"])
+    assert result["statusCode"] == 200
+    assert [s["metadata"]["pmid"] for s in body["sources"]] == ["1"]
+
+
+KB_ROUTES = json.dumps(
+    {
+        "caregiving": {"kb_id": "kb-care", "keywords": ["caregiv", "burden"]},
+        "pharmacology": {
+            "kb_id": "kb-pharm",
+            "keywords": ["drug", "medication"],
+            "timeout_sec": 0.05,
+        },
+    }
+)
+
+
+def test_select_kbs_routes_by_keyword_and_falls_back_to_all(monkeypatch):
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-main")
+    monkeypatch.setattr(query_handler, "KB_ROUTES", KB_ROUTES)
+
+    routed = query_handler._select_kbs("How can caregivers reduce stress?", {})
+    assert sorted(routed) == ["caregiving", "default"]
+    routed = query_handler._select_kbs("Sleep and dementia", {"mesh": ["Drug Therapy"]})
+    assert sorted(routed) == ["default", "pharmacology"]
+    # No keyword matches: search every KB rather than guess.
+    routed = query_handler._select_kbs("What is sundowning?", {})
+    assert sorted(routed) == ["caregiving", "default", "pharmacology"]
+
+    monkeypatch.setattr(query_handler, "KB_ROUTES", "not json")
+    assert list(query_handler._kb_routes()) == ["default"]
+
+    monkeypatch.setattr(query_handler, "KB_ID", "")
+    with pytest.raises(RuntimeError, match="BEDROCK_KB_ID"):
+        query_handler._hybrid_sources("Sleep", {}, query_handler._Deadline(None))
+
+
+def test_federated_retrieval_merges_by_score_and_drops_slow_kb(monkeypatch):
+    import threading
+
+    release = threading.Event()
+    results = {
+        "kb-main": [
+            {"content": {"text": "Main A."}, "metadata": {"pmid": "1"}, "score": 0.4},
+            {"content": {"text": "Main B."}, "metadata": {"pmid": "2"}, "score": 0.7},
+        ],
+        "kb-care": [
+            {"content": {"text": "Care A."}, "metadata": {"pmid": "1"}, "score": 0.9},
+            {"content": {"text": "Care C."}, "metadata": {"pmid": "3"}, "score": 0.5},
+        ],
+        "kb-pharm": [
+            {"content": {"text": "Too late."}, "metadata": {"pmid": "4"}, "score": 1.0}
+        ],
+    }
+
+    class FederatedClient:
+        def __init__(self):
+            self.kb_ids = []
+
+        def retrieve(self, **kwargs):  # noqa: D401
+            """Return canned results per KB; the pharmacology KB is slow."""
+            self.kb_ids.append(kwargs["knowledgeBaseId"])
+            if kwargs["knowledgeBaseId"] == "kb-pharm":
+                release.wait(5)
+            return {"retrievalResults": results[kwargs["knowledgeBaseId"]]}
+
+    agent = FederatedClient()
+    runtime = DummyRuntimeClient("Federated answer.")
+    monkeypatch.setattr(query_handler, "client", agent)
+    monkeypatch.setattr(query_handler, "runtime_client", runtime)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-main")
+    monkeypatch.setattr(query_handler, "KB_ROUTES", KB_ROUTES)
+
+    event = {"body": json.dumps({"question": "What is sundowning?"})}
+    try:
+        result = query_handler.handler(event, SimpleNamespace())
+    finally:
+        release.set()
+
+    assert result["statusCode"] == 200
+    body = json.loads(result["body"])
+    # kb mode cannot RetrieveAndGenerate across KBs; we generate ourselves.
+    assert body["answer"] == "Federated answer."
+    assert sorted(agent.kb_ids) == ["kb-care", "kb-main", "kb-pharm"]
+    assert [s["text"] for s in body["sources"]] == ["Care A.", "Main B.", "Care C."]
+
+
+def test_rerank_prefers_relevant_drops_duplicates_and_respects_budget():
+    candidates = [
+        {"text": "Cost analysis of hospital billing systems.", "metadata": {}},
+        {"text": "Melatonin improved sleep in dementia patients.", "metadata": {}},
+        {"text": "Melatonin improved sleep in dementia patients!", "metadata": {}},
+        {"text": "Light therapy and sleep in dementia. " * 40, "metadata": {}},
+    ]
+    selected = query_handler._rerank(
+        "Does melatonin help sleep in dementia?", candidates, token_budget=50
+    )
+    texts = [source["text"] for source in selected]
+    assert texts[0] == "Melatonin improved sleep in dementia patients."
+    # The near-duplicate is dropped and the long chunk does not fit the budget.
+    assert len(texts) == 2
+    assert "Cost analysis of hospital billing systems." in texts
+
+
+def test_hybrid_mode_over_retrieves_when_rerank_enabled(monkeypatch):
+    requested = []
+
+    def vector(question, n, filters):
+        requested.append(n)
+        return [
+            {"text": f"Chunk {i} about dementia sleep.", "metadata": {"pmid": str(i)}}
+            for i in range(n)
+        ]
+
+    runtime = DummyRuntimeClient()
+    monkeypatch.setattr(query_handler, "runtime_client", runtime)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(query_handler, "LEXICAL_SEARCH_ENDPOINT", "")
+    monkeypatch.setattr(query_handler, "RERANK_ENABLED", True)
+    monkeypatch.setattr(query_handler, "RERANK_CANDIDATES", 20)
+    monkeypatch.setattr(query_handler, "CONTEXT_TOKEN_BUDGET", 40)
+    monkeypatch.setattr(query_handler, "_vector_retrieve", vector)
+
+    event = {"body": json.dumps({"question": "dementia sleep"})}
+    result = query_handler.handler(event, SimpleNamespace())
+
+    assert result["statusCode"] == 200
+    assert requested == [20]
+    body = json.loads(result["body"])
+    assert 0 < len(body["sources"]) < 20
+
+
+def test_filters_map_to_bedrock_retrieval_filter():
+    event = {
+        "body": json.dumps(
+            {
+                "question": "recent RCTs on agitation",
+                "filters": {
+                    "year_from": "2020",
+                    "publication_type": "Randomized Controlled Trial",
+                    "mesh": ["Psychomotor Agitation"],
+                },
+            }
+        )
+    }
+    filters = query_handler._extract_filters(query_handler._parse_body(event))
+    assert query_handler._build_retrieval_filter(filters) == {
+        "andAll": [
+            {"greaterThanOrEquals": {"key": "year", "value": 2020}},
+            {
+                "listContains": {
+                    "key": "publication_types",
+                    "value": "Randomized Controlled Trial",
+                }
+            },
+            {"listContains": {"key": "mesh", "value": "Psychomotor Agitation"}},
+        ]
+    }
+    assert query_handler._build_retrieval_filter({"journal": "J"}) == {
+        "equals": {"key": "journal", "value": "J"}
+    }
+    assert query_handler._build_retrieval_filter({}) is None
+
+
+def test_handler_pushes_filters_into_vector_search(monkeypatch):
+    response = {"output": {"text": "Test answer."}, "citations": []}
+    client = DummyClient(response, retrieval_response={"retrievalResults": []})
+    monkeypatch.setattr(query_handler, "client", client)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+
+    event = {
+        "body": json.dumps(
+            {"question": "What is dementia?", "filters": {"journal": "Lancet"}}
+        )
+    }
+    result = query_handler.handler(event, SimpleNamespace())
+
+    assert result["statusCode"] == 200
+    config = client.last_kwargs["retrieveAndGenerateConfiguration"]
+    vector_config = config["knowledgeBaseConfiguration"]["retrievalConfiguration"][
+        "vectorSearchConfiguration"
+    ]
+    assert vector_config["filter"] == {"equals": {"key": "journal", "value": "Lancet"}}
+    fallback = client.retrieve_kwargs["retrievalConfiguration"]
+    assert fallback["vectorSearchConfiguration"]["filter"] == vector_config["filter"]
+
+
+def test_handler_returns_400_on_unknown_filter(monkeypatch):
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    event = {
+        "body": json.dumps({"question": "What is dementia?", "filters": {"color": 1}})
+    }
+    result = query_handler.handler(event, SimpleNamespace())
+    assert result["statusCode"] == 400
+    assert "color" in json.loads(result["body"])["error"]
+
+
+def test_classify_question_routes_by_shape(monkeypatch):
+    monkeypatch.setattr(query_handler, "FAST_MODEL_ARN", "fast-arn")
+    classify = query_handler._classify_question
+    assert classify("What is sundowning?") == ("fast", "simple_question")
+    assert classify("What is sundowning?", context_tokens=5000)[0] == "strong"
+    assert classify("Why does agitation increase at night?")[0] == "strong"
+    assert classify("Compare melatonin versus light therapy for sleep.")[0] == (
+        "strong"
+    )
+    monkeypatch.setattr(query_handler, "FAST_MODEL_ARN", "")
+    assert classify("What is sundowning?") == ("strong", "routing_disabled")
+
+
+def test_fast_route_escalates_hedged_answer(monkeypatch):
+    class RoutingClient(DummyClient):
+        def retrieve_and_generate(self, **kwargs):
+            config = kwargs["retrieveAndGenerateConfiguration"]
+            model = config["knowledgeBaseConfiguration"]["modelArn"]
+            self.models = getattr(self, "models", []) + [model]
+            text = "I'm not sure." if model == "fast-arn" else "Strong answer."
+            return {
+                "output": {"text": text},
+                "citations": [
+                    {
+                        "retrievedReferences": [
+                            {"content": {"text": "Doc."}, "metadata": {"pmid": "1"}}
+                        ]
+                    }
+                ],
+            }
+
+    client = RoutingClient({})
+    monkeypatch.setattr(query_handler, "client", client)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "FAST_MODEL_ARN", "fast-arn")
+    monkeypatch.setattr(query_handler, "MODEL_ARN", "strong-arn")
+
+    event = {"body": json.dumps({"question": "What is sundowning?"})}
+    result = query_handler.handler(event, SimpleNamespace())
+
+    assert json.loads(result["body"])["answer"] == "Strong answer."
+    assert client.models == ["fast-arn", "strong-arn"]
+
+
+def test_failed_escalation_keeps_fast_answer(monkeypatch):
+    class ThrottledClient(DummyClient):
+        def retrieve_and_generate(self, **kwargs):
+            config = kwargs["retrieveAndGenerateConfiguration"]
+            if config["knowledgeBaseConfiguration"]["modelArn"] == "strong-arn":
+                raise RuntimeError("ThrottlingException")
+            return {"output": {"text": "I'm not sure."}, "citations": []}
+
+    monkeypatch.setattr(query_handler, "client", ThrottledClient({}))
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "FAST_MODEL_ARN", "fast-arn")
+    monkeypatch.setattr(query_handler, "MODEL_ARN", "strong-arn")
+
+    event = {"body": json.dumps({"question": "What is sundowning?"})}
+    result = query_handler.handler(event, SimpleNamespace())
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["answer"] == "I'm not sure."
+
+
+def test_fast_route_keeps_confident_answer(monkeypatch):
+    runtime = DummyRuntimeClient("Sundowning is late-day confusion.")
+    monkeypatch.setattr(query_handler, "runtime_client", runtime)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "RETRIEVAL_MODE", "hybrid")
+    monkeypatch.setattr(query_handler, "LEXICAL_SEARCH_ENDPOINT", "")
+    monkeypatch.setattr(query_handler, "FAST_MODEL_ARN", "fast-arn")
+    monkeypatch.setattr(
+        query_handler,
+        "_vector_retrieve",
+        lambda question, n, filters: [{"text": "Doc.", "metadata": {"pmid": "1"}}],
+    )
+
+    event = {"body": json.dumps({"question": "What is sundowning?"})}
+    query_handler.handler(event, SimpleNamespace())
+
+    assert [call["modelId"] for call in runtime.calls] == ["fast-arn"]
+
+
+def test_call_with_timeout_hedges_slow_call():
+    import threading
+
+    calls = []
+    first_release = threading.Event()
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            first_release.wait(5)
+            return "slow"
+        return "fast"
+
+    try:
+        result = query_handler._call_with_timeout(flaky, timeout=2, hedge_after=0.05)
+    finally:
+        first_release.set()
+    assert result == "fast"
+    assert len(calls) == 2
+
+
+def test_call_with_timeout_raises_stage_timeout():
+    import threading
+
+    release = threading.Event()
+    try:
+        with pytest.raises(query_handler._StageTimeout):
+            query_handler._call_with_timeout(lambda: release.wait(5), timeout=0.05)
+    finally:
+        release.set()
+
+
+def test_handler_returns_sources_only_when_generation_times_out(monkeypatch):
+    import threading
+
+    release = threading.Event()
+
+    class SlowClient(DummyClient):
+        def retrieve_and_generate(self, **kwargs):
+            release.wait(5)
+            return {"output": {"text": "Too late."}, "citations": []}
+
+    retrieval_response = {
+        "retrievalResults": [{"content": {"text": "Doc."}, "metadata": {"pmid": "7"}}]
+    }
+    monkeypatch.setattr(
+        query_handler, "client", SlowClient({}, retrieval_response=retrieval_response)
+    )
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "GENERATION_TIMEOUT_SEC", 0.05)
+    monkeypatch.setattr(query_handler, "MIN_GENERATION_SEC", 0)
+
+    event = {"body": json.dumps({"question": "What is dementia?"})}
+    try:
+        result = query_handler.handler(
+            event, SimpleNamespace(get_remaining_time_in_millis=lambda: 10_000)
+        )
+    finally:
+        release.set()
+
+    body = json.loads(result["body"])
+    assert result["statusCode"] == 200
+    assert body["partial"] is True
+    assert body["sources"][0]["metadata"]["pmid"] == "7"
+
+
+def test_handler_skips_generation_when_deadline_is_close(monkeypatch):
+    response = {"output": {"text": "Should not be called."}, "citations": []}
+    retrieval_response = {
+        "retrievalResults": [{"content": {"text": "Doc."}, "metadata": {"pmid": "8"}}]
+    }
+    client = DummyClient(response, retrieval_response)
+    monkeypatch.setattr(query_handler, "client", client)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "RESPONSE_RESERVE_MS", 0)
+
+    event = {"body": json.dumps({"question": "What is dementia?"})}
+    result = query_handler.handler(
+        event, SimpleNamespace(get_remaining_time_in_millis=lambda: 2_000)
+    )
+
+    body = json.loads(result["body"])
+    assert body["partial"] is True
+    assert not hasattr(client, "last_kwargs")
+    assert body["sources"][0]["metadata"]["pmid"] == "8"
+
+
+def _wait_for_job(job_id, timeout=2.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = query_handler.handler(
+            {
+                "requestContext": {"http": {"method": "GET"}},
+                "pathParameters": {"id": job_id},
+            },
+            SimpleNamespace(),
+        )
+        body = json.loads(result["body"])
+        if body["status"] in ("succeeded", "failed"):
+            return body
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_async_query_returns_job_and_result(monkeypatch):
+    from api import job_store
+
+    response = {
+        "output": {"text": "Async answer."},
+        "citations": [
+            {
+                "retrievedReferences": [
+                    {"content": {"text": "Doc."}, "metadata": {"pmid": "5"}}
+                ]
+            }
+        ],
+    }
+    monkeypatch.setattr(query_handler, "client", DummyClient(response))
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "_job_store", job_store.MemoryJobStore())
+
+    event = {"body": json.dumps({"question": "What is dementia?", "async": True})}
+    result = query_handler.handler(event, SimpleNamespace())
+
+    assert result["statusCode"] == 202
+    job_id = json.loads(result["body"])["job_id"]
+    assert result["headers"]["Location"] == f"/query/{job_id}"
+    body = _wait_for_job(job_id)
+    assert body["status"] == "succeeded"
+    assert body["result"]["answer"] == "Async answer."
+
+
+def test_async_auto_keeps_quick_questions_synchronous(monkeypatch):
+    response = {"output": {"text": "Sync answer."}, "citations": []}
+    client = DummyClient(response, retrieval_response={"retrievalResults": []})
+    monkeypatch.setattr(query_handler, "client", client)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+
+    event = {"body": json.dumps({"question": "What is sundowning?", "async": "auto"})}
+    result = query_handler.handler(event, SimpleNamespace())
+
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["answer"] == "Sync answer."
+
+
+def test_async_dispatch_self_invokes_in_lambda(monkeypatch):
+    from api import job_store
+
+    invocations = []
+    lambda_client = SimpleNamespace(invoke=lambda **kwargs: invocations.append(kwargs))
+    monkeypatch.setattr(query_handler, "lambda_client", lambda_client)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    store = job_store.MemoryJobStore()
+    store.shared = True  # stands in for S3JobStore
+    monkeypatch.setattr(query_handler, "_job_store", store)
+
+    event = {"body": json.dumps({"question": "What is dementia?", "async": True})}
+    context = SimpleNamespace(
+        function_name="rag-query", get_remaining_time_in_millis=lambda: 30_000
+    )
+    result = query_handler.handler(event, context)
+
+    job_id = json.loads(result["body"])["job_id"]
+    assert invocations[0]["FunctionName"] == "rag-query"
+    assert invocations[0]["InvocationType"] == "Event"
+    assert json.loads(invocations[0]["Payload"]) == {"async_job": {"job_id": job_id}}
+
+
+def test_async_dispatch_in_lambda_requires_shared_store(monkeypatch):
+    from api import job_store
+
+    invocations = []
+    lambda_client = SimpleNamespace(invoke=lambda **kwargs: invocations.append(kwargs))
+    monkeypatch.setattr(query_handler, "lambda_client", lambda_client)
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "_job_store", job_store.MemoryJobStore())
+
+    event = {"body": json.dumps({"question": "What is dementia?", "async": True})}
+    context = SimpleNamespace(
+        function_name="rag-query", get_remaining_time_in_millis=lambda: 30_000
+    )
+    result = query_handler.handler(event, context)
+
+    assert result["statusCode"] == 500
+    assert "JOB_STORE_URL" in json.loads(result["body"])["error"]
+    assert invocations == []
+
+
+def test_job_status_returns_404_for_unknown_job(monkeypatch):
+    from api import job_store
+
+    monkeypatch.setattr(query_handler, "_job_store", job_store.MemoryJobStore())
+    result = query_handler.handler(
+        {"requestContext": {"http": {"method": "GET"}}, "pathParameters": {"id": "x"}},
+        SimpleNamespace(),
+    )
+    assert result["statusCode"] == 404
+
+
+def test_warmup_builds_clients_without_calling_bedrock(monkeypatch):
+    created = []
+    monkeypatch.setattr(query_handler, "client", None)
+    monkeypatch.setattr(query_handler, "runtime_client", None)
+    monkeypatch.setattr(
+        query_handler.aws_clients,
+        "client",
+        lambda service: created.append(service) or MagicMock(),
+    )
+    monkeypatch.setattr(query_handler, "WARMUP_QUESTIONS", "")
+
+    result = query_handler.handler({"warmup": True}, SimpleNamespace())
+
+    assert result["warmup"] is True
+    assert result["primed"] == 0
+    assert created == ["bedrock-agent-runtime", "bedrock-runtime"]
+    query_handler.client.retrieve_and_generate.assert_not_called()
+
+
+def test_warmup_primes_answers_once_and_serves_them(monkeypatch):
+    response = {
+        "output": {"text": "Primed answer."},
+        "citations": [
+            {"retrievedReferences": [{"content": {"text": "Doc."}, "metadata": {}}]}
+        ],
+    }
+    calls = []
+
+    class CountingClient(DummyClient):
+        def retrieve_and_generate(self, **kwargs):  # noqa: D401
+            """Count generation calls."""
+            calls.append(kwargs)
+            return super().retrieve_and_generate(**kwargs)
+
+    monkeypatch.setattr(query_handler, "client", CountingClient(response))
+    monkeypatch.setattr(query_handler, "runtime_client", DummyRuntimeClient())
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "_answer_cache", {})
+    monkeypatch.setattr(
+        query_handler, "WARMUP_QUESTIONS", json.dumps(["What is sundowning?"])
+    )
+    scheduled = {"source": "aws.events", "detail-type": "Scheduled Event"}
+
+    first = query_handler.handler(scheduled, SimpleNamespace())
+    second = query_handler.handler(scheduled, SimpleNamespace())
+    assert (first["primed"], second["primed"], second["already_cached"]) == (1, 0, 1)
+    assert len(calls) == 1
+
+    event = {"body": json.dumps({"question": "  what is SUNDOWNING? "})}
+    result = query_handler.handler(event, SimpleNamespace())
+    assert json.loads(result["body"])["answer"] == "Primed answer."
+    assert len(calls) == 1
+
+
+def test_handler_rate_limits_per_client(monkeypatch):
+    from api import rate_limit
+
+    response = {"output": {"text": "Answer."}, "citations": []}
+    monkeypatch.setattr(query_handler, "client", DummyClient(response))
+    monkeypatch.setattr(query_handler, "KB_ID", "kb-123")
+    monkeypatch.setattr(query_handler, "CLIENT_IP_SECRET", "s3cret")
+    monkeypatch.setattr(
+        query_handler,
+        "_rate_limiter",
+        rate_limit.RateLimiter(rate_limit.MemoryBucketStore(), rate=0.1, burst=1),
+    )
+
+    def ask(client_ip, secret="s3cret", source_ip="203.0.113.9"):
+        event = {
+            "requestContext": {"http": {"sourceIp": source_ip}},
+            "headers": {"X-Client-IP-Secret": secret},
+            "body": json.dumps(
+                {"question": "What is dementia?", "client_ip": client_ip}
+            ),
+        }
+        return query_handler.handler(event, SimpleNamespace())
+
+    assert ask("10.0.0.1")["statusCode"] == 200
+    limited = ask("10.0.0.1")
+    assert limited["statusCode"] == 429
+    assert limited["headers"]["Retry-After"] == "10"
+    assert json.loads(limited["body"])["retry_after"] == 10
+    assert ask("10.0.0.2")["statusCode"] == 200
+
+    # Without the UI's secret a body client_ip is ignored: rotating it does not
+    # escape the caller's own source-IP bucket.
+    assert (
+        ask("10.0.0.3", secret="guess", source_ip="198.51.100.7")["statusCode"] == 200
+    )
+    assert (
+        ask("10.0.0.4", secret="guess", source_ip="198.51.100.7")["statusCode"] == 429
+    )
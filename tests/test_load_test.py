@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks import load_test
+
+
+@pytest.mark.parametrize("mode", ["handler", "server"])
+def test_load_test_reports_latency_and_rates(mode):
+    result = load_test.run(
+        mode=mode,
+        concurrency=4,
+        total_requests=24,
+        retrieve_latency="fixed:1",
+        generate_latency="uniform:1:3",
+        error_rate=0.0,
+        empty_citation_rate=1.0,
+    )
+
+    assert result["requests"] == 24
+    assert result["status_counts"] == {"200": 24}
+    assert result["error_rate"] == 0.0
+    # Every answer came back without citations, so the fallback retrieve filled them.
+    assert result["empty_sources_rate"] == 0.0
+    assert result["fake"]["bedrock_calls"] >= 24
+    assert result["latency"]["p50_ms"] <= result["latency"]["p99_ms"]
+    assert result["throughput_rps"] > 0
+
+
+def test_load_test_counts_injected_errors():
+    result = load_test.run(
+        mode="handler",
+        concurrency=2,
+        total_requests=6,
+        retrieve_latency="fixed:0",
+        generate_latency="fixed:0",
+        error_rate=1.0,
+    )
+
+    assert result["status_counts"] == {"500": 6}
+    assert result["error_rate"] == 1.0
@@ -0,0 +1,53 @@
+from api import medline
+
+
+def test_format_record_includes_required_fields():
+    rec = {
+        "PMID": "123",
+        "TI": "Title",
+        "AU": ["A", "B"],
+        "JT": "Journal",
+        "DP": "2025",
+        "AB": "Abstract",
+    }
+    text = medline.format_record(rec)
+    assert "PMID: 123" in text
+    assert "Title: Title" in text
+    assert "Authors: A, B" in text
+    assert "Journal: Journal" in text
+    assert "Date: 2025" in text
+    assert "Abstract:" in text
+
+
+def test_format_record_includes_mesh_and_publication_types():
+    rec = {
+        "PMID": "123",
+        "TI": "Title",
+        "MH": ["*Dementia/therapy", "Caregivers"],
+        "PT": ["Randomized Controlled Trial"],
+        "AB": "Abstract",
+    }
+    text = medline.format_record(rec)
+    assert "MeSH Terms: *Dementia/therapy; Caregivers" in text
+    assert "Publication Types: Randomized Controlled Trial" in text
+    # MeSH and publication types sit before the abstract so parsers stop there.
+    assert text.index("Publication Types:") < text.index("Abstract:")
+
+
+def test_kb_metadata_normalizes_filterable_attributes():
+    rec = {
+        "PMID": "123",
+        "JT": "Journal",
+        "DP": "2024 Mar 5",
+        "MH": ["*Dementia/therapy", "Dementia/nursing", "Caregivers"],
+        "PT": ["Journal Article", "Randomized Controlled Trial"],
+    }
+    assert medline.kb_metadata(rec) == {
+        "metadataAttributes": {
+            "pmid": "123",
+            "journal": "Journal",
+            "year": 2024,
+            "mesh": ["Caregivers", "Dementia"],
+            "publication_types": ["Journal Article", "Randomized Controlled Trial"],
+        }
+    }
@@ -0,0 +1,80 @@
+import json
+
+from api import medline, processing
+
+
+def _raw_text():
+    return medline.format_record(
+        {
+            "PMID": "123",
+            "TI": "Music  therapy for agitation",
+            "AU": ["A", "B"],
+            "JT": "Journal",
+            "DP": "2024 Mar",
+            "MH": ["*Dementia/therapy", "Psychomotor Agitation"],
+            "PT": ["Randomized Controlled Trial"],
+            "AB": "Line one.\nLine two.",
+        }
+    )
+
+
+def test_parse_record_round_trips_ingest_format():
+    rec = processing.parse_record(_raw_text())
+    assert rec["pmid"] == "123"
+    assert rec["journal"] == "Journal"
+    assert rec["mesh"] == ["*Dementia/therapy", "Psychomotor Agitation"]
+    assert rec["publication_types"] == ["Randomized Controlled Trial"]
+    assert rec["abstract"] == "Line one.\nLine two."
+
+
+def test_normalize_date_handles_observed_formats():
+    assert processing.normalize_date("2026 Jan 7") == "2026-01-07"
+    assert processing.normalize_date("2025 Dec") == "2025-12-01"
+    assert processing.normalize_date("2025") == "2025-01-01"
+    assert processing.normalize_date("2025 Winter") == "2025 Winter"
+    assert processing.normalize_date(None) == ""
+
+
+def test_build_record_doc_carries_filterable_metadata():
+    doc = processing.build_record_doc(processing.parse_record(_raw_text()))
+    assert doc["id"] == "123"
+    assert doc["text"] == "Music therapy for agitation\nLine one. Line two."
+    assert doc["metadata"]["year"] == 2024
+    assert doc["metadata"]["mesh"] == ["Dementia", "Psychomotor Agitation"]
+    attributes = processing.kb_metadata_attributes(doc)["metadataAttributes"]
+    assert attributes["publication_types"] == ["Randomized Controlled Trial"]
+    assert "authors" not in attributes
+
+
+def test_main_writes_jsonl_and_kb_sidecars(tmp_path):
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    (raw_dir / "123.txt").write_text(_raw_text(), encoding="utf-8")
+
+    processing.main(["--raw-dir", str(raw_dir), "--output-dir", str(tmp_path)])
+
+    (jsonl_path,) = tmp_path.glob("pubmed_records_*.jsonl")
+    docs = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    assert [doc["id"] for doc in docs] == ["123"]
+    sidecar = json.loads((tmp_path / "kb_docs" / "123.txt.metadata.json").read_text())
+    assert sidecar["metadataAttributes"]["year"] == 2024
+
+
+def test_main_writes_and_reprocesses_from_snapshot(tmp_path):
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    (raw_dir / "123.txt").write_text(_raw_text(), encoding="utf-8")
+    processing.main(["--raw-dir", str(raw_dir), "--output-dir", str(tmp_path / "a")])
+
+    processing.main(
+        [
+            "--from-snapshot",
+            str(tmp_path / "a" / "snapshot"),
+            "--output-dir",
+            str(tmp_path / "b"),
+        ]
+    )
+
+    (first,) = (tmp_path / "a").glob("pubmed_records_*.jsonl")
+    (second,) = (tmp_path / "b").glob("pubmed_records_*.jsonl")
+    assert first.read_text() == second.read_text()
@@ -0,0 +1,71 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from api import aws_clients, profiling
+
+
+def _handler(event, context):
+    if event.get("fail"):
+        raise RuntimeError("boom")
+    return {"statusCode": 200, "body": sum(range(1000))}
+
+
+def _context(request_id):
+    return SimpleNamespace(aws_request_id=request_id)
+
+
+def test_profiled_is_identity_when_off():
+    assert profiling.profiled("rag-query", mode="off")(_handler) is _handler
+
+
+def test_sample_mode_profiles_every_nth_call(tmp_path):
+    wrapped = profiling.profiled(
+        "rag-query", mode="sample", every_n=2, sink=str(tmp_path)
+    )(_handler)
+
+    assert wrapped({}, _context("req-1"))["statusCode"] == 200
+    assert not (tmp_path / "rag-query").exists()
+
+    assert wrapped({}, _context("req-2"))["statusCode"] == 200
+    written = sorted(p.name for p in (tmp_path / "rag-query").iterdir())
+    assert written == ["req-2.json", "req-2.prof"]
+    summary = json.loads((tmp_path / "rag-query" / "req-2.json").read_text())
+    assert summary["request_id"] == "req-2"
+    assert summary["peak_memory_kb"] >= 0
+    assert "_handler" in summary["top_functions"]
+
+
+def test_profile_is_written_when_handler_raises(tmp_path):
+    wrapped = profiling.profiled("pubmed-ingest", mode="always", sink=str(tmp_path))(
+        _handler
+    )
+
+    with pytest.raises(RuntimeError):
+        wrapped({"fail": True}, _context("req-err"))
+
+    assert (tmp_path / "pubmed-ingest" / "req-err.prof").exists()
+
+
+def test_s3_sink_and_write_failures(monkeypatch):
+    puts = []
+
+    class DummyS3:
+        def put_object(self, Bucket, Key, Body):  # noqa: N803
+            puts.append((Bucket, Key))
+            if Key.endswith(".json"):
+                raise RuntimeError("s3 down")
+
+    monkeypatch.setattr(aws_clients, "client", lambda service: DummyS3())
+    wrapped = profiling.profiled(
+        "rag-query", mode="always", sink="s3://bucket/profiles"
+    )(_handler)
+
+    # A failing sink is logged, not raised.
+    assert wrapped({}, _context("req-s3"))["statusCode"] == 200
+    # PUTs run concurrently, so compare without order.
+    assert sorted(puts) == [
+        ("bucket", "profiles/rag-query/req-s3.json"),
+        ("bucket", "profiles/rag-query/req-s3.prof"),
+    ]
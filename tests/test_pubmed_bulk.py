@@ -0,0 +1,262 @@
+import gzip
+import json
+
+from api import medline, processing, pubmed_bulk, storage
+
+
+def _article(pmid, title, mesh, abstract="Caregivers reported less burden."):
+    headings = "".join(
+        f'<MeshHeading><DescriptorName MajorTopicYN="{major}">{name}</DescriptorName>'
+        f"{qualifiers}</MeshHeading>"
+        for name, major, qualifiers in mesh
+    )
+    return f"""
+<PubmedArticle>
+  <MedlineCitation>
+    <PMID Version="1">{pmid}</PMID>
+    <Article>
+      <Journal>
+        <JournalIssue><PubDate><Year>2024</Year><Month>03</Month><Day>05</Day></PubDate></JournalIssue>
+        <Title>Journal of Dementia Care</Title>
+      </Journal>
+      <ArticleTitle>{title} <i>in</i> practice</ArticleTitle>
+      <Abstract>
+        <AbstractText Label="BACKGROUND">Background text.</AbstractText>
+        <AbstractText Label="RESULTS">{abstract}</AbstractText>
+      </Abstract>
+      <AuthorList>
+        <Author><LastName>Smith</LastName><Initials>J</Initials></Author>
+        <Author><CollectiveName>Dementia Study Group</CollectiveName></Author>
+      </AuthorList>
+      <PublicationTypeList><PublicationType>Journal Article</PublicationType></PublicationTypeList>
+    </Article>
+    <MeshHeadingList>{headings}</MeshHeadingList>
+  </MedlineCitation>
+</PubmedArticle>"""
+
+
+def _write_gz(path, body):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as handle:
+        handle.write(
+            f"<?xml version='1.0'?><PubmedArticleSet>{body}</PubmedArticleSet>"
+        )
+
+
+DEMENTIA = ("Dementia", "Y", '<QualifierName MajorTopicYN="N">therapy</QualifierName>')
+CAREGIVERS = (
+    "Caregivers",
+    "N",
+    '<QualifierName MajorTopicYN="Y">psychology</QualifierName>',
+)
+ASTHMA = ("Asthma", "Y", "")
+
+
+def test_article_to_medline_matches_medline_fields(tmp_path):
+    path = tmp_path / "one.xml.gz"
+    _write_gz(path, _article("101", "Music therapy", [DEMENTIA, CAREGIVERS]))
+
+    with pubmed_bulk._open(str(path)) as stream:
+        [(kind, rec)] = list(pubmed_bulk.iter_citations(stream))
+
+    assert kind == "article"
+    assert rec == {
+        "PMID": "101",
+        "TI": "Music therapy in practice",
+        "AB": "BACKGROUND: Background text. RESULTS: Caregivers reported less burden.",
+        "AU": ["Smith J", "Dementia Study Group"],
+        "JT": "Journal of Dementia Care",
+        "DP": "2024 Mar 5",
+        "MH": ["*Dementia/therapy", "Caregivers/*psychology"],
+        "PT": ["Journal Article"],
+    }
+
+
+def test_default_filter_requires_dementia_and_a_care_topic():
+    matches = pubmed_bulk.compile_filter(pubmed_bulk.DEFAULT_FILTER)
+    assert matches({"MH": ["*Dementia/therapy", "Caregivers"]})
+    # Title/abstract terms stand in for the care-topic MeSH headings.
+    assert matches({"MH": ["Alzheimer Disease"], "AB": "Family caregivers at home"})
+    assert not matches({"MH": ["Alzheimer Disease"], "AB": "Amyloid imaging"})
+    assert not matches({"MH": ["Asthma", "Caregivers"]})
+    assert pubmed_bulk.compile_filter([])({"MH": []})
+
+
+def test_run_writes_raw_and_processed_and_applies_updates(tmp_path):
+    _write_gz(
+        tmp_path / "baseline" / "pubmed25n0001.xml.gz",
+        _article("101", "Music therapy", [DEMENTIA, CAREGIVERS])
+        + _article("102", "Inhaler technique", [ASTHMA]),
+    )
+    _write_gz(
+        tmp_path / "baseline" / "pubmed25n0002.xml.gz",
+        _article("103", "Respite care", [DEMENTIA, CAREGIVERS]),
+    )
+    _write_gz(
+        tmp_path / "updates" / "pubmed25n1300.xml.gz",
+        _article("101", "Music therapy revised", [DEMENTIA, CAREGIVERS])
+        + "<DeleteCitation><PMID>103</PMID></DeleteCitation>",
+    )
+    raw_out = tmp_path / "raw"
+    processed_out = tmp_path / "processed"
+
+    summary = pubmed_bulk.run(
+        baseline=str(tmp_path / "baseline"),
+        updates=str(tmp_path / "updates"),
+        raw_out=str(raw_out),
+        processed_out=str(processed_out),
+        workers=2,
+    )
+
+    assert (summary["files"], summary["articles"]) == (3, 4)
+    assert (summary["matched"], summary["deleted"]) == (3, 1)
+    assert sorted(p.name for p in raw_out.iterdir()) == [
+        "101.txt",
+        "101.txt.metadata.json",
+    ]
+    raw_text = (raw_out / "101.txt").read_text()
+    assert raw_text.startswith("PMID: 101\nTitle: Music therapy revised in practice")
+    assert processing.parse_record(raw_text)["mesh"] == [
+        "*Dementia/therapy",
+        "Caregivers/*psychology",
+    ]
+    metadata = json.loads((raw_out / "101.txt.metadata.json").read_text())
+    assert metadata["metadataAttributes"]["mesh"] == ["Caregivers", "Dementia"]
+
+    kb_docs = sorted(p.name for p in (processed_out / "kb_docs").iterdir())
+    assert kb_docs == ["101.txt", "101.txt.metadata.json"]
+    update_lines = (processed_out / "records-pubmed25n1300.jsonl").read_text()
+    doc = json.loads(update_lines.splitlines()[0])
+    assert doc["id"] == "101" and doc["metadata"]["year"] == 2024
+    # The revision and the deletion leave no stale copies in baseline exports.
+    assert sorted(p.name for p in processed_out.glob("records-*.jsonl")) == [
+        "records-pubmed25n1300.jsonl"
+    ]
+    assert summary["exports_rewritten"] == 2
+
+
+def test_several_updates_rewrite_each_export_once(monkeypatch, tmp_path):
+    _write_gz(
+        tmp_path / "baseline" / "pubmed25n0001.xml.gz",
+        _article("101", "Music therapy", [DEMENTIA, CAREGIVERS])
+        + _article("102", "Respite care", [DEMENTIA, CAREGIVERS])
+        + _article("103", "Day care", [DEMENTIA, CAREGIVERS])
+        + _article("104", "Home care", [DEMENTIA, CAREGIVERS]),
+    )
+    _write_gz(
+        tmp_path / "updates" / "pubmed25n1300.xml.gz",
+        _article("101", "Music therapy v2", [DEMENTIA, CAREGIVERS]),
+    )
+    _write_gz(
+        tmp_path / "updates" / "pubmed25n1301.xml.gz",
+        _article("101", "Music therapy v3", [DEMENTIA, CAREGIVERS])
+        + "<DeleteCitation><PMID>102</PMID></DeleteCitation>",
+    )
+    _write_gz(
+        tmp_path / "updates" / "pubmed25n1302.xml.gz",
+        _article("103", "Inhaler technique", [ASTHMA]),
+    )
+    processed_out = tmp_path / "processed"
+    export_writes = []
+    real_put = storage.LocalStorage.put
+
+    def put(self, key, body):
+        if key.startswith("records-"):
+            export_writes.append(key)
+        return real_put(self, key, body)
+
+    monkeypatch.setattr(storage.LocalStorage, "put", put)
+
+    summary = pubmed_bulk.run(
+        baseline=str(tmp_path / "baseline"),
+        updates=str(tmp_path / "updates"),
+        processed_out=str(processed_out),
+        workers=1,
+    )
+
+    def ids(name):
+        lines = (processed_out / name).read_text().splitlines()
+        return [json.loads(line)["id"] for line in lines]
+
+    # Each export is rewritten once, at the end, not once per update file.
+    assert export_writes == [
+        "records-pubmed25n1300.jsonl",
+        "records-pubmed25n1301.jsonl",
+        "records-pubmed25n0001.jsonl",
+    ]
+    assert summary["exports_rewritten"] == 2
+    assert ids("records-pubmed25n0001.jsonl") == ["104"]
+    assert not (processed_out / "records-pubmed25n1300.jsonl").exists()
+    assert ids("records-pubmed25n1301.jsonl") == ["101"]
+
+
+def test_update_drops_revisions_that_no_longer_match(tmp_path):
+    _write_gz(
+        tmp_path / "baseline" / "pubmed25n0001.xml.gz",
+        _article("101", "Music therapy", [DEMENTIA, CAREGIVERS])
+        + _article("102", "Respite care", [DEMENTIA, CAREGIVERS]),
+    )
+    _write_gz(
+        tmp_path / "updates" / "pubmed25n1300.xml.gz",
+        _article("101", "Inhaler technique", [ASTHMA]),
+    )
+    processed_out = tmp_path / "processed"
+
+    pubmed_bulk.run(
+        baseline=str(tmp_path / "baseline"),
+        updates=str(tmp_path / "updates"),
+        raw_out=str(tmp_path / "raw"),
+        processed_out=str(processed_out),
+        workers=1,
+    )
+
+    assert sorted(p.name for p in (tmp_path / "raw").iterdir()) == [
+        "102.txt",
+        "102.txt.metadata.json",
+    ]
+    kb_docs = sorted(p.name for p in (processed_out / "kb_docs").iterdir())
+    assert kb_docs == ["102.txt", "102.txt.metadata.json"]
+    assert not (processed_out / "records-pubmed25n1300.jsonl").exists()
+    lines = (processed_out / "records-pubmed25n0001.jsonl").read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["102"]
+
+
+def test_raw_output_matches_ingest_lambda_format(tmp_path):
+    path = tmp_path / "one.xml.gz"
+    _write_gz(path, _article("101", "Music therapy", [DEMENTIA, CAREGIVERS]))
+    pubmed_bulk.process_file(str(path), raw_out=str(tmp_path / "raw"))
+
+    with pubmed_bulk._open(str(path)) as stream:
+        [(_, rec)] = list(pubmed_bulk.iter_citations(stream))
+    assert (tmp_path / "raw" / "101.txt").read_text() == medline.format_record(rec)
+
+
+def test_s3_source_and_output(monkeypatch, tmp_path):
+    local = tmp_path / "pubmed25n0001.xml.gz"
+    _write_gz(local, _article("101", "Music therapy", [DEMENTIA, CAREGIVERS]))
+    puts = {}
+
+    class DummyPaginator:
+        def paginate(self, Bucket, Prefix):  # noqa: N803
+            yield {"Contents": [{"Key": f"{Prefix}pubmed25n0001.xml.gz"}]}
+
+    class DummyS3:
+        def get_paginator(self, name):
+            return DummyPaginator()
+
+        def get_object(self, Bucket, Key):  # noqa: N803
+            return {"Body": open(local, "rb")}
+
+        def put_object(self, Bucket, Key, Body):  # noqa: N803
+            puts[(Bucket, Key)] = Body
+
+    monkeypatch.setattr(pubmed_bulk.aws_clients, "client", lambda service: DummyS3())
+    files = pubmed_bulk.list_files("s3://in-bucket/baseline/")
+    assert files == ["s3://in-bucket/baseline/pubmed25n0001.xml.gz"]
+
+    stats = pubmed_bulk.process_file(files[0], raw_out="s3://out-bucket/raw/")
+    assert stats["matched"] == 1
+    assert sorted(puts) == [
+        ("out-bucket", "raw/101.txt"),
+        ("out-bucket", "raw/101.txt.metadata.json"),
+    ]
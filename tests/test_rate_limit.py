@@ -0,0 +1,75 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from api import rate_limit
+
+
+class DummyDynamoDBClient:
+    """Enough of get_item/put_item (with conditions) for the bucket store."""
+
+    def __init__(self, conflicts=0):
+        self.items = {}
+        self._conflicts = conflicts
+
+    def get_item(self, TableName, Key, ConsistentRead):  # noqa: N803
+        item = self.items.get(Key["pk"]["S"])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, TableName, Item, ConditionExpression, **kwargs):  # noqa: N803
+        if self._conflicts:
+            self._conflicts -= 1
+            raise ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"
+            )
+        self.items[Item["pk"]["S"]] = Item
+
+
+@pytest.mark.parametrize(
+    "store",
+    [
+        rate_limit.MemoryBucketStore,
+        lambda: rate_limit.DynamoDBBucketStore("t", DummyDynamoDBClient()),
+    ],
+)
+def test_bucket_allows_burst_then_refills(store):
+    limiter = rate_limit.RateLimiter(store(), rate=0.5, burst=2)
+
+    assert limiter.check("ip:a", now=100.0) == (True, 0.0)
+    assert limiter.check("ip:a", now=100.0) == (True, 0.0)
+    allowed, retry_after = limiter.check("ip:a", now=100.0)
+    assert not allowed and retry_after == pytest.approx(2.0)
+
+    # Another client has its own bucket; ours refills one token in two seconds.
+    assert limiter.check("ip:b", now=100.0)[0]
+    assert limiter.check("ip:a", now=102.0)[0]
+
+
+def test_memory_store_drops_refilled_buckets():
+    store = rate_limit.MemoryBucketStore(sweep_interval=10)
+    limiter = rate_limit.RateLimiter(store, rate=1, burst=2)
+    for i in range(100):
+        limiter.check(f"ip:{i}", now=0.0)
+    assert len(store) == 100
+
+    # Two seconds refill every bucket; the next sweep forgets them.
+    limiter.check("ip:new", now=10.0)
+    assert len(store) == 1
+
+
+def test_dynamodb_store_retries_on_conflicting_update():
+    client = DummyDynamoDBClient(conflicts=1)
+    limiter = rate_limit.RateLimiter(
+        rate_limit.DynamoDBBucketStore("t", client), rate=1, burst=3
+    )
+
+    assert limiter.check("ip:a", now=10.0) == (True, 0.0)
+    assert float(client.items["ip:a"]["tokens"]["N"]) == pytest.approx(2.0)
+
+
+def test_from_url_picks_backend():
+    assert rate_limit.from_url("", 1, 5) is None
+    assert rate_limit.from_url("memory://", 0, 5) is None
+    limiter = rate_limit.from_url("memory://", 1, 5)
+    assert isinstance(limiter._store, rate_limit.MemoryBucketStore)
+    with pytest.raises(ValueError):
+        rate_limit.from_url("redis://localhost", 1, 5)
@@ -0,0 +1,51 @@
+import pytest
+
+from api import lambda_query_handler
+from benchmarks import retrieval_quality
+
+
+def test_ranking_metrics():
+    ranked = ["3", "1", "9"]
+    relevant = {"1", "2"}
+
+    assert retrieval_quality.recall_at_k(ranked, relevant, 1) == 0.0
+    assert retrieval_quality.recall_at_k(ranked, relevant, 3) == 0.5
+    assert retrieval_quality.reciprocal_rank(ranked, relevant) == 0.5
+    assert retrieval_quality.ndcg_at_k(["1", "2"], relevant, 2) == pytest.approx(1.0)
+    assert retrieval_quality.ndcg_at_k(ranked, relevant, 3) == pytest.approx(
+        0.6309 / 1.6309, abs=1e-3
+    )
+
+
+def test_ranked_pmids_counts_each_paper_once():
+    sources = [
+        {"text": "a", "metadata": {"pmid": "1"}},
+        {"text": "PMID: 1 second chunk", "metadata": {}},
+        {"text": "b", "metadata": {"pmid": "2"}},
+    ]
+    assert retrieval_quality.ranked_pmids(sources) == ["1", "2"]
+
+
+def test_local_backend_on_golden_set_and_replay(tmp_path):
+    record_path = tmp_path / "recorded.json"
+    live = retrieval_quality.run(backend="local", record_path=str(record_path))
+    replayed = retrieval_quality.run(backend="recorded", recorded_path=str(record_path))
+
+    assert live["questions"] == 14
+    assert live["quality"]["recall@5"] >= 0.9
+    assert live["quality"]["mrr"] >= 0.8
+    assert live["context_tokens"]["max"] > 0
+    assert replayed["quality"] == live["quality"]
+
+
+def test_fake_kb_backend_goes_through_the_handler():
+    result = retrieval_quality.run(backend="kb", fake=True, ks=(5,))
+    assert result["quality"]["recall@5"] > 0.5
+
+
+def test_fake_hybrid_backend_needs_no_kb_configured(monkeypatch):
+    monkeypatch.setattr(lambda_query_handler, "KB_ID", "")
+    monkeypatch.setattr(lambda_query_handler, "KB_ROUTES", "")
+    result = retrieval_quality.run(backend="hybrid", fake=True, ks=(5,))
+    assert result["quality"]["mrr"] > 0.5
+    assert lambda_query_handler.KB_ID == ""
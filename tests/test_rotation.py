@@ -0,0 +1,186 @@
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from api import rotation
+
+
+class DummyS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.delete_calls = 0
+        self.fail_copies_to = None
+        self.fail_deletes_in = None
+
+    def put_object(self, Bucket, Key, Body, **kwargs):  # noqa: N803,D401
+        """Store the object body in memory."""
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):  # noqa: N803,D401
+        """Return a stored body or raise NoSuchKey."""
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def copy_object(self, Bucket, CopySource, Key):  # noqa: N803,D401
+        """Server-side copy; optionally fail copies into one prefix."""
+        if self.fail_copies_to and Key.startswith(self.fail_copies_to):
+            raise RuntimeError("connection reset")
+        self.objects[Key] = self.objects[CopySource["Key"]]
+
+    def delete_objects(self, Bucket, Delete):  # noqa: N803,D401
+        """Drop up to 1000 keys."""
+        assert len(Delete["Objects"]) <= 1000
+        if self.fail_deletes_in and any(
+            obj["Key"].startswith(self.fail_deletes_in) for obj in Delete["Objects"]
+        ):
+            raise RuntimeError("connection reset")
+        self.delete_calls += 1
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+        return {}
+
+    def get_paginator(self, name):  # noqa: D401
+        """Single-page list_objects_v2 with sizes."""
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):  # noqa: N803
+                yield {
+                    "Contents": [
+                        {"Key": key, "Size": len(body)}
+                        for key, body in sorted(client.objects.items())
+                        if key.startswith(Prefix)
+                    ]
+                }
+
+        return Paginator()
+
+
+class DummyAgent:
+    def __init__(self, running=()):
+        self.running = list(running)
+        self.started = []
+
+    def list_ingestion_jobs(self, knowledgeBaseId, dataSourceId, filters):  # noqa: N803
+        """Jobs matching the status filter."""
+        return {"ingestionJobSummaries": [{"ingestionJobId": j} for j in self.running]}
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId):  # noqa: N803
+        """Record the start and return a job id."""
+        self.started.append((knowledgeBaseId, dataSourceId))
+        return {"ingestionJob": {"ingestionJobId": f"job-{len(self.started)}"}}
+
+
+def _write_set(directory, names):
+    (directory / "kb_docs").mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / name).write_text(name)
+
+
+def _live(client):
+    return sorted(key for key in client.objects if key.startswith("processed/"))
+
+
+def test_rotate_archives_promotes_and_prunes(tmp_path):
+    client = DummyS3Client()
+    client.objects["processed/old.jsonl"] = b"legacy"
+    first = tmp_path / "v1"
+    _write_set(first, ["records-1.jsonl", "kb_docs/1.txt", "notes.md"])
+
+    report = rotation.rotate("bucket", str(first), version="v1", client=client)
+
+    assert _live(client) == ["processed/kb_docs/1.txt", "processed/records-1.jsonl"]
+    assert client.objects["archive/processed/unversioned-v1/old.jsonl"] == b"legacy"
+    assert not [key for key in client.objects if key.startswith("staging/")]
+    assert (report["archived"], report["promoted"], report["pruned"]) == (1, 2, 1)
+    assert set(report["seconds"]) >= {"stage", "archive", "promote", "prune"}
+    pointer = json.loads(client.objects[rotation.POINTER_KEY])
+    assert pointer["status"] == "current" and pointer["version"] == "v1"
+
+    second = tmp_path / "v2"
+    _write_set(second, ["records-2.jsonl"])
+    rotation.rotate("bucket", str(second), version="v2", client=client)
+    assert _live(client) == ["processed/records-2.jsonl"]
+    assert "archive/processed/v1/kb_docs/1.txt" in client.objects
+
+
+def test_interrupted_promote_is_resumed_from_the_pointer(tmp_path):
+    client = DummyS3Client()
+    _write_set(tmp_path / "v1", ["records-1.jsonl"])
+    rotation.rotate("bucket", str(tmp_path / "v1"), version="v1", client=client)
+    _write_set(tmp_path / "v2", ["records-2.jsonl"])
+
+    client.fail_copies_to = "processed/"
+    with pytest.raises(RuntimeError, match="connection reset"):
+        rotation.rotate("bucket", str(tmp_path / "v2"), version="v2", client=client)
+    pointer = json.loads(client.objects[rotation.POINTER_KEY])
+    assert (pointer["status"], pointer["version"]) == ("promoting", "v2")
+    with pytest.raises(RuntimeError, match="--resume"):
+        rotation.rotate("bucket", str(tmp_path / "v2"), client=client)
+
+    client.fail_copies_to = None
+    report = rotation.rotate("bucket", resume=True, client=client)
+
+    assert report["resumed"] and report["version"] == "v2"
+    assert _live(client) == ["processed/records-2.jsonl"]
+    assert json.loads(client.objects[rotation.POINTER_KEY])["status"] == "current"
+
+
+def test_interrupted_cleanup_is_resumed_from_the_pointer(tmp_path):
+    client = DummyS3Client()
+    _write_set(tmp_path / "v1", ["records-1.jsonl"])
+
+    client.fail_deletes_in = "staging/"
+    with pytest.raises(RuntimeError, match="connection reset"):
+        rotation.rotate("bucket", str(tmp_path / "v1"), version="v1", client=client)
+    pointer = json.loads(client.objects[rotation.POINTER_KEY])
+    assert (pointer["status"], pointer["staging"]) == (
+        "current",
+        "staging/processed/v1/",
+    )
+
+    client.fail_deletes_in = None
+    report = rotation.rotate("bucket", resume=True, client=client)
+
+    assert report["cleaned"] == 1
+    assert not [key for key in client.objects if key.startswith("staging/")]
+    assert json.loads(client.objects[rotation.POINTER_KEY])["staging"] is None
+    assert _live(client) == ["processed/records-1.jsonl"]
+
+
+def test_sync_waits_for_the_rotation_and_rotation_for_the_sync(tmp_path):
+    client = DummyS3Client()
+    _write_set(tmp_path / "v1", ["records-1.jsonl"])
+    rotation.rotate("bucket", str(tmp_path / "v1"), version="v1", client=client)
+    agent = DummyAgent()
+    current = client.objects[rotation.POINTER_KEY]
+
+    client.objects[rotation.POINTER_KEY] = json.dumps(
+        {"status": "promoting", "version": "v2"}
+    ).encode("utf-8")
+    with pytest.raises(RuntimeError, match="--resume"):
+        rotation.start_sync("bucket", "kb", "ds", client=client, agent=agent)
+    assert agent.started == []
+
+    client.objects[rotation.POINTER_KEY] = current
+    result = rotation.start_sync("bucket", "kb", "ds", client=client, agent=agent)
+    assert result["ingestionJobId"] == "job-1" and result["version"] == "v1"
+
+    _write_set(tmp_path / "v2", ["records-2.jsonl"])
+    busy = DummyAgent(running=["job-1"])
+    with pytest.raises(RuntimeError, match="job-1"):
+        rotation.rotate(
+            "bucket",
+            str(tmp_path / "v2"),
+            version="v2",
+            client=client,
+            kb_id="kb",
+            data_source_id="ds",
+            agent=busy,
+        )
+    assert json.loads(client.objects[rotation.POINTER_KEY])["version"] == "v1"
+    assert _live(client) == ["processed/records-1.jsonl"]
+    assert not [key for key in client.objects if key.startswith("staging/")]
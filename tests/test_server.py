@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import threading
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+with patch("boto3.client", return_value=MagicMock()):
+    from api import server
+
+
+class CountingHandler:
+    def __init__(self, delay_event=None):
+        self.events = []
+        self._lock = threading.Lock()
+        self._delay_event = delay_event
+
+    def __call__(self, event, context):
+        with self._lock:
+            self.events.append(event)
+        if self._delay_event is not None:
+            self._delay_event.wait(2)
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"answer": "ok", "calls": len(self.events)}),
+        }
+
+
+def test_identical_concurrent_questions_share_one_call():
+    release = threading.Event()
+    handler = CountingHandler(delay_event=release)
+    query_server = server.QueryServer(handler=handler, workers=4)
+
+    async def scenario():
+        body = json.dumps({"question": "What is  Sundowning?"}).encode()
+        same = json.dumps({"question": "what is sundowning?"}).encode()
+        other = json.dumps({"question": "What is agitation?"}).encode()
+        tasks = [
+            asyncio.ensure_future(query_server.dispatch("POST", "/query", b, "1.1.1.1"))
+            for b in (body, same, other)
+        ]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    responses = asyncio.run(scenario())
+    assert [r["statusCode"] for r in responses] == [200, 200, 200]
+    assert len(handler.events) == 2
+    assert query_server.coalesced == 1
+    assert responses[0] is responses[1]
+
+
+def test_rate_limit_is_checked_per_client_before_coalescing():
+    release = threading.Event()
+    handler = CountingHandler(delay_event=release)
+    limited_ips = {"6.6.6.6"}
+
+    def rate_limit(event):
+        ip = event["requestContext"]["http"]["sourceIp"]
+        return server._error(429, "Too many requests") if ip in limited_ips else None
+
+    query_server = server.QueryServer(handler=handler, workers=4, rate_limit=rate_limit)
+
+    async def scenario():
+        body = json.dumps({"question": "What is sundowning?"}).encode()
+        first = asyncio.ensure_future(
+            query_server.dispatch("POST", "/query", body, "1.1.1.1")
+        )
+        await asyncio.sleep(0.05)
+        limited = await query_server.dispatch("POST", "/query", body, "6.6.6.6")
+        release.set()
+        return await first, limited
+
+    first, limited = asyncio.run(scenario())
+    assert first["statusCode"] == 200
+    assert limited["statusCode"] == 429
+    assert query_server.coalesced == 0
+    assert handler.events[0]["rate_limit_checked"] is True
+
+
+def test_async_submissions_are_not_coalesced():
+    assert server._coalesce_key(b'{"question": "q", "async": true}') is None
+    assert server._coalesce_key(b"not json") is None
+    assert server._coalesce_key(b'{"question": "Q"}') == server._coalesce_key(
+        b'{"question": " q "}'
+    )
+
+
+def test_non_utf8_body_is_a_bad_request():
+    handler = CountingHandler()
+    query_server = server.QueryServer(handler=handler, workers=1)
+
+    response = asyncio.run(
+        query_server.dispatch("POST", "/query", b'{"question": "\xff"}', "1.1.1.1")
+    )
+    assert response["statusCode"] == 400
+    assert handler.events == []
+
+
+def test_http_round_trip_with_keep_alive():
+    handler = CountingHandler()
+    query_server = server.QueryServer(handler=handler, workers=2)
+
+    async def scenario():
+        srv = await asyncio.start_server(query_server.handle_connection, "127.0.0.1", 0)
+        port = srv.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        payload = json.dumps({"question": "What is dementia?"}).encode()
+        responses = []
+        for path, method, body in (
+            ("/query", "POST", payload),
+            ("/health", "GET", b""),
+            ("/missing", "GET", b""),
+        ):
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: x\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(
+                [
+                    line.split(":")[1]
+                    for line in head.decode().split("\r\n")
+                    if line.lower().startswith("content-length")
+                ][0]
+            )
+            responses.append((head.split(b" ")[1], await reader.readexactly(length)))
+        writer.close()
+        srv.close()
+        await srv.wait_closed()
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert responses[0][0] == b"200"
+    assert json.loads(responses[0][1])["answer"] == "ok"
+    assert responses[1] == (b"200", b'{"status": "ok"}')
+    assert responses[2][0] == b"404"
+    assert handler.events[0]["requestContext"]["http"]["method"] == "POST"
@@ -0,0 +1,100 @@
+import json
+
+from api import processing, snapshot
+
+
+def _record(pmid, date, journal="Journal A", mesh=None, abstract="About caregivers."):
+    return {
+        "pmid": pmid,
+        "title": f"Title {pmid}",
+        "authors": "Smith J",
+        "journal": journal,
+        "date": date,
+        "mesh": mesh or [],
+        "publication_types": ["Journal Article"],
+        "abstract": abstract,
+    }
+
+
+RECORDS = [
+    _record("103", "2024 Mar", mesh=["*Dementia/therapy", "Caregivers"]),
+    _record("101", "2023 Jan 7", journal="Journal B", mesh=["Asthma"]),
+    _record("102", "2024", abstract=""),
+    _record("104", "Spring", mesh=["Dementia"]),
+]
+
+
+def test_write_snapshot_partitions_by_year_with_index(tmp_path):
+    assert snapshot.write_snapshot(RECORDS, str(tmp_path)) == 4
+
+    partitions = sorted(p.name for p in tmp_path.iterdir() if p.is_dir())
+    assert "year=2023" in partitions and "year=2024" in partitions
+    assert (tmp_path / snapshot.INDEX_FILE).exists()
+    table = snapshot.scan(str(tmp_path), year=2024)
+    assert sorted(table["pmid"].to_pylist()) == ["102", "103"]
+
+
+def test_rewrite_drops_partitions_the_new_records_lack(tmp_path):
+    out = tmp_path / "snapshot"
+    snapshot.write_snapshot(RECORDS, str(out))
+
+    assert snapshot.write_snapshot(RECORDS[:1], str(out)) == 1
+
+    assert sorted(p.name for p in out.iterdir() if p.is_dir()) == ["year=2024"]
+    assert snapshot.scan(str(out))["pmid"].to_pylist() == ["103"]
+    assert [p.name for p in tmp_path.iterdir()] == ["snapshot"]
+
+
+def test_scan_filters_and_lookup(tmp_path):
+    snapshot.write_snapshot(RECORDS, str(tmp_path))
+
+    by_mesh = snapshot.scan(str(tmp_path), mesh="Dementia")
+    assert sorted(by_mesh["pmid"].to_pylist()) == ["103", "104"]
+    # The MeSH filter works whether or not the mesh column is requested.
+    projected = snapshot.scan(str(tmp_path), mesh="Dementia", columns=["pmid"])
+    assert projected.column_names == ["pmid"]
+    assert sorted(projected["pmid"].to_pylist()) == ["103", "104"]
+    by_journal = snapshot.scan(str(tmp_path), journal="Journal B")
+    assert by_journal["pmid"].to_pylist() == ["101"]
+    assert sorted(
+        snapshot.lookup(str(tmp_path), ["101", "103"])["pmid"].to_pylist()
+    ) == [
+        "101",
+        "103",
+    ]
+    assert snapshot.lookup(str(tmp_path), ["104"])["pmid"].to_pylist() == ["104"]
+
+
+def test_stats_match_the_notebook_summary(tmp_path):
+    snapshot.write_snapshot(RECORDS, str(tmp_path))
+
+    summary = snapshot.stats(str(tmp_path))
+
+    assert summary["total_records"] == 4
+    assert summary["with_abstract"] == 3
+    assert summary["with_abstract_pct"] == 75.0
+    assert summary["signal_match_pct"] == 75.0
+    assert summary["top_journals"] == {"Journal A": 3, "Journal B": 1}
+    assert summary["records_per_year"] == {"2023": 1, "2024": 2, "None": 1}
+
+
+def test_reprocessing_from_snapshot_matches_raw_export(tmp_path):
+    snapshot.write_snapshot(RECORDS, str(tmp_path / "snap"))
+
+    rebuilt = {
+        rec["pmid"]: processing.build_record_doc(rec)
+        for rec in snapshot.iter_records(str(tmp_path / "snap"))
+    }
+    assert rebuilt == {rec["pmid"]: processing.build_record_doc(rec) for rec in RECORDS}
+
+    snapshot.main(
+        [
+            "export",
+            str(tmp_path / "snap"),
+            str(tmp_path / "out.jsonl"),
+            "--year",
+            "2024",
+        ]
+    )
+    ids = [json.loads(line)["id"] for line in (tmp_path / "out.jsonl").open()]
+    assert sorted(ids) == ["102", "103"]
@@ -0,0 +1,138 @@
+import io
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from api import storage
+
+
+class DummyS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.delete_calls = []
+        self.uploads = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):  # noqa: N803,D401
+        """Store the object body in memory."""
+        self.objects[(Bucket, Key)] = Body
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, Config=None):  # noqa: N803,D401
+        """Read the file object like boto3's managed transfer would."""
+        self.uploads.append(Key)
+        self.objects[(Bucket, Key)] = Fileobj.read()
+
+    def get_object(self, Bucket, Key):  # noqa: N803,D401
+        """Return a stored body or raise NoSuchKey."""
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def delete_objects(self, Bucket, Delete):  # noqa: N803,D401
+        """Drop up to 1000 keys, as S3 does."""
+        assert len(Delete["Objects"]) <= 1000
+        self.delete_calls.append(len(Delete["Objects"]))
+        for obj in Delete["Objects"]:
+            self.objects.pop((Bucket, obj["Key"]), None)
+        return {}
+
+    def get_paginator(self, name):  # noqa: D401
+        """Single-page list_objects_v2."""
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):  # noqa: N803
+                yield {
+                    "Contents": [
+                        {"Key": key}
+                        for bucket, key in client.objects
+                        if bucket == Bucket and key.startswith(Prefix)
+                    ]
+                }
+
+        return Paginator()
+
+
+@pytest.mark.parametrize("backend", ["memory", "local", "s3"])
+def test_put_get_list_delete(backend, tmp_path):
+    out = {
+        "memory": lambda: storage.from_url("memory://"),
+        "local": lambda: storage.from_url(str(tmp_path / "out")),
+        "s3": lambda: storage.S3Storage("bucket", "processed/", client=DummyS3Client()),
+    }[backend]()
+
+    with out:
+        out.put("1.txt", b"one")
+        out.put("kb_docs/2.txt", "two")
+        out.put("big.jsonl", io.BytesIO(b"{}\n" * 10))
+    assert out.keys() == ["1.txt", "big.jsonl", "kb_docs/2.txt"]
+    assert out.keys("kb_docs/") == ["kb_docs/2.txt"]
+    assert out.get_many(["kb_docs/2.txt", "missing"]) == [b"two", None]
+
+    with out:
+        out.delete("1.txt")
+        out.delete_many(["big.jsonl", "missing"])
+    assert out.keys() == ["kb_docs/2.txt"]
+
+
+def test_local_keys_only_walks_directories_under_the_prefix(monkeypatch, tmp_path):
+    out = storage.LocalStorage(str(tmp_path))
+    for key in ["records-1.jsonl", "kb_docs/1.txt", "kb_docs/deep/2.txt"]:
+        out.put(key, b"x")
+    walked = []
+    real_walk = storage.os.walk
+
+    def walk(top):
+        for current, dirs, files in real_walk(top):
+            walked.append(os.path.relpath(current, str(tmp_path)))
+            yield current, dirs, files
+
+    monkeypatch.setattr(storage.os, "walk", walk)
+
+    assert out.keys("records-") == ["records-1.jsonl"]
+    assert walked == ["."]
+    assert out.keys("kb") == ["kb_docs/1.txt", "kb_docs/deep/2.txt"]
+    assert out.keys("kb_docs/deep/") == ["kb_docs/deep/2.txt"]
+
+
+def test_s3_batches_deletes_and_keeps_write_order():
+    client = DummyS3Client()
+    with storage.S3Storage("bucket", client=client, max_workers=4) as out:
+        for i in range(2500):
+            out.put(f"{i}.txt", b"x")
+        out.delete_many(f"{i}.txt" for i in range(2500))
+        # Write, then delete, then write again: the last write wins.
+        out.put("a.txt", b"1")
+        out.delete("a.txt")
+        out.put("a.txt", b"2")
+        out.put("b.txt", b"1")
+        out.delete("b.txt")
+    assert client.delete_calls == [1000, 1000, 500, 1]
+    assert client.objects == {("bucket", "a.txt"): b"2"}
+
+
+def test_s3_large_bodies_use_multipart_and_failures_surface_on_flush():
+    client = DummyS3Client()
+    latencies = []
+    out = storage.S3Storage(
+        "bucket", client=client, multipart_threshold=8, on_put=latencies.append
+    )
+    out.put("small", b"1234")
+    out.put("large", b"123456789")
+    out.flush()
+    assert client.uploads == ["large"]
+    assert len(latencies) == 2
+
+    def fail(**kwargs):
+        raise RuntimeError("s3 down")
+
+    client.put_object = fail
+    out.put("small", b"1234")
+    with pytest.raises(RuntimeError, match="s3 down"):
+        out.close()
+
+
+def test_from_url_rejects_unknown_schemes(tmp_path):
+    assert isinstance(storage.from_url(f"file://{tmp_path}"), storage.LocalStorage)
+    with pytest.raises(ValueError, match="Unsupported storage URL"):
+        storage.from_url("ftp://example.org/raw")
@@ -0,0 +1,55 @@
+import io
+import json
+
+from api import telemetry
+
+
+def test_percentiles_use_nearest_rank():
+    values = list(range(1, 101))
+    assert telemetry.percentiles(values) == {
+        "p50": 50,
+        "p90": 90,
+        "p99": 99,
+        "max": 100,
+    }
+    assert telemetry.percentiles([7.0]) == {
+        "p50": 7.0,
+        "p90": 7.0,
+        "p99": 7.0,
+        "max": 7.0,
+    }
+    assert telemetry.percentiles([]) == {}
+
+
+def test_emit_writes_one_emf_line_and_can_be_disabled():
+    out = io.StringIO()
+    telemetry.emit(
+        "NS",
+        {"Latency": (12.5, "Milliseconds")},
+        {"Function": "f"},
+        {"event": "e"},
+        out,
+    )
+    record = json.loads(out.getvalue())
+    assert record["Latency"] == 12.5
+    assert record["Function"] == "f"
+    assert record["event"] == "e"
+    assert record["_aws"]["CloudWatchMetrics"] == [
+        {
+            "Namespace": "NS",
+            "Dimensions": [["Function"]],
+            "Metrics": [{"Name": "Latency", "Unit": "Milliseconds"}],
+        }
+    ]
+
+    silent = io.StringIO()
+    telemetry.emit("off", {"Latency": (1, "Milliseconds")}, stream=silent)
+    assert silent.getvalue() == ""
+
+
+def test_metered_stream_counts_bytes_for_line_iteration():
+    stream = telemetry.MeteredStream(io.StringIO("PMID- 1\nTI  - café\n"))
+    assert list(stream) == ["PMID- 1\n", "TI  - café\n"]
+    assert stream.bytes_read == len("PMID- 1\nTI  - café\n".encode("utf-8"))
+    assert stream.read_seconds >= 0
+    stream.close()
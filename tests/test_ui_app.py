@@ -0,0 +1,45 @@
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ui", "app.py")
+
+
+@pytest.fixture(scope="module")
+def app():
+    # Streamlit runs the script in bare mode: widgets return their defaults.
+    spec = importlib.util.spec_from_file_location("ui_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class DummySession:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def post(self, url, json, timeout):  # noqa: A002,D401
+        """Answer 200 with the configured payload."""
+        payload = self.payload
+        return SimpleNamespace(
+            status_code=200, headers={}, text="", json=lambda: payload
+        )
+
+
+def test_partial_answers_are_not_cached(app):
+    cache = app.AnswerCache(ttl=60, max_entries=10)
+    partial = {"answer": "Sources only.", "sources": [], "partial": True}
+
+    result = app.post_query(
+        DummySession(partial), "http://api", {"question": "q"}, cache, "k"
+    )
+
+    assert result["payload"] == partial
+    assert cache.get("k") is None
+    full = {"answer": "Full answer.", "sources": []}
+    app.post_query(DummySession(full), "http://api", {"question": "q"}, cache, "k")
+    assert cache.get("k") == full
@@ -1,17 +1,39 @@
+import hashlib
+import json
 import logging
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
-import streamlit.components.v1 as components
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("mamoru-ui")
 
-LOGO_URL = "https://raw.githubusercontent.com/adzuci/pubmed-rag-system/main/assets/mamoru-project-logo-transparent.png"
 DEFAULT_RAG_API_URL = "https://pye2ftvvg5.execute-api.us-east-1.amazonaws.com"
+# Queries run on a process-wide pool so a slow answer never holds a session's
+# script thread; each session polls its own future.
+QUERY_WORKERS = int(os.getenv("UI_QUERY_WORKERS", "32"))
+QUERY_POLL_SEC = float(os.getenv("UI_QUERY_POLL_SEC", "0.5"))
+QUERY_TIMEOUT_SEC = 30
+# Shared with the query API; vouches for the client_ip we forward (rate limiting).
+CLIENT_IP_SECRET = os.getenv("CLIENT_IP_SECRET", "")
+# Answers are shared across sessions in this process, keyed by API URL and the
+# normalized question.
+ANSWER_CACHE_TTL_SEC = int(os.getenv("UI_ANSWER_CACHE_TTL_SEC", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("UI_ANSWER_CACHE_SIZE", "256"))
+# Chat history: the newest turns render in full, older ones are collapsed and
+# paged, and the oldest are dropped once a session's history passes the budget.
+CHAT_RECENT_TURNS = int(os.getenv("UI_CHAT_RECENT_TURNS", "3"))
+CHAT_PAGE_SIZE = int(os.getenv("UI_CHAT_PAGE_SIZE", "5"))
+CHAT_HISTORY_BUDGET_KB = int(os.getenv("UI_CHAT_HISTORY_BUDGET_KB", "512"))
 
 st.set_page_config(
     page_title="Mamoru Project",
@@ -23,434 +45,67 @@ st.set_page_config(
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
-# Google Analytics tracking
-# Note: Streamlit does not reliably execute <script> tags via st.markdown(),
-# so use components.html() to ensure the tag loads.
+# Styles, scripts and Google Analytics live in ui/static/. The CSS and JS go out
+# inline: Streamlit's static serving only promises real content types for media
+# files, and browsers refuse a stylesheet or script sent as text/plain with
+# nosniff. The loader copies them into <head>, where they outlive the element,
+# so it only has to be sent on a session's first run; reruns send nothing.
+# The logo (a PNG) is a real static file, long-cached behind CloudFront.
 GA_MEASUREMENT_ID = os.getenv("GA_MEASUREMENT_ID", "G-3TZ2EQTPMP").strip()
-if GA_MEASUREMENT_ID:
-    components.html(
-        f"""
-<!-- Google tag (gtag.js) -->
-<script async src="https://www.googletagmanager.com/gtag/js?id={GA_MEASUREMENT_ID}"></script>
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+@st.cache_resource
+def asset_url(name):
+    """app/static URL with a content hash, so assets can be cached forever."""
+    with open(os.path.join(STATIC_DIR, name), "rb") as handle:
+        digest = hashlib.sha256(handle.read()).hexdigest()[:12]
+    return f"app/static/{name}?v={digest}"
+
+
+@st.cache_resource
+def asset_loader():
+    """The one-time <script> that installs app.css, app.js and the GA tag."""
+    with open(os.path.join(STATIC_DIR, "app.css"), encoding="utf-8") as handle:
+        css = handle.read()
+    with open(os.path.join(STATIC_DIR, "app.js"), encoding="utf-8") as handle:
+        js = handle.read()
+    return """
 <script>
-  window.dataLayer = window.dataLayer || [];
-  function gtag(){{dataLayer.push(arguments);}}
-  gtag('js', new Date());
-  gtag('config', '{GA_MEASUREMENT_ID}');
+  (function () {{
+    if (document.getElementById("mamoru-assets")) return;
+    var css = document.createElement("style");
+    css.id = "mamoru-assets";
+    css.textContent = {css};
+    document.head.appendChild(css);
+    var js = document.createElement("script");
+    js.textContent = {js};
+    document.head.appendChild(js);
+    var gaId = {ga_id};
+    if (gaId) {{
+      // Google tag (gtag.js)
+      var ga = document.createElement("script");
+      ga.async = true;
+      ga.src = "https://www.googletagmanager.com/gtag/js?id=" + gaId;
+      document.head.appendChild(ga);
+      window.dataLayer = window.dataLayer || [];
+      window.gtag = function () {{ window.dataLayer.push(arguments); }};
+      window.gtag("js", new Date());
+      window.gtag("config", gaId);
+    }}
+  }})();
 </script>
-""",
-        height=0,
-        width=0,
+""".format(
+        # JSON string literals, with "</" escaped so the CSS/JS can't end the tag.
+        css=json.dumps(css).replace("</", "<\\/"),
+        js=json.dumps(js).replace("</", "<\\/"),
+        ga_id=json.dumps(GA_MEASUREMENT_ID),
     )
 
-st.markdown(
-    """
-<style>
-  /* Base colors - dark theme */
-  :root {
-    --bg-primary: #0b0f14;
-    --bg-secondary: #111827;
-    --text-primary: #f9fafb;
-    --text-secondary: #e5e7eb;
-    --text-muted: #9ca3af;
-    --border-color: #1f2937;
-    --border-focus: #2563eb;
-    --button-primary: #2563eb;
-    --button-primary-hover: #1d4ed8;
-    --button-text: #ffffff;
-  }
-  
-  .main { background-color: var(--bg-primary); }
-  .block-container { 
-    padding-top: 0.5rem; 
-    padding-bottom: 150px; 
-    max-width: 900px; 
-    margin: 0 auto; 
-    background-color: var(--bg-primary);
-  }
-  
-  /* Header */
-  .header-container { 
-    text-align: center; 
-    padding: 3rem 1rem 2rem; 
-    margin-bottom: 2rem; 
-    background-color: var(--bg-primary);
-  }
-  .header-logo { 
-    margin-bottom: 1.5rem; 
-    display: flex;
-    justify-content: center;
-    align-items: center;
-    padding: 1rem 0;
-  }
-  .header-logo img {
-    filter: drop-shadow(0 4px 20px rgba(0, 0, 0, 0.4));
-    transition: all 0.3s ease;
-    max-width: 100%;
-    height: auto;
-  }
-  .header-logo img:hover {
-    transform: scale(1.02);
-    filter: drop-shadow(0 6px 24px rgba(37, 99, 235, 0.3));
-  }
-  .header-subtitle { 
-    color: var(--text-muted); 
-    font-size: 0.95em; 
-    margin-top: 1rem; 
-    line-height: 1.6;
-  }
-  
-  /* Chat container - scrollable above fixed input */
-  .chat-container { 
-    min-height: auto; 
-    padding-bottom: 120px; 
-    background-color: var(--bg-primary);
-    max-height: calc(100vh - 200px);
-    overflow-y: auto;
-    margin-bottom: 0;
-  }
-  
-  /* Status message area (above input, ChatGPT-like) - doesn't shift input */
-  .status-message-container {
-    position: fixed !important;
-    bottom: 80px !important;
-    left: 0 !important;
-    right: 0 !important;
-    max-width: 900px;
-    margin: 0 auto;
-    padding: 0 1rem;
-    z-index: 999 !important;
-    pointer-events: none;
-    height: auto;
-  }
-  .status-message-container > div {
-    pointer-events: auto;
-    background: transparent;
-  }
-  .status-message-container > div > div {
-    background: transparent !important;
-  }
-  
-  /* Fixed input at bottom - always visible */
-  .input-container { 
-    position: fixed !important; 
-    bottom: 0 !important; 
-    left: 0 !important; 
-    right: 0 !important; 
-    background: var(--bg-primary) !important; 
-    border-top: 1px solid var(--border-color); 
-    padding: 1rem; 
-    z-index: 1000 !important;
-    box-shadow: 0 -2px 10px rgba(0,0,0,0.3);
-    width: 100%;
-  }
-  .input-wrapper { 
-    max-width: 900px; 
-    margin: 0 auto; 
-  }
-  .input-wrapper [data-testid="column"] {
-    padding: 0 0.25rem;
-  }
-  .input-wrapper [data-testid="column"]:first-child {
-    flex: 1;
-  }
-  .input-wrapper [data-testid="column"]:last-child {
-    flex-shrink: 0;
-    display: flex;
-    align-items: center;
-  }
-  
-  /* Buttons */
-  .stButton>button { 
-    background: var(--button-primary); 
-    color: var(--button-text); 
-    border-radius: 8px; 
-    padding: 0.6rem 1.2rem; 
-    font-weight: 500;
-    height: 38px;
-    border: none;
-    white-space: nowrap;
-    margin-top: 0;
-  }
-  .stButton>button:hover { 
-    background: var(--button-primary-hover); 
-    color: var(--button-text); 
-  }
-  
-  /* Input fields */
-  .stTextInput>div>div>input { 
-    border-radius: 12px; 
-    border: 1px solid var(--border-color);
-    padding: 0.75rem 1rem;
-    font-size: 1em;
-    background-color: var(--bg-secondary);
-    color: var(--text-primary);
-    height: 38px;
-    box-sizing: border-box;
-  }
-  .stTextInput>div>div>input:focus { 
-    border-color: var(--border-focus);
-    box-shadow: 0 0 0 3px rgba(37, 99, 235, 0.2);
-    outline: none;
-  }
-  .stTextInput>div>div>input::placeholder {
-    color: var(--text-muted);
-  }
-  
-  /* Welcome message */
-  .welcome-message { 
-    text-align: center; 
-    padding: 2rem 1rem 1.5rem; 
-    background-color: var(--bg-primary);
-    margin-top: 1rem;
-  }
-  .welcome-title { 
-    font-size: 1.25em; 
-    margin-bottom: 0.5rem; 
-    font-weight: 600; 
-    color: var(--text-primary);
-  }
-  .welcome-subtitle { 
-    color: var(--text-muted); 
-    font-size: 0.95em; 
-    line-height: 1.6;
-  }
-  
-  /* Sample questions */
-  .sample-questions { 
-    margin-top: 1rem; 
-    margin-bottom: 1rem;
-    max-width: 700px;
-    margin-left: auto;
-    margin-right: auto;
-    background-color: var(--bg-primary);
-  }
-  .sample-questions h4 { 
-    text-align: center; 
-    color: var(--text-secondary); 
-    margin-bottom: 1rem; 
-    font-size: 1em;
-    font-weight: 600;
-  }
-  .sample-button { margin-bottom: 0.5rem; }
-  
-  /* Chat messages - ensure proper contrast */
-  [data-testid="stChatMessage"] { 
-    padding: 1rem 0; 
-  }
-  [data-testid="stChatMessage"] p {
-    color: var(--text-primary);
-  }
-  
-  /* User avatar padding (red human emoji) - target the avatar container */
-  [data-testid="stChatMessage"] {
-    padding-left: 1rem !important;
-  }
-  /* User message avatar - add padding inside the avatar square */
-  [data-testid="stChatMessage"] [data-testid="stChatAvatar"] {
-    padding: 1rem !important;
-    margin-left: 0.5rem !important;
-    margin-right: 0.75rem !important;
-  }
-  /* Ensure user message container has left padding */
-  [data-testid="stChatMessage"] > div:first-child {
-    padding-left: 0.5rem !important;
-  }
-  
-  /* Sidebar */
-  [data-testid="stSidebar"] { 
-    background-color: var(--bg-primary); 
-  }
-  [data-testid="stSidebar"] h1,
-  [data-testid="stSidebar"] h2,
-  [data-testid="stSidebar"] h3 {
-    color: var(--text-primary);
-  }
-  [data-testid="stSidebar"] p {
-    color: var(--text-secondary);
-  }
-  [data-testid="stSidebar"] input {
-    background-color: var(--bg-secondary);
-    color: var(--text-primary);
-    border-color: var(--border-color);
-  }
-  
-  /* Info boxes and expanders */
-  .stInfo {
-    background-color: #1e3a5f;
-    border-left: 4px solid var(--button-primary);
-  }
-  .stInfo p {
-    color: var(--text-secondary);
-  }
-  
-  /* Expanders */
-  [data-testid="stExpander"] {
-    background-color: var(--bg-secondary);
-    border: 1px solid var(--border-color);
-    margin-top: 1rem;
-  }
-  [data-testid="stExpander"] summary {
-    color: var(--text-secondary);
-    font-weight: 600;
-  }
-  /* Sources styling */
-  .sources-container {
-    margin-top: 1rem;
-    padding-top: 1rem;
-    border-top: 1px solid var(--border-color);
-  }
-  .sources-container [data-testid="stExpander"] {
-    margin-bottom: 0.5rem;
-  }
-  
-  /* Error messages */
-  .stAlert {
-    background-color: #7f1d1d;
-    border-left: 4px solid #dc2626;
-  }
-  .stAlert p {
-    color: #fca5a5;
-  }
-  
-  /* Spinner */
-  .stSpinner > div {
-    border-color: var(--button-primary);
-  }
-  
-  /* Ensure all text has proper contrast */
-  p, span, div, label {
-    color: var(--text-primary);
-  }
-  
-  /* Chat message content */
-  [data-testid="stChatMessageContent"] {
-    color: var(--text-primary);
-  }
-  
-  /* Markdown content */
-  .stMarkdown {
-    color: var(--text-primary);
-  }
-  .stMarkdown p {
-    color: var(--text-primary);
-  }
-  .stMarkdown code {
-    background-color: #1e293b;
-    color: var(--text-primary);
-    border: 1px solid var(--border-color);
-  }
-  
-  /* JSON display */
-  .stJson {
-    background-color: #1e293b;
-    border: 1px solid var(--border-color);
-  }
-  
-  /* Sample question buttons */
-  .sample-questions button {
-    background-color: var(--bg-secondary);
-    color: var(--text-primary);
-    border: 1px solid var(--border-color);
-  }
-  .sample-questions button:hover {
-    background-color: #1e293b;
-    border-color: var(--button-primary);
-  }
-</style>
-<script>
-  // Make Enter key trigger submit (ChatGPT-like). Target only the question input:
-  // Streamlit puts data-testid on the widget container, not on the <input>, so match by .input-wrapper.
-  document.addEventListener('keydown', function(e) {
-    if (e.key !== 'Enter' || e.shiftKey) return;
-    if (e.target.tagName !== 'INPUT') return;
-    var inQuestionInput = e.target.closest && e.target.closest('.input-wrapper');
-    if (!inQuestionInput) return;
-    e.preventDefault();
-    e.stopPropagation();
-    e.stopImmediatePropagation();
-    var askButton = document.querySelector('button[data-testid*="ask_button"]') ||
-      document.querySelector('button[key*="ask_button"]') ||
-      document.querySelector('button[kind="primaryFormSubmit"]');
-    if (!askButton && inQuestionInput) {
-      var buttons = inQuestionInput.querySelectorAll('button');
-      for (var i = 0; i < buttons.length; i++) {
-        if (buttons[i].textContent && buttons[i].textContent.trim() === 'Ask') {
-          askButton = buttons[i];
-          break;
-        }
-      }
-    }
-    if (askButton && !askButton.disabled) {
-      setTimeout(function() { askButton.click(); }, 10);
-    }
-    return false;
-  }, true);
-  
-  // Auto-scroll to bottom when new messages appear
-  function autoScroll() {
-    // Try to scroll the chat container
-    const chatContainer = document.querySelector('.chat-container');
-    if (chatContainer) {
-      chatContainer.scrollTop = chatContainer.scrollHeight;
-    }
-    // Also scroll the main block container
-    const blockContainer = document.querySelector('.block-container');
-    if (blockContainer) {
-      blockContainer.scrollTop = blockContainer.scrollHeight;
-    }
-    // Also scroll window to bottom (for mobile/fallback)
-    setTimeout(() => {
-      window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });
-    }, 100);
-  }
-  
-  // Run on load
-  if (document.readyState === 'loading') {
-    document.addEventListener('DOMContentLoaded', () => {
-      setTimeout(autoScroll, 200);
-    });
-  } else {
-    setTimeout(autoScroll, 200);
-  }
-  
-  // Also scroll after Streamlit reruns (when new content is added)
-  const scrollObserver = new MutationObserver((mutations) => {
-    // Check if new chat messages were added
-    let shouldScroll = false;
-    mutations.forEach(mutation => {
-      if (mutation.addedNodes.length > 0) {
-        mutation.addedNodes.forEach(node => {
-          if (node.nodeType === 1 && (
-            node.querySelector && (
-              node.querySelector('[data-testid="stChatMessage"]') ||
-              node.matches && node.matches('[data-testid="stChatMessage"]')
-            )
-          )) {
-            shouldScroll = true;
-          }
-        });
-      }
-    });
-    if (shouldScroll) {
-      setTimeout(autoScroll, 500);
-    }
-  });
-  scrollObserver.observe(document.body, { childList: true, subtree: true });
-  
-  // Also listen for Streamlit's custom events
-  window.addEventListener('load', () => setTimeout(autoScroll, 300));
-  
-  // Force scroll after Streamlit reruns complete
-  window.addEventListener('message', (event) => {
-    if (event.data && event.data.type === 'streamlit:rerun') {
-      setTimeout(autoScroll, 600);
-    }
-  });
-</script>
-""",
-    unsafe_allow_html=True,
-)
+
+if not st.session_state.get("assets_loaded"):
+    st.html(asset_loader(), unsafe_allow_javascript=True)
+    st.session_state["assets_loaded"] = True
 
 # Header with logo
 st.markdown(
@@ -462,7 +117,7 @@ st.markdown(
   <p class="header-subtitle">Safeguarding clinical knowledge for dementia care through grounded answers and trusted sources.</p>
 </div>
 """.format(
-        logo_url=LOGO_URL
+        logo_url=asset_url("mamoru-logo.png")
     ),
     unsafe_allow_html=True,
 )
@@ -481,6 +136,244 @@ def normalize_api_url(value: str) -> str:
     return cleaned
 
 
+@st.cache_resource
+def query_executor():
+    """One thread pool shared by every session in this process."""
+    return ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="rag-ui")
+
+
+@st.cache_resource
+def http_session():
+    """Keep-alive connection pool to the API, retrying only failed connects.
+
+    POST /query is not idempotent: retrying it after a 5xx or a read timeout
+    (API Gateway's 504 comes after ~29s) would run the generation again and spend
+    more of the client's rate limit, so only requests that never reached the
+    API are retried.
+    """
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=0.3,
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4, pool_maxsize=QUERY_WORKERS, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if CLIENT_IP_SECRET:
+        session.headers["X-Client-IP-Secret"] = CLIENT_IP_SECRET
+    return session
+
+
+class AnswerCache:
+    """Thread-safe LRU of API answers with a TTL, shared by every session."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(api_url, question):
+        normalized = " ".join(question.lower().split()).rstrip("?.! ")
+        return f"{api_url}|{normalized}"
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, payload):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@st.cache_resource
+def answer_cache():
+    """The process-wide answer cache (hit counters show in the sidebar Debug panel)."""
+    return AnswerCache(ANSWER_CACHE_TTL_SEC, ANSWER_CACHE_SIZE)
+
+
+def post_query(session, api_url, request_payload, cache=None, cache_key=None):
+    """Call the API on a worker thread; returns plain data (no Streamlit calls here)."""
+    try:
+        resp = session.post(
+            f"{api_url}/query",
+            json=request_payload,
+            timeout=QUERY_TIMEOUT_SEC,
+        )
+    except requests.RequestException as exc:
+        return {"error": f"Request failed: {exc}"}
+    result = {
+        "status_code": resp.status_code,
+        "retry_after": resp.headers.get("Retry-After"),
+        "text": resp.text,
+    }
+    if resp.status_code == 200:
+        try:
+            result["payload"] = resp.json()
+        except ValueError:
+            return {"error": f"API returned invalid JSON: {resp.text[:200]}"}
+        # Partial (retrieval-only) answers are a deadline fallback; don't share them.
+        if cache is not None and not result["payload"].get("partial"):
+            cache.put(cache_key, result["payload"])
+    return result
+
+
+def source_view(idx, source):
+    """Everything render_chat needs for one source, computed once per response."""
+    # Handle both dict and direct metadata access
+    if isinstance(source, dict):
+        metadata = source.get("metadata", {}) or {}
+        source_text = source.get("text", "") or ""
+    else:
+        metadata = {}
+        source_text = str(source) if source else ""
+    if not isinstance(metadata, dict):
+        metadata = {}
+
+    # Try multiple ways to get PMID, then the text
+    pmid = metadata.get("pmid") or metadata.get("PMID") or metadata.get("id")
+    if not pmid and source_text:
+        pmid_match = re.search(r"PMID[:\s]+(\d+)", source_text, re.IGNORECASE)
+        if pmid_match:
+            pmid = pmid_match.group(1)
+    title = metadata.get("title", "") or ""
+
+    label = f"Source {idx}"
+    if title:
+        label = f"Source {idx}: {title[:50]}{'...' if len(title) > 50 else ''}"
+    elif pmid:
+        label = f"Source {idx} (PMID: {pmid})"
+    metadata_md = "  \n".join(
+        f"**{key}:** {', '.join(map(str, value)) if isinstance(value, list) else value}"
+        for key, value in metadata.items()
+        if value not in (None, "", [])
+    )
+    return {
+        "label": label,
+        "text": source_text,
+        "metadata_md": metadata_md,
+        "pubmed_url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}" if pmid else "",
+    }
+
+
+def entry_size(entry):
+    """Rough bytes a chat entry holds, for the per-session history budget."""
+    return (
+        len(entry["question"])
+        + len(entry["answer"])
+        + sum(
+            len(view["text"]) + len(view["metadata_md"]) + len(view["label"])
+            for view in entry["sources"]
+        )
+    )
+
+
+def add_to_history(entry):
+    """Append a turn, then drop the oldest turns while over the memory budget."""
+    history = st.session_state.chat_history
+    history.append(entry)
+    budget = CHAT_HISTORY_BUDGET_KB * 1024
+    total = sum(item["size"] for item in history)
+    while len(history) > 1 and total > budget:
+        total -= history.pop(0)["size"]
+        st.session_state["dropped_turns"] = st.session_state.get("dropped_turns", 0) + 1
+
+
+def query_outcome(question, result):
+    """Turn a finished query into a chat entry, or a (level, message) to show."""
+    if "error" in result:
+        return None, ("error", result["error"])
+    status_code = result["status_code"]
+    if status_code == 404:
+        return None, (
+            "error",
+            "API returned 404. Double-check the base URL (no /query suffix) "
+            "and include https://.",
+        )
+    if status_code == 429:
+        retry_after = result["retry_after"] or "a few"
+        return None, (
+            "warning",
+            f"You're asking questions faster than we can answer them. "
+            f"Please wait {retry_after} seconds and try again.",
+        )
+    if status_code != 200:
+        return None, ("error", f"API error ({status_code}): {result['text']}")
+
+    payload = result["payload"]
+    sources_list = payload.get("sources", [])
+    if not isinstance(sources_list, list):
+        sources_list = []
+    logger.info("rag_answer: %d sources", len(sources_list))
+    entry = {
+        "question": question,
+        "answer": payload.get("answer", ""),
+        "sources": [
+            source_view(idx, source) for idx, source in enumerate(sources_list, start=1)
+        ],
+    }
+    entry["size"] = entry_size(entry)
+    return entry, None
+
+
+@st.fragment(run_every=QUERY_POLL_SEC)
+def watch_pending_query():
+    """Status line for this session's in-flight query; reruns the app when done."""
+    pending = st.session_state.get("pending_query")
+    if pending is None:
+        return
+    if not pending["future"].done():
+        # Show retrieving message above input (ChatGPT-like) - doesn't shift input
+        st.markdown(
+            '<div style="text-align: center; color: var(--text-muted); padding: 0.5rem 1rem; font-size: 0.9em; background: transparent;">'
+            "🔄 Retrieving sources and drafting answer..."
+            "</div>",
+            unsafe_allow_html=True,
+        )
+        return
+
+    del st.session_state["pending_query"]
+    entry, notice = query_outcome(pending["question"], pending["future"].result())
+    if entry is None:
+        st.session_state["query_notice"] = notice
+    else:
+        add_to_history(entry)
+        # Mark input for clearing
+        st.session_state["clear_input"] = True
+        # Trigger scroll after rerun completes
+        st.markdown(
+            '<script>setTimeout(() => { window.scrollTo({ top: document.body.scrollHeight, behavior: "smooth" }); const chatContainer = document.querySelector(".chat-container"); if (chatContainer) chatContainer.scrollTop = chatContainer.scrollHeight; }, 800);</script>',
+            unsafe_allow_html=True,
+        )
+    st.rerun()
+
+
 with st.sidebar:
     st.header("⚙️ Configuration")
     default_api = (
@@ -525,6 +418,14 @@ with st.sidebar:
         help="Current UI container image version",
     )
 
+    with st.expander("🛠️ Debug", expanded=False):
+        cache = answer_cache()
+        st.caption(
+            f"Answer cache: {cache.hits} hits, {cache.misses} misses, "
+            f"{len(cache)}/{cache.max_entries} entries "
+            f"(TTL {cache.ttl}s, shared by all sessions)"
+        )
+
     st.markdown("---")
     st.subheader("ℹ️ How it works")
     st.markdown(
@@ -540,8 +441,85 @@ Built with AWS Bedrock Knowledge Bases, OpenSearch Serverless, and Claude.
     )
 
 
+def render_exchange(entry):
+    """One question/answer turn from its precomputed source views."""
+    with st.chat_message("user"):
+        st.write(entry.get("question", ""))
+    with st.chat_message("assistant"):
+        st.write(entry.get("answer", ""))
+        sources = entry.get("sources", [])
+        if sources:
+            st.markdown('<div class="sources-container">', unsafe_allow_html=True)
+            st.markdown(f"**📚 Sources ({len(sources)})**")
+            for view in sources:
+                with st.expander(view["label"], expanded=False):
+                    # Show abstract/text
+                    if view["text"]:
+                        st.markdown("**Abstract:**")
+                        st.markdown(view["text"])
+
+                    # Show metadata if available
+                    if view["metadata_md"]:
+                        st.markdown("**Metadata:**")
+                        st.markdown(view["metadata_md"])
+
+                    # Show PubMed link if PMID available
+                    if view["pubmed_url"]:
+                        st.markdown(
+                            f'<a href="{view["pubmed_url"]}" target="_blank" rel="noopener noreferrer" style="color: var(--button-primary);">🔗 View on PubMed</a>',
+                            unsafe_allow_html=True,
+                        )
+            st.markdown("</div>", unsafe_allow_html=True)
+
+
+def set_history_page(page):
+    st.session_state["history_page"] = page
+
+
+@st.fragment
+def render_older_turns(older):
+    """Earlier turns, newest first, collapsed and paged; paging reruns only this."""
+    pages = max(1, -(-len(older) // CHAT_PAGE_SIZE))
+    page = min(st.session_state.get("history_page", 0), pages - 1)
+    newest_first = older[::-1]
+    shown = newest_first[page * CHAT_PAGE_SIZE : (page + 1) * CHAT_PAGE_SIZE]
+    with st.expander(f"Earlier questions ({len(older)})", expanded=False):
+        # Expanders can't nest, so earlier sources are plain links here.
+        for entry in shown:
+            with st.container(border=True):
+                st.markdown(f"**{entry.get('question', '')}**")
+                st.write(entry.get("answer", ""))
+                links = [
+                    (
+                        f"[{view['label']}]({view['pubmed_url']})"
+                        if view["pubmed_url"]
+                        else view["label"]
+                    )
+                    for view in entry.get("sources", [])
+                ]
+                if links:
+                    st.caption(" · ".join(links))
+        if pages > 1:
+            col_prev, col_page, col_next = st.columns([1, 2, 1])
+            col_prev.button(
+                "Newer",
+                disabled=page == 0,
+                key="history_newer",
+                on_click=set_history_page,
+                args=(page - 1,),
+            )
+            col_page.caption(f"Page {page + 1} of {pages}")
+            col_next.button(
+                "Older",
+                disabled=page >= pages - 1,
+                key="history_older",
+                on_click=set_history_page,
+                args=(page + 1,),
+            )
+
+
 def render_chat(history):
-    """Render chat history in a scrollable container."""
+    """Render chat history: older turns collapsed and paged, the newest in full."""
     if not history:
         st.markdown(
             """
@@ -568,81 +546,14 @@ def render_chat(history):
         st.markdown("</div>", unsafe_allow_html=True)
         return
 
-    # Render chat messages
-    for entry in history:
-        with st.chat_message("user"):
-            st.write(entry.get("question", ""))
-        with st.chat_message("assistant"):
-            st.write(entry.get("answer", ""))
-            sources = entry.get("sources", [])
-            # Debug: log sources to help diagnose
-            if sources:
-                logger.info(f"Found {len(sources)} sources for entry")
-                logger.info(
-                    f"First source structure: {sources[0] if sources else 'None'}"
-                )
-            if sources and len(sources) > 0:
-                st.markdown('<div class="sources-container">', unsafe_allow_html=True)
-                st.markdown(f"**📚 Sources ({len(sources)})**")
-                for idx, source in enumerate(sources, start=1):
-                    # Handle both dict and direct metadata access
-                    source_text = ""
-                    if isinstance(source, dict):
-                        metadata = source.get("metadata", {}) or {}
-                        source_text = source.get("text", "") or ""
-                        # Also check if metadata is nested or flat
-                        if not metadata and isinstance(source.get("metadata"), dict):
-                            metadata = source.get("metadata", {})
-                    else:
-                        metadata = {}
-                        source_text = str(source) if source else ""
-
-                    # Try multiple ways to get PMID
-                    pmid = None
-                    if isinstance(metadata, dict):
-                        pmid = (
-                            metadata.get("pmid")
-                            or metadata.get("PMID")
-                            or metadata.get("id")
-                        )
-                    title = (
-                        metadata.get("title", "") if isinstance(metadata, dict) else ""
-                    )
-
-                    # Try to find PMID in text if not in metadata
-                    if not pmid and source_text:
-                        pmid_match = re.search(
-                            r"PMID[:\s]+(\d+)", source_text, re.IGNORECASE
-                        )
-                        if pmid_match:
-                            pmid = pmid_match.group(1)
-
-                    # Create expander with source content
-                    expander_label = f"Source {idx}"
-                    if title:
-                        expander_label = f"Source {idx}: {title[:50]}{'...' if len(title) > 50 else ''}"
-                    elif pmid:
-                        expander_label = f"Source {idx} (PMID: {pmid})"
-
-                    with st.expander(expander_label, expanded=False):
-                        # Show abstract/text
-                        if source_text:
-                            st.markdown("**Abstract:**")
-                            st.markdown(source_text)
-
-                        # Show metadata if available
-                        if metadata:
-                            st.markdown("**Metadata:**")
-                            st.json(metadata)
-
-                        # Show PubMed link if PMID available
-                        if pmid:
-                            pubmed_url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}"
-                            st.markdown(
-                                f'<a href="{pubmed_url}" target="_blank" rel="noopener noreferrer" style="color: var(--button-primary);">🔗 View on PubMed</a>',
-                                unsafe_allow_html=True,
-                            )
-                st.markdown("</div>", unsafe_allow_html=True)
+    dropped = st.session_state.get("dropped_turns", 0)
+    if dropped:
+        st.caption(f"{dropped} earlier turns were cleared to keep this session light.")
+    split = max(0, len(history) - CHAT_RECENT_TURNS)
+    if split:
+        render_older_turns(history[:split])
+    for entry in history[split:]:
+        render_exchange(entry)
 
 
 # Chat container with scrolling
@@ -650,8 +561,9 @@ st.markdown('<div class="chat-container">', unsafe_allow_html=True)
 render_chat(st.session_state.chat_history)
 st.markdown("</div>", unsafe_allow_html=True)
 
-# Status message area (above input, ChatGPT-like)
-status_container = st.empty()
+# Status message area (above input, ChatGPT-like); polls this session's query
+if "pending_query" in st.session_state:
+    watch_pending_query()
 
 # Fixed input area at bottom
 st.markdown('<div class="input-container">', unsafe_allow_html=True)
@@ -679,13 +591,25 @@ with col_input:
     )
 
 with col_button:
-    ask = st.button("Ask", type="primary", use_container_width=True, key="ask_button")
+    ask = st.button(
+        "Ask",
+        type="primary",
+        use_container_width=True,
+        key="ask_button",
+        disabled="pending_query" in st.session_state,
+    )
 
 st.markdown("</div>", unsafe_allow_html=True)
 st.markdown("</div>", unsafe_allow_html=True)
 
+# Errors from the last query, shown once
+notice = st.session_state.pop("query_notice", None)
+if notice:
+    level, message = notice
+    (st.warning if level == "warning" else st.error)(message)
+
 auto_submit = bool(st.session_state.get("auto_submit"))
-if ask or auto_submit:
+if (ask or auto_submit) and "pending_query" not in st.session_state:
     # Get API URL from sidebar or use default
     api_url = (
         normalize_api_url(api_url)
@@ -706,59 +630,23 @@ if ask or auto_submit:
     # Pass client IP through to query Lambda for logging / rate-limiting
     request_payload = {"question": question.strip(), "client_ip": ip}
 
-    # Show retrieving message above input (ChatGPT-like) - positioned fixed, doesn't shift input
-    with status_container.container():
-        st.markdown(
-            '<div style="text-align: center; color: var(--text-muted); padding: 0.5rem 1rem; font-size: 0.9em; background: transparent;">'
-            "🔄 Retrieving sources and drafting answer..."
-            "</div>",
-            unsafe_allow_html=True,
-        )
-
-    try:
-        resp = requests.post(
-            f"{api_url}/query",
-            json=request_payload,
-            timeout=30,
-        )
-    except requests.RequestException as exc:
-        status_container.empty()
-        st.error(f"Request failed: {exc}")
-        st.stop()
-
-    # Clear status message
-    status_container.empty()
-
-    if resp.status_code == 404:
-        st.error(
-            "API returned 404. Double-check the base URL (no /query suffix) "
-            "and include https://."
-        )
-        st.stop()
-    if resp.status_code != 200:
-        st.error(f"API error ({resp.status_code}): {resp.text}")
-        st.stop()
-
-    payload = resp.json()
-    # Debug: log payload structure
-    logger.info(f"API response keys: {payload.keys()}")
-    logger.info(f"Sources in payload: {payload.get('sources', [])}")
-    sources_list = payload.get("sources", [])
-    if not isinstance(sources_list, list):
-        sources_list = []
-    st.session_state.chat_history.append(
-        {
-            "question": question.strip(),
-            "answer": payload.get("answer", ""),
-            "sources": sources_list,
-        }
-    )
-    # Clear auto_submit and mark input for clearing
     st.session_state["auto_submit"] = False
-    st.session_state["clear_input"] = True
-    # Trigger scroll after rerun completes
-    st.markdown(
-        '<script>setTimeout(() => { window.scrollTo({ top: document.body.scrollHeight, behavior: "smooth" }); const chatContainer = document.querySelector(".chat-container"); if (chatContainer) chatContainer.scrollTop = chatContainer.scrollHeight; }, 800);</script>',
-        unsafe_allow_html=True,
-    )
+    cache = answer_cache()
+    cache_key = AnswerCache.key(api_url, question)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        entry, _ = query_outcome(
+            question.strip(), {"status_code": 200, "payload": cached}
+        )
+        add_to_history(entry)
+        st.session_state["clear_input"] = True
+        st.rerun()
+
+    st.session_state["pending_query"] = {
+        "question": question.strip(),
+        "future": query_executor().submit(
+            post_query, http_session(), api_url, request_payload, cache, cache_key
+        ),
+    }
+    # Rerun so the status line starts polling above the input
     st.rerun()
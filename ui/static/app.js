@@ -0,0 +1,89 @@
+// Loaded once per page by the asset loader in app.py.
+// Make Enter key trigger submit (ChatGPT-like). Target only the question input:
+// Streamlit puts data-testid on the widget container, not on the <input>, so match by .input-wrapper.
+document.addEventListener('keydown', function(e) {
+  if (e.key !== 'Enter' || e.shiftKey) return;
+  if (e.target.tagName !== 'INPUT') return;
+  var inQuestionInput = e.target.closest && e.target.closest('.input-wrapper');
+  if (!inQuestionInput) return;
+  e.preventDefault();
+  e.stopPropagation();
+  e.stopImmediatePropagation();
+  var askButton = document.querySelector('button[data-testid*="ask_button"]') ||
+    document.querySelector('button[key*="ask_button"]') ||
+    document.querySelector('button[kind="primaryFormSubmit"]');
+  if (!askButton && inQuestionInput) {
+    var buttons = inQuestionInput.querySelectorAll('button');
+    for (var i = 0; i < buttons.length; i++) {
+      if (buttons[i].textContent && buttons[i].textContent.trim() === 'Ask') {
+        askButton = buttons[i];
+        break;
+      }
+    }
+  }
+  if (askButton && !askButton.disabled) {
+    setTimeout(function() { askButton.click(); }, 10);
+  }
+  return false;
+}, true);
+
+// Auto-scroll to bottom when new messages appear
+function autoScroll() {
+  // Try to scroll the chat container
+  const chatContainer = document.querySelector('.chat-container');
+  if (chatContainer) {
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+  }
+  // Also scroll the main block container
+  const blockContainer = document.querySelector('.block-container');
+  if (blockContainer) {
+    blockContainer.scrollTop = blockContainer.scrollHeight;
+  }
+  // Also scroll window to bottom (for mobile/fallback)
+  setTimeout(() => {
+    window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });
+  }, 100);
+}
+
+// Run on load
+if (document.readyState === 'loading') {
+  document.addEventListener('DOMContentLoaded', () => {
+    setTimeout(autoScroll, 200);
+  });
+} else {
+  setTimeout(autoScroll, 200);
+}
+
+// Also scroll after Streamlit reruns (when new content is added)
+const scrollObserver = new MutationObserver((mutations) => {
+  // Check if new chat messages were added
+  let shouldScroll = false;
+  mutations.forEach(mutation => {
+    if (mutation.addedNodes.length > 0) {
+      mutation.addedNodes.forEach(node => {
+        if (node.nodeType === 1 && (
+          node.querySelector && (
+            node.querySelector('[data-testid="stChatMessage"]') ||
+            node.matches && node.matches('[data-testid="stChatMessage"]')
+          )
+        )) {
+          shouldScroll = true;
+        }
+      });
+    }
+  });
+  if (shouldScroll) {
+    setTimeout(autoScroll, 500);
+  }
+});
+scrollObserver.observe(document.body, { childList: true, subtree: true });
+
+// Also listen for Streamlit's custom events
+window.addEventListener('load', () => setTimeout(autoScroll, 300));
+
+// Force scroll after Streamlit reruns complete
+window.addEventListener('message', (event) => {
+  if (event.data && event.data.type === 'streamlit:rerun') {
+    setTimeout(autoScroll, 600);
+  }
+});